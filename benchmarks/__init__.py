@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# --!-- coding: utf8 --!--
+
+"""
+Micro benchmarks for the models and the project file format.
+
+Run from the root of the repository, e.g.:
+
+    python3 -m benchmarks.outlineModel
+"""
+
+import os
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication
+
+app = QApplication.instance() or QApplication([])
+
+
+def timeit(func, repeat=1):
+    """Returns the time (in seconds) taken by the fastest of `repeat` calls to `func`."""
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        func()
+        t = time.perf_counter() - t
+        best = t if best is None else min(best, t)
+    return best
+
+
+def rss():
+    """Returns the resident set size of the process, in bytes (Linux only)."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def report(name, size, value, unit="s"):
+    factor = {"s": 1, "ms": 1e3, "us": 1e6, "B": 1, "MB": 1e-6, "%": 100}[unit]
+    print("{:<40} {:>8} {:>12.3f} {}".format(name, size, value * factor, unit))
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# --!-- coding: utf8 --!--
+
+"""Benchmarks for the text editors."""
+
+import time
+
+from PyQt5.QtGui import QTextCursor
+
+from benchmarks import report
+from manuskript import settings
+from manuskript.enums import Outline
+from manuskript.models import outlineItem
+from manuskript.project import ProjectV1
+from manuskript import functions as F
+from manuskript.ui.views.MDEditView import MDEditView
+from manuskript.ui.views.textEditView import textEditView
+
+
+def benchSubmit(sizes=(5000, 50000), edits=50):
+    """
+    Submitting a few typed words to the model, in a scene of `sizes` words.
+    """
+    settings.revisions["keep"] = True
+    settings.revisions["smartremove"] = True
+
+    for size in sizes:
+        project = ProjectV1("project.msk")
+        mdl = project.mdlOutline
+        item = outlineItem(title="Scene", _type="md", parent=mdl.rootItem)
+        item.setData(Outline.text, "Lorem ipsum dolor sit amet.\n\n" * (size // 5))
+
+        editor = textEditView()
+        editor.setCurrentModelIndex(mdl.indexFromItem(item, Outline.text))
+        cursor = QTextCursor(editor.document())
+
+        t = 0
+        for e in range(edits):
+            cursor.setPosition(editor.document().characterCount() * e // edits)
+            cursor.insertText("New words {}. ".format(e))
+            t -= time.perf_counter()
+            editor.submit()
+            t += time.perf_counter()
+        report("submit", size, t / edits, "ms")
+
+
+def benchWordCount(sizes=(5000, 50000), edits=50):
+    """
+    Number of words in a scene of `sizes` words after typing a word: as
+    counted by the highlighter while blocks change, or by counting the
+    words of the whole text.
+    """
+    for size in sizes:
+        editor = MDEditView()
+        editor.setPlainText("Lorem ipsum dolor sit amet.\n\n" * (size // 5))
+        cursor = QTextCursor(editor.document())
+
+        live = full = 0
+        for e in range(edits):
+            cursor.setPosition(editor.document().characterCount() * e // edits)
+            cursor.insertText("word ")
+            live -= time.perf_counter()
+            editor.wordCount()
+            live += time.perf_counter()
+            full -= time.perf_counter()
+            F.wordCount(editor.toPlainText())
+            full += time.perf_counter()
+
+        assert editor.wordCount() == F.wordCount(editor.toPlainText())
+        report("word count, highlighter", size, live / edits, "ms")
+        report("word count, whole text", size, full / edits, "ms")
+
+
+if __name__ == "__main__":
+    benchSubmit()
+    benchWordCount()
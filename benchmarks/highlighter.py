@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# --!-- coding: utf8 --!--
+
+"""Benchmarks for the markdown highlighter."""
+
+import time
+
+from benchmarks import report, timeit
+from manuskript import functions as F
+from manuskript.constants import MAIN_DIR
+from manuskript.ui.highlighters import MarkdownState as MS
+from manuskript.ui.highlighters import MarkdownTokenizer, MarkdownReTokenizer
+from manuskript.ui.views.MDEditView import MDEditView
+
+
+def sampleBlocks():
+    "Returns the blocks of the sample projects, and some with markup."
+    blocks = []
+    for f in sorted((MAIN_DIR / "sample-projects").walkfiles()):
+        if f.ext in [".md", ".txt"]:
+            blocks += f.text(encoding="utf-8").split("\n")
+    blocks += [
+        "Some *emphasis*, some **strong** text, and ~~struck~~ words.",
+        "A [link](http://example.com), `code`, <span>html</span> &amp; @mention.",
+        "{++Added++} and {--deleted--} and {==highlighted==}{>>comment<<}.",
+        "# A title",
+        "> A quote with *emphasis*",
+        "* A bullet point",
+    ] * 50
+    return blocks
+
+
+def benchTokenize(repeat=5):
+    "Time to tokenize one block, with QRegExp and with Python regular expressions."
+    blocks = sampleBlocks()
+
+    for name, tokenizer in [("QRegExp", MarkdownTokenizer()),
+                            ("re", MarkdownReTokenizer())]:
+        best = None
+        for _ in range(repeat):
+            t = time.perf_counter()
+            state = MS.MarkdownStateUnknown
+            for text in blocks:
+                tokenizer.clear()
+                tokenizer.tokenize(text, MS.MarkdownStateUnknown, state,
+                                   MS.MarkdownStateUnknown)
+                state = tokenizer.getState()
+            t = time.perf_counter() - t
+            best = t if best is None else min(best, t)
+        report("tokenize block, {}".format(name), len(blocks), best / len(blocks), "us")
+
+
+def sampleText(words):
+    "Returns a text of about `words` words, made of sampleBlocks."
+    blocks = sampleBlocks()
+    text = "\n".join(blocks)
+    return "\n".join(blocks * max(1, words // F.wordCount(text)))
+
+
+def benchRehighlight(sizes=(10000, 100000)):
+    """
+    Highlighting a whole document again, as when the theme changes: with
+    every block tokenized again, and with the tokens of the first time.
+    """
+    for size in sizes:
+        editor = MDEditView()
+        editor.createHighlighter()
+        editor.setPlainText(sampleText(size))
+        highlighter = editor.highlighter
+        tokenizer = highlighter.tokenizer
+
+        cacheSize = tokenizer.cacheSize
+        tokenizer.cacheSize = 0
+        t = time.perf_counter()
+        highlighter.rehighlight()
+        report("rehighlight, tokenizing", size, time.perf_counter() - t, "ms")
+
+        tokenizer.cacheSize = cacheSize
+        highlighter.rehighlight()
+        hits, misses = tokenizer.cacheHits, tokenizer.cacheMisses
+        t = time.perf_counter()
+        highlighter.rehighlight()
+        report("rehighlight, tokens cached", size, time.perf_counter() - t, "ms")
+        hits, misses = tokenizer.cacheHits - hits, tokenizer.cacheMisses - misses
+        report("rehighlight, cache hits", size, hits / (hits + misses), "%")
+
+
+def benchHighlight(sizes=(100000,), repeat=3):
+    """
+    Highlighting a document of `sizes` words when it is opened, and
+    formatting it again (tokens are cached).
+    """
+    for size in sizes:
+        text = sampleText(size)
+
+        def highlight():
+            editor = MDEditView()
+            editor.createHighlighter()
+            editor.setPlainText(text)
+            return editor
+
+        report("highlight", size, timeit(highlight, repeat), "ms")
+        highlighter = highlight().highlighter
+        report("format again", size, timeit(highlighter.rehighlight, repeat), "ms")
+
+
+if __name__ == "__main__":
+    benchTokenize()
+    benchRehighlight()
+    benchHighlight()
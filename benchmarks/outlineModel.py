@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# --!-- coding: utf8 --!--
+
+"""Benchmarks for outlineModel / outlineItem."""
+
+import gc
+
+from lxml import etree as ET
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QTreeView, qApp
+
+from benchmarks import report, rss, timeit
+from manuskript import settings
+from manuskript.enums import Outline
+from manuskript.models import outlineItem, outlineModel
+
+
+def flatModel(size):
+    """Returns an outlineModel with `size` text items at the root."""
+    mdl = outlineModel(None)
+    for i in range(size):
+        outlineItem(title="Scene {}".format(i), _type="md", parent=mdl.rootItem)
+    return mdl
+
+
+def benchGetItemByID(sizes=(100, 1000, 5000)):
+    for size in sizes:
+        mdl = flatModel(size)
+        IDs = [c.ID() for c in mdl.rootItem.children()]
+
+        def lookup():
+            for ID in IDs:
+                mdl.getItemByID(ID)
+
+        report("getItemByID (per lookup)", size, timeit(lookup, 3) / size, "us")
+
+
+def benchIndexFromItem(sizes=(100, 1000, 5000)):
+    for size in sizes:
+        mdl = flatModel(size)
+        items = mdl.rootItem.children()
+
+        def indexes():
+            for item in items:
+                mdl.parent(mdl.indexFromItem(item))
+
+        report("indexFromItem + parent (per item)", size, timeit(indexes, 3) / size, "us")
+
+
+def benchFindUniqueID(sizes=(500, 5000, 50000)):
+    for size in sizes:
+
+        def allocate():
+            root = outlineModel(None).rootItem
+            for _ in range(size):
+                root.findUniqueID()
+
+        report("findUniqueID (total)", size, timeit(allocate), "ms")
+
+
+def outlineXML(folders, texts, depth):
+    """
+    Returns the XML of an outline with `folders` folders per level, `depth`
+    levels, and `texts` text items in each folder.
+    """
+    ID = 0
+    root = ET.Element("outlineItem", title="Root", ID="0", type="folder")
+
+    def fill(parent, level):
+        nonlocal ID
+        for f in range(folders):
+            ID += 1
+            folder = ET.SubElement(parent, "outlineItem", type="folder", ID=str(ID),
+                                   title="Folder {}".format(f), compile="2")
+            if level < depth:
+                fill(folder, level + 1)
+            for t in range(texts):
+                ID += 1
+                ET.SubElement(folder, "outlineItem", type="md", ID=str(ID),
+                              title="Scene {}".format(t), compile="2",
+                              text="Lorem ipsum dolor sit amet. " * 50)
+
+    fill(root, 1)
+    return ET.tostring(root), ID
+
+
+def benchLoadFromXML(depths=(2, 3, 4)):
+    for depth in depths:
+        xml, size = outlineXML(6, 20, depth)
+
+        def load():
+            outlineModel(None).loadFromXML(xml, fromString=True)
+
+        report("loadFromXML (total)", size, timeit(load), "ms")
+
+
+def benchCopy(depths=(2, 3, 4)):
+    for depth in depths:
+        xml, size = outlineXML(6, 20, depth)
+        mdl = outlineModel(None)
+        mdl.loadFromXML(xml, fromString=True)
+
+        report("outlineItem.copy (total)", size, timeit(mdl.rootItem.copy), "ms")
+
+
+def importScenes(size, parentItem):
+    "Adds `size` scenes with text to `parentItem`, the way importers do."
+    for i in range(size):
+        item = outlineItem(title="Scene {}".format(i), _type="md", parent=parentItem)
+        item.setData(Outline.text, "Lorem ipsum dolor sit amet. " * 50)
+
+
+def benchImport(sizes=(1000, 10000)):
+    settings.revisions["keep"] = False
+
+    for size in sizes:
+
+        def imp():
+            mdl = outlineModel(None)
+            folder = outlineItem(title="Imported", parent=mdl.rootItem)
+            importScenes(size, folder)
+
+        report("import scenes (total)", size, timeit(imp), "ms")
+
+
+def benchImportWithView(sizes=(1000, 10000)):
+    """
+    Adds scenes through the model while a view is showing it, one by one and
+    in a bulk block.
+    """
+    settings.revisions["keep"] = False
+
+    for size in sizes:
+        for bulk in [False, True]:
+
+            def imp():
+                mdl = outlineModel(None)
+                view = QTreeView()
+                view.setModel(mdl)
+                folder = outlineItem(title="Imported")
+                mdl.appendItem(folder)
+                view.expandAll()
+                if bulk:
+                    with mdl.bulk():
+                        importScenes(size, folder)
+                else:
+                    for i in range(size):
+                        item = outlineItem(title="Scene {}".format(i), _type="md")
+                        item.setData(Outline.text, "Lorem ipsum dolor sit amet. " * 50)
+                        mdl.appendItem(item, folder.index())
+                qApp.processEvents()
+
+            name = "import scenes in view ({})".format("bulk" if bulk else "one by one")
+            report(name, size, timeit(imp), "ms")
+
+
+def benchCompile(depths=(5, 20, 50)):
+    """
+    Calls compile() on every item of a tree made of folders `depth` levels
+    deep, with 100 texts each, the way views do when painting.
+    """
+    for depth in depths:
+        mdl = outlineModel(None)
+        items = []
+        parent = mdl.rootItem
+        with mdl.bulk():
+            for d in range(depth):
+                parent = outlineItem(title="Folder {}".format(d), parent=parent)
+                items.extend(outlineItem(title="Scene", _type="md", parent=parent)
+                             for _ in range(100))
+
+        def paint():
+            for item in items:
+                item.data(Outline.compile, Qt.CheckStateRole)
+
+        report("compile state (per item)", depth, timeit(paint, 3) / len(items), "us")
+
+
+def benchMemory(folders=500, texts=100):
+    """
+    Memory used by an outline of `folders` folders with `texts` short text
+    items each (50k items by default).
+    """
+    gc.collect()
+    before = rss()
+
+    mdl = outlineModel(None)
+    with mdl.bulk():
+        for f in range(folders):
+            folder = outlineItem(title="Folder {}".format(f), parent=mdl.rootItem)
+            for t in range(texts):
+                item = outlineItem(title="Scene {}".format(t), _type="md", parent=folder)
+                item.setData(Outline.summarySentence, "A short summary.")
+                item.setData(Outline.text, "Lorem ipsum dolor sit amet.")
+
+    gc.collect()
+    size = mdl.rootItem.childCountRecursive()
+    used = rss() - before
+    report("memory: outline (RSS)", size, used, "MB")
+    report("memory: per item (RSS)", size, used / size, "B")
+    return mdl
+
+
+if __name__ == "__main__":
+    benchGetItemByID()
+    benchIndexFromItem()
+    benchFindUniqueID()
+    benchLoadFromXML()
+    benchCopy()
+    benchImport()
+    benchImportWithView()
+    benchCompile()
+    benchMemory()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# --!-- coding: utf8 --!--
+
+"""Benchmarks for saving and loading projects."""
+
+import shutil
+import tempfile
+import time
+
+from path import Path
+
+from benchmarks import report
+from manuskript import settings
+from manuskript.enums import Outline
+from manuskript.models import outlineItem
+from manuskript.project import Project, ProjectV1
+
+
+def bigProject(filename, folders, texts, revisions=0):
+    """
+    Returns a project with `folders` folders of `texts` text items each,
+    that have `revisions` revisions each.
+    """
+    project = ProjectV1(filename)
+    mdl = project.mdlOutline
+    with mdl.bulk():
+        for f in range(folders):
+            folder = outlineItem(title="Folder {}".format(f), parent=mdl.rootItem)
+            for t in range(texts):
+                item = outlineItem(title="Scene {}".format(t), _type="md", parent=folder)
+                item.setData(Outline.text, "Lorem ipsum dolor sit amet. " * 50)
+                for r in range(revisions):
+                    item.appendRevision(r, "Lorem ipsum. " * 50)
+    return project
+
+
+def benchSave(sizes=((20, 50), (100, 100))):
+    """
+    Time during which the GUI is blocked when saving: the whole save with
+    `save`, only the snapshot with `saveInBackground`.
+    """
+    settings.revisions["keep"] = False
+    tmp = Path(tempfile.mkdtemp())
+
+    try:
+        for folders, texts in sizes:
+            for zipped in [True, False]:
+                project = bigProject(tmp / "project.msk", folders, texts)
+                project.zipped = zipped
+                size = project.mdlOutline.rootItem.childCountRecursive()
+                mode = "zip" if zipped else "folder"
+
+                t = time.perf_counter()
+                project.save()
+                report("save, {} (blocking)".format(mode), size,
+                       time.perf_counter() - t, "ms")
+
+                t = time.perf_counter()
+                project.saveInBackground()
+                report("saveInBackground, {} (blocking)".format(mode), size,
+                       time.perf_counter() - t, "ms")
+                project.waitForSave()
+
+    finally:
+        shutil.rmtree(tmp)
+
+
+def benchIncrementalSave(sizes=((20, 50), (100, 100))):
+    """
+    Saving a zipped project after editing one text: the first save writes
+    everything, the next ones only what has changed.
+    """
+    settings.revisions["keep"] = False
+    tmp = Path(tempfile.mkdtemp())
+
+    try:
+        for folders, texts in sizes:
+            project = bigProject(tmp / "project.msk", folders, texts)
+            project.zipped = True
+            size = project.mdlOutline.rootItem.childCountRecursive()
+
+            t = time.perf_counter()
+            project.save()
+            report("save, everything", size, time.perf_counter() - t, "ms")
+
+            item = project.mdlOutline.rootItem.child(0).child(0)
+            item.setData(Outline.text, "Edited.")
+            t = time.perf_counter()
+            project.save()
+            report("save, one text edited", size, time.perf_counter() - t, "ms")
+
+    finally:
+        shutil.rmtree(tmp)
+
+
+def benchSync(folders=20, texts=50):
+    """
+    Cost of syncing saved files to disk: whole saves, and saves after
+    editing one text.
+    """
+    settings.revisions["keep"] = False
+    tmp = Path(tempfile.mkdtemp())
+
+    try:
+        for zipped in [True, False]:
+            for sync in [False, True]:
+                project = bigProject(tmp / "project.msk", folders, texts)
+                project.zipped = zipped
+                project.sync = sync
+                size = project.mdlOutline.rootItem.childCountRecursive()
+                mode = "{}, {}".format("zip" if zipped else "folder",
+                                       "synced" if sync else "not synced")
+
+                t = time.perf_counter()
+                project.save()
+                report("save, {}".format(mode), size, time.perf_counter() - t, "ms")
+
+                project.mdlOutline.rootItem.child(0).child(0).setData(Outline.text, "Edited.")
+                t = time.perf_counter()
+                project.save()
+                report("save one text, {}".format(mode), size, time.perf_counter() - t, "ms")
+
+                shutil.rmtree(tmp)
+                tmp.mkdir()
+
+    finally:
+        shutil.rmtree(tmp)
+
+
+def benchLoad(sizes=((20, 50), (100, 100))):
+    """
+    Loading a project with all its texts, read by one thread and by a pool
+    of threads, and lazily (texts are read when they are needed).
+    """
+    settings.revisions["keep"] = False
+    tmp = Path(tempfile.mkdtemp())
+    workers = ProjectV1.loadWorkers
+
+    try:
+        for folders, texts in sizes:
+            for zipped in [True, False]:
+                project = bigProject(tmp / "project.msk", folders, texts)
+                project.zipped = zipped
+                project.save()
+                size = project.mdlOutline.rootItem.childCountRecursive()
+                mode = "zip" if zipped else "folder"
+
+                for name, threads, lazy in [("one thread", 1, False),
+                                            ("threads", workers, False),
+                                            ("threads, lazy", workers, True)]:
+                    ProjectV1.loadWorkers = threads
+                    t = time.perf_counter()
+                    Project.load(tmp / "project.msk", lazy=lazy)
+                    report("load, {}, {}".format(mode, name), size,
+                           time.perf_counter() - t, "ms")
+
+                shutil.rmtree(tmp)
+                tmp.mkdir()
+
+    finally:
+        ProjectV1.loadWorkers = workers
+        shutil.rmtree(tmp)
+
+
+def benchLoadRevisions(sizes=((10, 50), (60, 100)), revisions=20):
+    """
+    Loading a zipped project whose texts have `revisions` revisions each,
+    and saving it after adding one: only that one is written to the
+    revision store.
+    """
+    settings.revisions["keep"] = False
+    tmp = Path(tempfile.mkdtemp())
+
+    try:
+        for folders, texts in sizes:
+            project = bigProject(tmp / "project.msk", folders, texts, revisions)
+            project.zipped = True
+            project.save(save_revisions=True)
+            size = folders * texts * revisions
+
+            t = time.perf_counter()
+            project = Project.load(tmp / "project.msk")
+            report("load, with revisions", size, time.perf_counter() - t, "ms")
+
+            item = project.mdlOutline.rootItem.child(0).child(0)
+            item.appendRevision(revisions, "Edited.")
+            item.setData(Outline.text, "Edited.")
+            t = time.perf_counter()
+            project.save(save_revisions=True)
+            report("save, one revision added", size, time.perf_counter() - t, "ms")
+            project.mdlOutline.revisionStore.close()
+
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    benchSave()
+    benchIncrementalSave()
+    benchSync()
+    benchLoad()
+    benchLoadRevisions()
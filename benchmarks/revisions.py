@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# --!-- coding: utf8 --!--
+
+"""Benchmarks for revisions."""
+
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from path import Path
+
+from benchmarks import report
+from manuskript import settings
+from manuskript.enums import Outline
+from manuskript.models import outlineItem, revisionStore
+from manuskript.project import ProjectV1
+
+
+def benchEditingSession(words=5000, edits=500, intervals=(1, 20)):
+    """
+    A writing session on a scene of `words` words: `edits` submits of a few
+    words each, with all revisions kept. Memory taken by revisions and size
+    of the revision store, with a whole text every `intervals` revisions (1
+    keeps all texts whole).
+    """
+    settings.revisions["keep"] = True
+    settings.revisions["smartremove"] = False
+    keyframeInterval = revisionStore.keyframeInterval
+    tmp = Path(tempfile.mkdtemp())
+
+    try:
+        for interval in intervals:
+            revisionStore.keyframeInterval = interval
+            random.seed(0)
+            project = ProjectV1(tmp / "project.msk")
+            item = outlineItem(title="Scene", _type="md", parent=project.mdlOutline.rootItem)
+            text = ["Lorem ipsum dolor sit amet."] * (words // 5)
+            item.setData(Outline.text, " ".join(text))
+
+            tracemalloc.start()
+            t = time.perf_counter()
+            for e in range(edits):
+                text.insert(random.randrange(len(text)), "New words {}.".format(e))
+                item.setData(Outline.text, " ".join(text))
+            t = time.perf_counter() - t
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+
+            name = "K={}".format(interval)
+            report("edit, " + name, edits, t / edits, "ms")
+            report("revisions in memory, " + name, edits, memory, "MB")
+
+            project.save(save_revisions=True)
+            report("revision store, " + name, edits,
+                   (tmp / "project.revisions").size, "MB")
+            project.mdlOutline.revisionStore.close()
+            (tmp / "project.revisions").remove()
+
+    finally:
+        revisionStore.keyframeInterval = keyframeInterval
+        shutil.rmtree(tmp)
+
+
+def benchSmartRemove(sizes=(100, 1000, 5000), edits=200):
+    """
+    Submits on a scene that already has revisions, one a week for years,
+    with smart remove on.
+    """
+    settings.revisions["keep"] = True
+    settings.revisions["smartremove"] = True
+    tmp = Path(tempfile.mkdtemp())
+
+    try:
+        for size in sizes:
+            project = ProjectV1(tmp / "project.msk")
+            item = outlineItem(title="Scene", _type="md", parent=project.mdlOutline.rootItem)
+            now = time.time()
+            for r in range(size):
+                item.appendRevision(now - (size - r) * 60 * 60 * 24 * 7, "Revision {}.".format(r))
+            item.setData(Outline.text, "Lorem ipsum dolor sit amet. " * 1000)
+
+            t = time.perf_counter()
+            for e in range(edits):
+                item.setData(Outline.text, "Lorem ipsum dolor sit amet. " * 1000 + str(e))
+            report("edit, with smart remove", size,
+                   (time.perf_counter() - t) / edits, "ms")
+
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    benchEditingSession()
+    benchSmartRemove()
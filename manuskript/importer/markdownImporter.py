@@ -84,7 +84,7 @@ class markdownImporter(abstractImporter):
 
         def addTitle(name, parent, level):
             child = outlineItem(title=name, parent=parent)
-            child.__miLevel = level
+            levels[child] = level
             items.append(child)
             return child
 
@@ -92,8 +92,8 @@ class markdownImporter(abstractImporter):
         setextHeader1 = re.compile(r"([^\#-=].+)\n(===+)$", re.MULTILINE)    #@UndefinedVariable
         setextHeader2 = re.compile(r"([^\#-=].+)\n(---+)$", re.MULTILINE)    #@UndefinedVariable
 
-        # We store the level of each item in a temporary var
-        parent.__miLevel = 0  # markdown importer header level
+        # We store the level of each item in a temporary dict
+        levels = {parent: 0}  # markdown importer header level
 
         txt = txt.split("\n")
         skipNextLine = False
@@ -138,12 +138,11 @@ class markdownImporter(abstractImporter):
                 content = saveContent(content, parent)
 
                 # get parent level
-                while parent.__miLevel >= level:
+                while levels[parent] >= level:
                     parent = parent.parent()
 
                 # create title
                 child = addTitle(name, parent, level)
-                child.__miLevel = level
 
                 # title becomes the new parent
                 parent = child
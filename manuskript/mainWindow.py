@@ -744,7 +744,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         settings.initDefaultValues()
 
         # Load data
-        project = Project.load(project_path)
+        project = Project.load(project_path, lazy=True)
         
         if project.settings:
             settings.load(project.settings, fromString=True, protocol=0)
@@ -986,6 +986,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.saveTimerNoChanges.timeout.connect(self.saveDatas)
         self.saveTimerNoChanges.stop()
 
+        # Feedback when the project is saved, see saveDatas
+        self.currentProject.saved.connect(self.projectSaved)
+        self.currentProject.saveFailed.connect(self.projectSaveFailed)
+
         # UI
         for i in [self.actOpen, self.menuRecents]:
             i.setEnabled(False)
@@ -1014,7 +1018,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.mainEditor.closeAllTabs()
 
         # Save datas
-        self.saveDatas()
+        self.saveDatas(wait=True)
 
         self.currentProject = None
         QSettings().setValue("lastProject", "")
@@ -1072,7 +1076,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         # Save data from models
         if self.currentProject and settings.saveOnQuit:
-            self.saveDatas()
+            self.saveDatas(wait=True)
 
             # closeEvent
             # QMainWindow.closeEvent(self, event)  # Causing segfaults?
@@ -1081,11 +1085,14 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         if settings.autoSaveNoChanges:
             self.saveTimerNoChanges.start()
 
-    def saveDatas(self, projectName=None):
+    def saveDatas(self, projectName=None, wait=False):
         """Saves the current project (in self.currentProject).
 
         If ``projectName`` is given, currentProject becomes projectName.
         In other words, it "saves as...".
+
+        The project is written on disk in the background (see
+        Project.saveInBackground), unless ``wait`` is True.
         """
         if not self.currentProject.filename:
             return
@@ -1095,18 +1102,23 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         
         if projectName:
             QSettings().setValue("lastProject", str(projectName))
-            self.currentProject.save_as(projectName, save_revisions)
+            self.currentProject.filename = Path(projectName)
+
+        if wait:
+            self.currentProject.save(save_revisions=save_revisions)
         else:
-            self.currentProject.save(save_revisions)
+            self.currentProject.saveInBackground(save_revisions=save_revisions)
         
         self.saveTimerNoChanges.stop()
-        
-        if not self.currentProject.savingErrors:
-            feedback = self.tr("Project {} saved.").format(self.currentProject.name)
-            F.statusMessage(feedback, importance=0)
-        else:
-            feedback = self.tr("WARNING: errors occured while saving.").format(projectName)
-            F.statusMessage(feedback, importance=3)
+
+    def projectSaved(self):
+        feedback = self.tr("Project {} saved.").format(self.currentProject.name)
+        F.statusMessage(feedback, importance=0)
+        logger.info(feedback)
+
+    def projectSaveFailed(self, error):
+        feedback = self.tr("WARNING: errors occured while saving.")
+        F.statusMessage(feedback, importance=3)
         logger.info(feedback)
 
 
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # --!-- coding: utf8 --!--
 
+from collections import Counter
 import logging
 
 from PyQt5.QtCore import QModelIndex
@@ -21,14 +22,20 @@ class abstractItem():
     # Used for XML export
     name = "abstractItem"
 
+    # Projects can have tens of thousands of items, so they have no __dict__.
+    # IDs and _nextID are only set on the root item, by checkIDs.
+    __slots__ = ("_data", "childItems", "_parent", "_model", "_row",
+                 "_lastPath", "IDs", "_nextID")
+
     def __init__(self, model=None, title="", _type="abstract", xml=None, parent=None, ID=None):
 
-        self._data = {}
+        # Data, indexed by the enum's values. None means not set.
+        self._data = [None] * len(self.enum)
         self.childItems = []
         self._parent = None
         self._model = model
+        self._row = None  # Cached position in parent's childItems, see row()
 
-        self.IDs = ["0"]  # used by root item to store unique IDs
         self._lastPath = "" # used by loadSave version_1 to remember which files the items comes from,
                             # in case it is renamed / removed
 
@@ -59,6 +66,17 @@ class abstractItem():
         else:
             return QModelIndex()
 
+    def inBulk(self):
+        "Returns True if the item's model is in a bulk block (see abstractModel.bulk)."
+        return self._model is not None and self._model.inBulk()
+
+    def updateAfterBulk(self, emit=True):
+        """
+        Called on the root item when leaving a bulk block, once the new items
+        have their IDs. Subclass this to update computed data.
+        """
+        return
+
     def emitDataChanged(self, cols=None, recursive=False):
         """
         Emits the dataChanged signal of the model, to signal views that data
@@ -69,6 +87,16 @@ class abstractItem():
         @param recursive: boolean. If true, all children will also emit the
                      dataChanged signal.
         """
+        if self.inBulk():
+            # Signals are emitted when leaving the bulk block. New items
+            # don't need any: views are told they have been inserted.
+            if self._model.isItemIndexed(self):
+                self._model.emitDataChangedLater(self, cols or list(self.enum))
+            if recursive:
+                for c in self.children():
+                    c.emitDataChanged(cols, recursive=True)
+            return
+
         idx = self.index()
         if idx and self._model:
             if not cols:
@@ -89,10 +117,10 @@ class abstractItem():
     #######################################################################
 
     def title(self):
-        return self._data.get(self.enum.title, "")
+        return self._data[self.enum.title] or ""
 
     def ID(self):
-        return self._data.get(self.enum.ID)
+        return self._data[self.enum.ID]
 
     def columnCount(self):
         return len(self.enum)
@@ -120,18 +148,51 @@ class abstractItem():
         return self.childItems
 
     def row(self):
-        if self.parent():
-            return self.parent().childItems.index(self)
+        """
+        Returns the position of the item in its parent's children.
+
+        Positions are cached on the items. The cache is checked on every call,
+        and if it is stale (children have been inserted, removed or moved),
+        all the siblings are renumbered at once.
+
+        Returns None if the item has been removed from its parent.
+        """
+        parent = self.parent()
+        if parent:
+            siblings = parent.childItems
+            row = self._row
+            if row is None or row >= len(siblings) or siblings[row] is not self:
+                parent.updateChildrenRows()
+                row = self._row
+                if row is None or row >= len(siblings) or siblings[row] is not self:
+                    return None
+            return row
+
+    def updateChildrenRows(self, start=0):
+        "Updates the cached row of children, starting at row `start`."
+        for row in range(start, len(self.childItems)):
+            self.childItems[row]._row = row
 
     def appendChild(self, child):
         self.insertChild(self.childCount(), child)
 
     def insertChild(self, row, child):
+        if self.inBulk():
+            # Views must be told before the tree changes
+            self._model.bulkChanged(self)
         self.childItems.insert(row, child)
         child._parent = self
+        if row >= len(self.childItems) - 1:
+            # Appended: no need to renumber the siblings
+            child._row = len(self.childItems) - 1
         child.setModel(self._model)
+        if self.inBulk():
+            # IDs are given when leaving the bulk block
+            return
         if not child.ID():
             child.getUniqueID()
+        if self._model:
+            self._model.registerItem(child)
 
     def removeChild(self, row):
         """
@@ -139,7 +200,12 @@ class abstractItem():
         @param row: index (int) of the child to remove.
         @return: the removed abstractItem
         """
+        if self.inBulk():
+            self._model.bulkChanged(self)
         r = self.childItems.pop(row)
+        r._row = None
+        if self._model:
+            self._model.unregisterItem(r)
         return r
 
     def parent(self):
@@ -169,14 +235,33 @@ class abstractItem():
         else:
             return -1
 
-    def copy(self):
+    def copy(self, keepIDs=False):
         """
-        Returns a copy of item, with no parent, and no ID.
+        Returns a deep copy of item and its children, with no parent and no
+        model. Unless `keepIDs` is True, copies have no ID: they get new ones
+        when inserted in a model.
+
+        Copy is done in memory, data and children are copied directly.
         """
-        item = self.__class__(xml=self.toXML())
-        item.setData(self.enum.ID, None)
+        item = self.__class__()
+        item._data = self.copyData()
+        if not keepIDs:
+            item._data[self.enum.ID] = None
+
+        for c in self.childItems:
+            child = c.copy(keepIDs)
+            child._parent = item
+            child._row = len(item.childItems)
+            item.childItems.append(child)
+
         return item
 
+    def copyData(self):
+        """
+        Returns a copy of `self._data`. Subclass this to copy mutable values.
+        """
+        return list(self._data)
+
     ###############################################################################
     # IDS
     ###############################################################################
@@ -189,14 +274,23 @@ class abstractItem():
                 c.getUniqueID(recursive)
 
     def checkIDs(self):
-        """This is called when a model is loaded.
+        """This is called on the root item when a model is created or loaded.
 
-        Makes a list of all sub-items IDs, that is used to generate unique IDs afterwards.
+        Makes a set of all sub-items IDs, that is used to generate unique IDs afterwards.
         """
-        self.IDs = self.listAllIDs()
+        count = Counter(i for i in self.listAllIDs() if i)
 
-        if max([self.IDs.count(i) for i in self.IDs if i]) != 1:
-            logger.warning("There are some items with same IDs: %s", [i for i in self.IDs if i and self.IDs.count(i) != 1])
+        duplicates = [i for i, n in count.items() if n > 1]
+        if duplicates:
+            logger.warning("There are some items with same IDs: %s", duplicates)
+
+        self.IDs = set()
+        for i in count:
+            try:
+                self.IDs.add(int(i))
+            except ValueError:
+                pass
+        self._nextID = 1
 
         def checkChildren(item):
             for c in item.children():
@@ -214,11 +308,19 @@ class abstractItem():
         return IDs
 
     def findUniqueID(self):
-        IDs = [int(i) for i in self.IDs]
-        k = 1
-        while k in IDs:
+        """
+        Returns the smallest unused ID (as str) and marks it as used.
+
+        IDs are never given back (until next checkIDs), so no ID below
+        `self._nextID` is free and allocating n IDs takes O(n) overall.
+        IDs of items that were inserted with their own ID are skipped too.
+        """
+        k = self._nextID
+        while k in self.IDs or \
+              self._model and self._model.getItemByID(str(k)) is not None:
             k += 1
-        self.IDs.append(str(k))
+        self.IDs.add(k)
+        self._nextID = k + 1
         return str(k)
 
     #######################################################################
@@ -228,12 +330,23 @@ class abstractItem():
     def data(self, column, role=Qt.DisplayRole):
         # Return value in self._data
         if role == Qt.DisplayRole or role == Qt.EditRole:
-            return self._data.get(column, "")
+            if not 0 <= column < len(self._data):
+                return ""
+            data = self._data[column]
+            return "" if data is None else data
 
         # Or return QVariant
         return QVariant()
 
     def setData(self, column, data, role=Qt.DisplayRole):
+        # Only columns of self.enum are stored
+        if not 0 <= column < len(self._data):
+            return
+
+        # Keeping the model's ID index up to date
+        if column == self.enum.ID and self._model:
+            self._model.updateItemID(self, self._data[column], data)
+
         # Setting data
         self._data[column] = data
 
@@ -256,6 +369,12 @@ class abstractItem():
         You can define in XMLExclude and XMLForce what you want to be
         excluded or forcibly included.
         """
+        return ET.tostring(self.toXMLElement())
+
+    def toXMLElement(self):
+        """
+        Returns the item (and children) as an lxml element. See `toXML`.
+        """
         item = ET.Element(self.name)
 
         for attrib in self.enum:
@@ -272,9 +391,9 @@ class abstractItem():
         item = self.toXMLProcessItem(item)
 
         for i in self.childItems:
-            item.append(ET.XML(i.toXML()))
+            item.append(i.toXMLElement())
 
-        return ET.tostring(item)
+        return item
 
     def toXMLProcessItem(self, item):
         """
@@ -283,11 +402,19 @@ class abstractItem():
         return item
 
     def setFromXML(self, xml):
-        root = ET.XML(xml)
+        """
+        Restores item and children from `xml`, which can be a string or an
+        already parsed lxml element.
+
+        The whole tree is built in a single pass over the parsed elements.
+        Data are set directly, so no signal is emitted while loading.
+        """
+        root = xml if ET.iselement(xml) else ET.XML(xml)
 
-        for k in self.enum:
-            if k.name in root.attrib:
-                self.setData(k, str(root.attrib[k.name]))
+        members = self.enum.__members__
+        for name, value in root.attrib.items():
+            if name in members:
+                self._data[members[name]] = str(value)
 
         if "lastPath" in root.attrib:
             self._lastPath = root.attrib["lastPath"]
@@ -296,7 +423,10 @@ class abstractItem():
 
         for child in root:
             if child.tag == self.name:
-                _ = self.__class__(self._model, xml=ET.tostring(child), parent=self)
+                item = self.__class__(self._model, xml=child)
+                item._parent = self
+                item._row = len(self.childItems)
+                self.childItems.append(item)
 
     def setFromXMLProcessMore(self, root):
         """
@@ -2,8 +2,9 @@
 # --!-- coding: utf8 --!--
 
 import locale
+from contextlib import contextmanager
 
-from PyQt5.QtCore import QAbstractItemModel, QMimeData
+from PyQt5.QtCore import QAbstractItemModel, QMimeData, QTimer
 from PyQt5.QtCore import QModelIndex
 from PyQt5.QtCore import QSize
 from PyQt5.QtCore import QVariant
@@ -37,12 +38,29 @@ class abstractModel(QAbstractItemModel):
     def __init__(self, parent):
         QAbstractItemModel.__init__(self, parent)
 
+        # Index of all items in the tree by ID, so that finding an item does
+        # not require walking the whole tree.
+        self._itemsByID = {}
+
         self.rootItem = outlineItem(self, title="Root", ID="0")
+        self.rebuildIDIndex()
+        self.rootItem.checkIDs()
 
         # Stores removed item, in order to remove them on disk when saving, depending on the file format.
         self.removed = []
         self._removingRows = False
 
+        # Coalesced dataChanged signals, see emitDataChangedLater
+        self._pendingDataChanged = {}
+        self._dataChangedTimer = QTimer(self)
+        self._dataChangedTimer.setSingleShot(True)
+        self._dataChangedTimer.setInterval(0)
+        self._dataChangedTimer.timeout.connect(self.emitPendingDataChanged)
+
+        # Bulk changes, see bulk
+        self._bulkLevel = 0
+        self._bulkReset = False
+
     def index(self, row, column, parent):
 
         if not self.hasIndex(row, column, parent):
@@ -63,18 +81,12 @@ class abstractModel(QAbstractItemModel):
         if item == self.rootItem:
             return QModelIndex()
 
-        parent = item.parent()
-        if not parent:
-            parent = self.rootItem
-
-        if len(parent.children()) == 0:
+        row = item.row()
+        if row is None:
+            # Item is not in the tree
             return None
 
-        # print(item.title(), [i.title() for i in parent.children()])
-
-        row = parent.children().index(item)
-        col = column
-        return self.createIndex(row, col, item)
+        return self.createIndex(row, column, item)
 
     def ID(self, index):
         if index.isValid():
@@ -89,16 +101,65 @@ class abstractModel(QAbstractItemModel):
         return self.rootItem.findItemsContaining(text, columns, mainWindow(), caseSensitive)
 
     def getItemByID(self, ID):
-        def search(item):
-            if item.ID() == ID:
-                return item
+        return self._itemsByID.get(ID)
+
+    def isItemIndexed(self, item):
+        "Returns True if `item` is part of the model's tree (and thus indexed)."
+        return item is not None and self._itemsByID.get(item.ID()) is item
+
+    def rebuildIDIndex(self):
+        """
+        Rebuilds the ID index from scratch. Must be called when `rootItem` is
+        replaced. If several items share an ID, the first one in tree order
+        is kept.
+        """
+        self._itemsByID = {}
+
+        def index(item):
+            if item.ID():
+                self._itemsByID.setdefault(item.ID(), item)
             for c in item.children():
-                r = search(c)
-                if r:
-                    return r
+                index(c)
+
+        index(self.rootItem)
 
-        item = search(self.rootItem)
-        return item
+    def registerItem(self, item):
+        """
+        Adds `item` and all its children to the ID index, if `item` has just
+        been inserted in the model's tree. Items without ID get a new one.
+        The index points to the inserted items even if their IDs are already
+        there: an item moved by drag and drop is inserted before the source
+        is removed.
+        """
+        if not self.isItemIndexed(item.parent()):
+            return
+
+        def register(item):
+            if not item.ID():
+                item.getUniqueID()
+            self._itemsByID[item.ID()] = item
+            for c in item.children():
+                register(c)
+
+        register(item)
+
+    def unregisterItem(self, item):
+        "Removes `item` and all its children from the ID index."
+        if self._itemsByID.get(item.ID()) is item:
+            del self._itemsByID[item.ID()]
+        for c in item.children():
+            self.unregisterItem(c)
+
+    def updateItemID(self, item, oldID, newID):
+        "Keeps the ID index in sync when the ID of `item` changes."
+        if self._itemsByID.get(oldID) is item:
+            del self._itemsByID[oldID]
+        elif self.inBulk() or not self.isItemIndexed(item.parent()):
+            # Item is not in the tree (yet), or is being added in a bulk block
+            return
+
+        if newID:
+            self._itemsByID.setdefault(newID, item)
 
     def getIndexByID(self, ID, column=0):
         "Returns the index of item whose ID is `ID`. If none, returns QModelIndex()."
@@ -163,6 +224,30 @@ class abstractModel(QAbstractItemModel):
 
         return True
 
+    def emitDataChangedLater(self, item, cols):
+        """
+        Emits dataChanged for columns `cols` of `item` at the next event loop
+        turn. All the changes in between are emitted once per item, which
+        matters when word counts are propagated up the tree many times.
+        """
+        self._pendingDataChanged.setdefault(item, set()).update(cols)
+        if not self._dataChangedTimer.isActive() and not self.inBulk():
+            self._dataChangedTimer.start()
+
+    def emitPendingDataChanged(self):
+        if self.inBulk():
+            # Views are told when leaving the bulk block
+            return
+
+        pending, self._pendingDataChanged = self._pendingDataChanged, {}
+        self._dataChangedTimer.stop()
+
+        for item, cols in pending.items():
+            # Item might have been removed in the meantime
+            if item is self.rootItem or not self.isItemIndexed(item):
+                continue
+            self.dataChanged.emit(item.index(min(cols)), item.index(max(cols)))
+
     def headerData(self, section, orientation, role=Qt.DisplayRole):
         if orientation == Qt.Horizontal and role in [Qt.DisplayRole, Qt.ToolTipRole]:
             if section == Outline.title:
@@ -240,15 +325,21 @@ class abstractModel(QAbstractItemModel):
         mimeData = QMimeData()
 
         root = ET.Element("outlineItems")
+        items = []
 
         for index in indexes:
             if index.isValid() and index.column() == 0:
-                item = ET.XML(index.internalPointer().toXML())
-                root.append(item)
+                item = index.internalPointer()
+                root.append(item.toXMLElement())
+                items.append(item.copy(keepIDs=True))
 
         encodedData = ET.tostring(root)
 
         mimeData.setData("application/xml", encodedData)
+
+        # The XML is needed for other applications (or instances). Dropping
+        # in this one, we use in-memory copies instead. See decodeMimeData.
+        mimeData.outlineItems = items
         return mimeData
 
     def supportedDropActions(self):
@@ -302,19 +393,25 @@ class abstractModel(QAbstractItemModel):
     def decodeMimeData(self, data):
         if not data.hasFormat("application/xml"):
             return None
-        encodedData = bytes(data.data("application/xml")).decode()
-        root = ET.XML(encodedData)
-        if root is None:
-            return None
 
-        if root.tag != "outlineItems":
-            return None
+        if getattr(data, "outlineItems", None) is not None:
+            # Mime data comes from this application, see mimeData
+            items = [i.copy(keepIDs=True) for i in data.outlineItems]
 
-        items = []
-        for child in root:
-            if child.tag == "outlineItem":
-                item = outlineItem(xml=ET.tostring(child))
-                items.append(item)
+        else:
+            encodedData = bytes(data.data("application/xml")).decode()
+            root = ET.XML(encodedData)
+            if root is None:
+                return None
+
+            if root.tag != "outlineItems":
+                return None
+
+            items = []
+            for child in root:
+                if child.tag == "outlineItem":
+                    item = outlineItem(xml=child)
+                    items.append(item)
 
         # We remove every item whose parent is also in items, otherwise it gets
         # duplicated. (https://github.com/olivierkes/manuskript/issues/169)
@@ -399,10 +496,8 @@ class abstractModel(QAbstractItemModel):
         # But they might not be, if we cut, then paste. Paste is a Copy Action.
         # The first paste would not need new IDs. But subsequent ones will.
         if action == Qt.CopyAction:
-            IDs = self.rootItem.listAllIDs()
-
             for item in items:
-                if item.ID() in IDs:
+                if self.getItemByID(item.ID()) is not None:
                     # Recursively remove ID. So will get a new one when inserted.
                     def stripID(item):
                         item.setData(Outline.ID, None)
@@ -431,12 +526,14 @@ class abstractModel(QAbstractItemModel):
 
         # Insert only if parent is folder
         if parentItem.isFolder():
-            self.beginInsertRows(parent, row, row + len(items) - 1)
+            if not self.inBulk():
+                self.beginInsertRows(parent, row, row + len(items) - 1)
 
             for i in items:
                 parentItem.insertChild(row + items.index(i), i)
 
-            self.endInsertRows()
+            if not self.inBulk():
+                self.endInsertRows()
 
             return True
 
@@ -492,13 +589,15 @@ class abstractModel(QAbstractItemModel):
 
         self._removingRows = True  # Views that are updating can easily know
                                     # if this is due to row removal.
-        self.beginRemoveRows(parent, row, row + count - 1)
+        if not self.inBulk():
+            self.beginRemoveRows(parent, row, row + count - 1)
         for _ in range(count):
             item = parentItem.removeChild(row)
             self.removed.append(item)
 
         self._removingRows = False
-        self.endRemoveRows()
+        if not self.inBulk():
+            self.endRemoveRows()
         return True
 
         # def insertRow(self, row, item, parent=QModelIndex()):
@@ -513,11 +612,97 @@ class abstractModel(QAbstractItemModel):
 
         # self.endInsertRows()
 
+    ################# BULK CHANGES #################
+
+    @contextmanager
+    def bulk(self):
+        """
+        Context manager to make many changes to the tree at once:
+
+            with model.bulk():
+                for title in titles:
+                    outlineItem(title=title, parent=parentItem)
+
+        Inside the block, inserted items get no ID, word counts are not
+        propagated to the parents and no signal is emitted: the ID index only
+        knows about the items that were there before. When leaving, IDs are
+        given and computed data are updated once (see
+        abstractItem.updateAfterBulk). If the tree itself changes, views are
+        told with a model reset, begun before the first change and ended when
+        leaving the block.
+
+        Blocks can be nested, the outermost one does the work.
+        """
+        self._bulkLevel += 1
+        try:
+            yield self
+        finally:
+            if self._bulkLevel == 1:
+                self.endBulk()
+            else:
+                self._bulkLevel -= 1
+
+    def inBulk(self):
+        "Returns True if changes are being made in a bulk block."
+        return self._bulkLevel > 0
+
+    def bulkChanged(self, parentItem):
+        """
+        Called by items in a bulk block before children are inserted in (or
+        removed from) `parentItem`.
+        """
+        if not self.isItemIndexed(parentItem):
+            # Changes in a new item come with it
+            return
+
+        if not self._bulkReset:
+            self._bulkReset = True
+            self.beginResetModel()
+
+    def endBulk(self):
+        reset, self._bulkReset = self._bulkReset, False
+
+        # Items added in the block are the ones not indexed yet
+        new = []
+
+        def findNew(item):
+            for c in item.children():
+                if self.isItemIndexed(c):
+                    findNew(c)
+                else:
+                    new.append(c)
+
+        findNew(self.rootItem)
+
+        # Index new items, then give IDs to the ones without
+        self.rebuildIDIndex()
+
+        def giveIDs(item):
+            if not item.ID():
+                item.getUniqueID()
+            for c in item.children():
+                giveIDs(c)
+
+        for item in new:
+            giveIDs(item)
+        self.rebuildIDIndex()
+
+        self.rootItem.updateAfterBulk(emit=not reset)
+
+        self._bulkLevel = 0
+
+        if reset:
+            self._pendingDataChanged = {}
+            self.endResetModel()
+
+        if self._pendingDataChanged:
+            self._dataChangedTimer.start()
+
     ################# XML / saving / loading #################
 
     def saveToXML(self, xml=None):
         "If xml (filename) is given, saves the items to xml. Otherwise returns as string."
-        root = ET.XML(self.rootItem.toXML())
+        root = self.rootItem.toXMLElement()
         if xml:
             ET.ElementTree(root).write(xml, encoding="UTF-8", xml_declaration=True, pretty_print=True)
         else:
@@ -526,11 +711,12 @@ class abstractModel(QAbstractItemModel):
     def loadFromXML(self, xml, fromString=False):
         "Load from xml. Assume that xml is a filename. If fromString=True, xml is the content."
         if not fromString:
-            root = ET.parse(xml)
+            root = ET.parse(xml).getroot()
         else:
             root = ET.fromstring(xml)
 
-        self.rootItem = outlineItem(model=self, xml=ET.tostring(root), ID="0")
+        self.rootItem = outlineItem(model=self, xml=root, ID="0")
+        self.rebuildIDIndex()
         self.rootItem.checkIDs()
 
     def indexFromPath(self, path):
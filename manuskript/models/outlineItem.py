@@ -4,6 +4,7 @@
 import locale
 import logging
 import time
+from bisect import bisect_right
 
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QFont, QIcon
@@ -16,6 +17,7 @@ from manuskript import settings
 from manuskript.converters import HTML2PlainText
 from manuskript.enums import Outline
 from manuskript.models.abstractItem import abstractItem
+from manuskript.models.revisionStore import revisionDelta, revisionText
 
 
 try:
@@ -34,11 +36,21 @@ class outlineItem(abstractItem):
     # Used for XML export
     name = "outlineItem"
 
+    __slots__ = ("_compile", "_dirty", "_lazy", "_cleanAt", "_lastRevision")
+
+    # Columns that are not written in the item's file (computed)
+    notSaved = [enums.Outline.wordCount, enums.Outline.goalPercentage,
+                enums.Outline.revisions]
+
     def __init__(self, model=None, title="", _type="folder", xml=None, parent=None, ID=None):
+        self._compile = None  # Cached result of compile(), None if unknown
+        self._dirty = True  # Changed since the project was saved or loaded
+        self._lazy = None  # Reads text and notes, if not loaded yet (see loadLazy)
+        self._cleanAt = 0  # Number of revisions that triggers cleanRevisions
+        self._lastRevision = None  # (reference, text) of the last revision added
         abstractItem.__init__(self, model, title, _type, xml, parent, ID)
 
-        self.defaultTextType = None
-        if not self._data.get(self.enum.compile):
+        if not self._data[self.enum.compile]:
             self._data[self.enum.compile] = 2
 
     #######################################################################
@@ -61,12 +73,26 @@ class outlineItem(abstractItem):
         return self.data(self.enum.text)
 
     def compile(self):
-        if self._data.get(self.enum.compile, 1) in ["0", 0]:
-            return False
-        elif self.parent():
-            return self.parent().compile()
-        else:
-            return True  # rootItem always compile
+        if self._compile is None:
+            if self._data[self.enum.compile] in ["0", 0]:
+                self._compile = False
+            elif self.parent():
+                self._compile = self.parent().compile()
+            else:
+                self._compile = True  # rootItem always compile
+        return self._compile
+
+    def invalidateCompile(self):
+        """
+        Forgets the cached result of compile() for the item and its children,
+        when the compile flag of the item or one of its parents changes.
+        """
+        if self._compile is None:
+            # Then it is not cached for children either, see compile()
+            return
+        self._compile = None
+        for c in self.children():
+            c.invalidateCompile()
 
     def POV(self):
         return self.data(self.enum.POV)
@@ -84,7 +110,7 @@ class outlineItem(abstractItem):
         self.setData(self.enum.customIcon, customIcon)
 
     def wordCount(self):
-        return self._data.get(self.enum.wordCount, 0)
+        return int(self._data[self.enum.wordCount] or 0)
 
     #######################################################################
     # Data
@@ -92,8 +118,11 @@ class outlineItem(abstractItem):
 
     def data(self, column, role=Qt.DisplayRole):
 
-        data = abstractItem.data(self, column, role)
         E = self.enum
+        if self._lazy is not None and column in [E.text, E.notes]:
+            self.loadLazy()
+
+        data = abstractItem.data(self, column, role)
 
         if role == Qt.DisplayRole or role == Qt.EditRole:
             if data == "" and column == E.revisions:
@@ -131,30 +160,37 @@ class outlineItem(abstractItem):
             # Folder have no text
             return
 
+        if self._lazy is not None and column in [E.text, E.notes]:
+            self.loadLazy()
+
         if column == E.goal:
+            # The goal shown is computed (see updateGoal), the one set is
+            # stored in setGoal
+            column = E.setGoal
             try:
-                self._data[E.setGoal] = int(data)
-            except ValueError:
-                self._data[E.setGoal] = ""
-
-        # Checking if we will have to recount words
-        updateWordCount = False
-        if column in [E.wordCount, E.goal, E.setGoal]:
-            updateWordCount = not column in self._data or self._data[column] != data
+                data = int(data)
+            except (ValueError, TypeError):
+                data = ""
 
         # Stuff to do before
         if column == E.text:
             self.addRevision()
 
+        if column not in self.notSaved:
+            self._dirty = True
+
         # Calling base class implementation
         abstractItem.setData(self, column, data, role)
 
         # Stuff to do afterwards
         if column == E.text:
-            wc = F.wordCount(data)
-            self.setData(E.wordCount, wc)
+            self.addWordCount(F.wordCount(data) - self.wordCount())
+
+        if column in [E.goal, E.setGoal]:
+            self.updateGoal()
 
         if column == E.compile:
+            self.invalidateCompile()
             # Title changes when compile changes
             self.emitDataChanged(cols=[E.title, E.compile],
                                  recursive=True)
@@ -164,66 +200,167 @@ class outlineItem(abstractItem):
             # icons will be updated as well)
             self.emitDataChanged(cols=[E.title])
 
-        if updateWordCount:
-            self.updateWordCount()
+    def replaceText(self, start, end, text):
+        """
+        Replaces the characters of the text from `start` to `end` with
+        `text`. Same as setting the whole text, but only the words around
+        the change are counted again.
+        """
+        E = self.enum
+        if self.isFolder():
+            return
+
+        old = self.text() or ""
+        if old[start:end] == text:
+            return
+        new = old[:start] + text + old[end:]
+
+        # Words that the change touches: up to the spaces around it, which
+        # are the same before and after
+        s = start
+        while s > 0 and not old[s - 1].isspace():
+            s -= 1
+        e = end
+        while e < len(old) and not old[e].isspace():
+            e += 1
+        words = F.wordCount(new[s:e - end + start + len(text)]) - F.wordCount(old[s:e])
+
+        self.addRevision()
+        self._dirty = True
+        abstractItem.setData(self, E.text, new)
+        self.addWordCount(words)
+
+    def loadLazy(self):
+        """
+        Reads text and notes, which are left on disk until they are needed
+        when a project is loaded lazily (see ProjectV1.load).
+        """
+        E = self.enum
+        try:
+            notes, text = self._lazy(self)
+        except (OSError, KeyError) as e:
+            # Still not loaded: we don't want empty texts to be saved
+            logger.error("Could not read the text of %s: %s", self.title(), e)
+            return
+
+        self._lazy = None
+        self._data[E.notes] = notes or None
+        if not self.isFolder():
+            self._data[E.text] = text
 
     #######################################################################
     # Wordcount
     #######################################################################
 
+    def goal(self):
+        "Returns the goal: set by the user, or the sum of children's goals."
+        return int(self._data[self.enum.goal] or 0)
+
+    def userGoal(self):
+        "Returns the goal set by the user, or 0."
+        return int(self._data[self.enum.setGoal] or 0)
+
     def insertChild(self, row, child):
         abstractItem.insertChild(self, row, child)
-        self.updateWordCount()
+        child.invalidateCompile()
+        if not self.inBulk():
+            self.addWordCount(child.wordCount(), child.goal())
 
     def removeChild(self, row):
         r = abstractItem.removeChild(self, row)
-        # Might be causing segfault when updateWordCount emits dataChanged
-        self.updateWordCount(emit=False)
+        r.invalidateCompile()
+        if not self.inBulk():
+            self.addWordCount(-r.wordCount(), -r.goal())
         return r
 
-    def updateWordCount(self, emit=True):
-        """Update word count for item and parents.
-        If emit is False, no signal is emitted (sometimes cause segfault)"""
-        if not self.isFolder():
-            setGoal = int(self.data(self.enum.setGoal))
-            goal = int(self.data(self.enum.goal) or 0)
+    def addWordCount(self, words=0, goal=0, emit=True):
+        """
+        Adds `words` to the word count of the item and of its parents, and
+        `goal` to their goal, up to the first one whose goal is set by the
+        user.
 
-            if goal != setGoal:
-                self._data[self.enum.goal] = setGoal
-            if setGoal:
-                wc = int(self.data(self.enum.wordCount) or 0)
-                self.setData(self.enum.goalPercentage, wc / float(setGoal))
+        Only the differences are propagated, siblings are never counted
+        again. Views are told about the changes at the next event loop turn
+        (see abstractModel.emitDataChangedLater). If `emit` is False, they
+        are not told at all.
 
-        else:
-            wc = 0
-            for c in self.children():
-                wc += int(c.data(self.enum.wordCount) or 0)
-            self._data[self.enum.wordCount] = wc
-
-            setGoal = int(self.data(self.enum.setGoal) or 0)
-            goal = int(self.data(self.enum.goal) or 0)
+        In a bulk block, only the item itself is updated: parents are counted
+        when leaving (see updateAfterBulk).
+        """
+        item = self
+        while item is not None and (words or goal):
+            E = item.enum
+            item._data[E.wordCount] = item.wordCount() + words
 
-            if setGoal:
-                if goal != setGoal:
-                    self._data[self.enum.goal] = setGoal
-                    goal = setGoal
-            else:
+            if item.userGoal():
+                # Children's goal don't count, neither for parents
                 goal = 0
-                for c in self.children():
-                    goal += int(c.data(self.enum.goal) or 0)
-                self._data[self.enum.goal] = goal
-
-            if goal:
-                self.setData(self.enum.goalPercentage, wc / float(goal))
             else:
-                self.setData(self.enum.goalPercentage, "")
+                item._data[E.goal] = item.goal() + goal
 
-        if emit:
-            self.emitDataChanged([self.enum.goal, self.enum.setGoal,
-                                  self.enum.wordCount, self.enum.goalPercentage])
+            item.updateGoalPercentage(emit)
+            if item.inBulk():
+                break
+            item = item.parent()
 
-        if self.parent():
-            self.parent().updateWordCount(emit)
+    def updateGoal(self, emit=True):
+        """
+        Computes the goal when the user sets (or unsets) it, and propagates
+        the difference to the parents.
+        """
+        goal = self.userGoal()
+        if not goal:
+            goal = sum([c.goal() for c in self.children()])
+
+        delta = goal - self.goal()
+        self._data[self.enum.goal] = goal
+        self.updateGoalPercentage(emit)
+
+        if self.parent() and not self.inBulk():
+            self.parent().addWordCount(0, delta, emit)
+
+    def updateWordCount(self, emit=True, recount=True):
+        """
+        Counts words (and goals) of the item and its children again, from
+        scratch, and propagates the difference to the parents.
+
+        If `recount` is False, only text items that have no word count yet
+        are counted, for the others only the sums are made. Views are told
+        only about items that changed.
+        """
+        E = self.enum
+        words, goal = self.wordCount(), self.goal()
+
+        def count(item):
+            for c in item.children():
+                count(c)
+            old = (item.wordCount(), item.goal())
+            if item.isFolder():
+                item._data[E.wordCount] = sum([c.wordCount() for c in item.children()])
+            elif item._lazy is None and (recount or item._data[E.wordCount] is None):
+                item._data[E.wordCount] = F.wordCount(item._data[E.text] or "")
+            item._data[E.goal] = item.userGoal() or \
+                                 sum([c.goal() for c in item.children()])
+            item.updateGoalPercentage(emit and (item.wordCount(), item.goal()) != old)
+
+        count(self)
+
+        if self.parent() and not self.inBulk():
+            self.parent().addWordCount(self.wordCount() - words,
+                                       self.goal() - goal, emit)
+
+    def updateAfterBulk(self, emit=True):
+        "Makes the word count sums again, for the whole tree."
+        self.updateWordCount(emit, recount=False)
+
+    def updateGoalPercentage(self, emit=True):
+        E = self.enum
+        goal = self.goal()
+        self._data[E.goalPercentage] = self.wordCount() / float(goal) if goal else ""
+
+        if emit and self._model:
+            self._model.emitDataChangedLater(self, [E.wordCount, E.goal,
+                                                    E.goalPercentage, E.setGoal])
 
     def stats(self):
         wc = self.data(enums.Outline.wordCount)
@@ -251,9 +388,13 @@ class outlineItem(abstractItem):
         If called on a folder and recursive is True, then it is recursively
         applied to every children.
         """
+        with self._model.bulk():
+            return self._split(splitMark, recursive)
+
+    def _split(self, splitMark, recursive):
         if self.isFolder() and recursive:
             for c in self.children():
-                c.split(splitMark)
+                c._split(splitMark, recursive)
 
         else:
             txt = self.text().split(splitMark)
@@ -395,71 +536,162 @@ class outlineItem(abstractItem):
     ###############################################################################
 
     def revisions(self):
+        """
+        Returns the revisions of the item: a list of (timestamp, reference).
+        Reference is the ID of the revision's row in the revision store, or
+        if it has not been saved yet, its text or its differences with the
+        previous revision (a RevisionDelta). See revisionText.
+        """
         return self.data(self.enum.revisions)
 
+    def revisionText(self, ts):
+        "Returns the text of the revision `ts`, or None."
+        for t, ref in self.revisions():
+            if t == ts:
+                return self._revisionText(ref)
+
+    def _revisionText(self, ref):
+        store = self._model.revisionStore if self._model else None
+        return revisionText(ref, store)
+
+    def copyData(self, loadLazy=True):
+        """
+        Returns a copy of `self._data`. Text and notes are loaded first (see
+        loadLazy), unless `loadLazy` is False.
+        """
+        if loadLazy and self._lazy is not None:
+            self.loadLazy()
+        data = abstractItem.copyData(self)
+        if data[self.enum.revisions] is not None:
+            data[self.enum.revisions] = list(data[self.enum.revisions])
+        return data
+
     def appendRevision(self, ts, text):
-        if not self.enum.revisions in self._data:
+        if self._data[self.enum.revisions] is None:
             self._data[self.enum.revisions] = []
 
         self._data[self.enum.revisions].append((
             int(ts),
             text))
 
+    def appendRevisions(self, revisions):
+        "Appends a list of revisions: (timestamp, text)."
+        if self._data[self.enum.revisions] is None:
+            self._data[self.enum.revisions] = []
+
+        self._data[self.enum.revisions].extend(
+            (int(ts), text) for ts, text in revisions)
+
+    def setRevisionSaved(self, ts, ref, rowID):
+        """
+        Replaces the reference `ref` of the revision `ts` with `rowID`, the
+        row where it has been saved in the revision store (see revisions).
+        The revision is removed if rowID is None.
+        """
+        revisions = self._data[self.enum.revisions] or []
+        for i, (t, r) in enumerate(revisions):
+            if t == ts and r == ref:
+                if rowID is None:
+                    del revisions[i]
+                else:
+                    revisions[i] = (ts, rowID)
+                    if self._lastRevision is not None and self._lastRevision[0] is r:
+                        self._lastRevision = (rowID, self._lastRevision[1])
+                return
+
     def addRevision(self):
         if not settings.revisions["keep"]:
             return
 
-        if not self.enum.text in self._data:
+        if self._data[self.enum.text] is None:
             return
 
-        self.appendRevision(
-                time.time(),
-                self.text())
+        ts = int(time.time())
+        text = self.text()
+        revisions = self.revisions()
+        smartRemove = settings.revisions["smartremove"]
+
+        if revisions:
+            # Smart remove would drop it right away (see cleanRevisions):
+            # the previous revision is the last one kept in the latest span
+            last = revisions[-1][0]
+            rule = settings.revisions["rules"]
+            spans = [s for s in rule if s]
+            span = min(spans) if spans else None
+            if smartRemove and span in rule and (span is None or ts - last < span) \
+                    and ts - last < rule[span]:
+                return
+
+            # Kept as the differences with the previous revision, if any. Its
+            # text is kept when it is added, not to patch its deltas again.
+            base = revisions[-1][1]
+            if self._lastRevision is not None and self._lastRevision[0] is base:
+                previous = self._lastRevision[1]
+            else:
+                previous = self._revisionText(base)
+            if previous == text:
+                return
+            ref = revisionDelta(base, previous, text)
+        else:
+            ref = text
 
-        if settings.revisions["smartremove"]:
+        self.appendRevision(ts, ref)
+        self._lastRevision = (ref, text)
+
+        # Pruning is done once in a while, when revisions have piled up
+        if smartRemove and len(self.revisions()) >= self._cleanAt:
             self.cleanRevisions()
 
         self.emitDataChanged([self.enum.revisions])
 
     def deleteRevision(self, ts):
-        self._data[self.enum.revisions] = [r for r in self._data[self.enum.revisions] if r[0] != ts]
+        self._data[self.enum.revisions] = [r for r in self.revisions() if r[0] != ts]
         self.emitDataChanged([self.enum.revisions])
 
     def clearAllRevisions(self):
         self._data[self.enum.revisions] = []
+        self._lastRevision = None
         self.emitDataChanged([self.enum.revisions])
 
     def cleanRevisions(self):
-        "Keep only one some the revisions."
+        """
+        Keep only one some the revisions: each revision goes in the shortest
+        span of the rules (see settings.revisions) it is younger than, where
+        one revision per interval is kept, the first one. Revisions older
+        than all spans are removed, unless there is a span for ever (None).
+        Revisions are kept ordered by time.
+        """
         rev = self.revisions()
-        rev2 = []
         now = time.time()
 
         rule = settings.revisions["rules"]
+        spans = sorted(s for s in rule if s)
+        forever = None in rule
 
-        revs = {}
-        for i in rule:
-            revs[i] = []
+        # Revisions are ordered by time, unless they come from an older version
+        ordered = all(rev[i][0] <= rev[i + 1][0] for i in range(len(rev) - 1))
+        if not ordered:
+            rev = sorted(rev, key=lambda r: r[0])
 
+        # From the oldest revision, spans get shorter
+        rev2 = []
+        span = last = None
         for r in rev:
-            # Have to put the lambda key otherwise cannot order when one element is None
-            for span in sorted(rule, key=lambda x: x if x else 60 * 60 * 24 * 30 * 365):
-                if not span or now - r[0] < span:
-                    revs[span].append(r)
-                    break
-
-        for span in revs:
-            sortedRev = sorted(revs[span], key=lambda x: x[0])
-            last = None
-            for r in sortedRev:
-                if not last:
-                    rev2.append(r)
-                    last = r[0]
-                elif r[0] - last >= rule[span]:
-                    rev2.append(r)
-                    last = r[0]
-
-        if rev2 != rev:
+            i = bisect_right(spans, now - r[0])
+            if i == len(spans) and not forever:
+                continue
+            s = spans[i] if i < len(spans) else None
+            if s != span or last is None:
+                span = s
+                rev2.append(r)
+                last = r[0]
+            elif r[0] - last >= rule[span]:
+                rev2.append(r)
+                last = r[0]
+
+        self._cleanAt = len(rev2) + max(10, len(rev2) // 2)
+
+        if not ordered or len(rev2) != len(rev):
             self._data[self.enum.revisions] = rev2
             self.emitDataChanged([self.enum.revisions])
 
@@ -479,26 +711,47 @@ class outlineItem(abstractItem):
 
         # Saving revisions
         rev = self.revisions()
-        for r in rev:
+        for ts, ref in rev:
+            text = self._revisionText(ref)
+            if text is None:
+                continue
             revItem = ET.Element("revision")
-            revItem.set("timestamp", str(r[0]))
-            revItem.set("text", r[1])
+            revItem.set("timestamp", str(ts))
+            revItem.set("text", text)
             item.append(revItem)
 
         return item
 
 
+    def setFromXML(self, xml):
+        abstractItem.setFromXML(self, xml)
+
+        # Word counts and goals are not saved: now that children are loaded,
+        # we compute them. Item has no parent yet, so it goes up no further.
+        E = self.enum
+        if self.isFolder():
+            self._data[E.wordCount] = sum([c.wordCount() for c in self.children()])
+        self._data[E.goal] = self.userGoal() or \
+                             sum([c.goal() for c in self.children()])
+        self.updateGoalPercentage(emit=False)
+
     def setFromXMLProcessMore(self, root):
 
         # If loading from an old file format, convert to md and
         # remove html markup
         if self.type() in ["txt", "t2t"]:
-            self.setData(Outline.type, "md")
+            self._data[Outline.type] = "md"
 
         elif self.type() == "html":
-            self.setData(Outline.type, "md")
-            self.setData(Outline.text, HTML2PlainText(self.data(Outline.text)))
-            self.setData(Outline.notes, HTML2PlainText(self.data(Outline.notes)))
+            self._data[Outline.type] = "md"
+            self._data[Outline.text] = HTML2PlainText(self.data(Outline.text))
+            self._data[Outline.notes] = HTML2PlainText(self.data(Outline.notes))
+
+        if self.isFolder():
+            # Folder have no text
+            self._data[Outline.text] = None
+        elif self._data[Outline.text] is not None:
+            self._data[Outline.wordCount] = F.wordCount(self._data[Outline.text])
 
         # Revisions
         for child in root:
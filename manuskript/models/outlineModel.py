@@ -8,6 +8,9 @@ class outlineModel(abstractModel):
     def __init__(self, parent):
         abstractModel.__init__(self, parent)
 
+        # Where saved revisions are read from (see outlineItem.revisions)
+        self.revisionStore = None
+
     def findItemsByPOV(self, POV):
         "Returns a list of IDs of all items whose POV is ``POV``."
         return self.rootItem.findItemsByPOV(POV)
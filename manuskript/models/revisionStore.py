@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+# --!-- coding: utf8 --!--
+
+import json
+import logging
+import sqlite3
+from difflib import SequenceMatcher
+
+from path import Path
+
+logger = logging.getLogger('manuskript')
+
+# Revisions are kept as chains: the whole text every `keyframeInterval`
+# revisions of an item, and only the differences with the previous one in
+# between (see RevisionDelta). Longer chains are smaller, but slower to read.
+keyframeInterval = 20
+
+
+def diff(old, new):
+    """
+    Returns the operations that make the text `new` out of the text `old`
+    (see patch): [start, end] to copy old[start:end], or a string to insert.
+    The common start and end of both texts are found first, then the lines
+    that differ in between.
+    """
+    def common(a, b):
+        # Length of the common prefix, by bisection: slices compare fast
+        lo, hi = 0, min(len(a), len(b))
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if a[:mid] == b[:mid]:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+    start = common(old, new)
+    end = common(old[start:][::-1], new[start:][::-1])
+    a = old[start:len(old) - end]
+    b = new[start:len(new) - end]
+
+    ops = []
+
+    def copy(i, j):
+        if i == j:
+            return
+        if ops and type(ops[-1]) == list and ops[-1][1] == i:
+            ops[-1][1] = j
+        else:
+            ops.append([i, j])
+
+    def insert(s):
+        if not s:
+            return
+        if ops and type(ops[-1]) == str:
+            ops[-1] += s
+        else:
+            ops.append(s)
+
+    copy(0, start)
+    aLines = a.splitlines(True)
+    bLines = b.splitlines(True)
+    if len(aLines) > 1 and len(bLines) > 1:
+        offsets = [start]
+        for line in aLines:
+            offsets.append(offsets[-1] + len(line))
+        matcher = SequenceMatcher(None, aLines, bLines, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                copy(offsets[i1], offsets[i2])
+            else:
+                insert("".join(bLines[j1:j2]))
+    else:
+        insert(b)
+    copy(len(old) - end, len(old))
+    return ops
+
+
+def patch(old, ops):
+    "Returns the text made out of the text `old` by the operations `ops` (see diff)."
+    return "".join(op if type(op) == str else old[op[0]:op[1]] for op in ops)
+
+
+class RevisionDelta():
+    """
+    A revision kept as the differences with a previous one, `base`: its
+    text, another RevisionDelta, or the ID of its row in a revision store.
+    `depth` is the number of deltas from the last whole text.
+    """
+
+    __slots__ = ("base", "ops", "depth")
+
+    def __init__(self, base, ops, depth):
+        self.base = base
+        self.ops = ops
+        self.depth = depth
+
+
+def revisionText(ref, store=None):
+    """
+    Returns the text of the revision `ref` (see outlineItem.revisions), or
+    None. Revisions that are saved are read from `store`.
+    """
+    deltas = []
+    while type(ref) == RevisionDelta:
+        deltas.append(ref.ops)
+        ref = ref.base
+
+    if type(ref) != str:
+        ref = store.text(ref) if store and ref is not None else None
+        if ref is None:
+            return None
+
+    for ops in reversed(deltas):
+        ref = patch(ref, ops)
+    return ref
+
+
+def revisionDelta(base, old, new):
+    """
+    Returns the reference of a revision whose text is `new`, for an item
+    whose previous revision is `base`, of text `old`: a RevisionDelta, or
+    `new` itself when a whole text is due (see keyframeInterval).
+    """
+    depth = base.depth + 1 if type(base) == RevisionDelta else 1
+    if old is None or depth >= keyframeInterval:
+        return new
+    return RevisionDelta(base, diff(old, new), depth)
+
+
+class RevisionStore():
+    """
+    Revisions of the outline items of a project, in an SQLite database next
+    to the project file (see pathFor). Saving revisions only adds the new
+    ones to it, and removes the ones that are gone.
+
+    Items only know their revisions by timestamp and reference: the ID of a
+    row in the store, or for revisions that have not been saved yet, the
+    text itself or a RevisionDelta (see outlineItem.revisions). Texts are
+    read from the store when they are needed (see text).
+
+    Rows hold whole texts, or the differences (see diff) with a `base` row,
+    `depth` rows away from a whole text. Removing a row rewrites the ones
+    based on it.
+
+    A store is used from a single thread: the save thread opens its own.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._db = None
+
+    @staticmethod
+    def pathFor(filename):
+        "Returns the path of the revision store of the project `filename`."
+        filename = Path(filename)
+        return filename.parent / (filename.name.stripext() + ".revisions")
+
+    def exists(self):
+        return self.path.exists()
+
+    def db(self):
+        "Returns the connection to the database, created if needed."
+        if self._db is None:
+            self._db = sqlite3.connect(self.path)
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS revisions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    item TEXT NOT NULL,
+                    timestamp INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    base INTEGER,
+                    depth INTEGER NOT NULL DEFAULT 0)""")
+            self._db.execute("CREATE INDEX IF NOT EXISTS revisionsByItem ON revisions (item)")
+
+            # Stores written before deltas only have whole texts
+            columns = [c[1] for c in self._db.execute("PRAGMA table_info(revisions)")]
+            if "base" not in columns:
+                with self._db:
+                    self._db.execute("ALTER TABLE revisions ADD COLUMN base INTEGER")
+                    self._db.execute("ALTER TABLE revisions ADD COLUMN depth INTEGER NOT NULL DEFAULT 0")
+        return self._db
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def revisions(self):
+        """
+        Returns the revisions of all items, without their texts: a dict of
+        lists of (timestamp, row ID), by item ID.
+        """
+        revisions = {}
+        for ID, ts, rowID in self.db().execute(
+                "SELECT item, timestamp, id FROM revisions ORDER BY id"):
+            revisions.setdefault(ID, []).append((ts, rowID))
+        return revisions
+
+    def text(self, rowID):
+        "Returns the text of the revision in row `rowID`, or None."
+        deltas = []
+        while True:
+            row = self.db().execute("SELECT text, base FROM revisions WHERE id = ?", (rowID,)).fetchone()
+            if not row:
+                return None
+            text, rowID = row
+            if rowID is None:
+                break
+            deltas.append(json.loads(text))
+
+        for ops in reversed(deltas):
+            text = patch(text, ops)
+        return text
+
+    def copyFrom(self, source):
+        "Replaces the content of the store with the one at path `source`."
+        src = sqlite3.connect(source)
+        try:
+            src.backup(self.db())
+        finally:
+            src.close()
+        # Opened again, to be upgraded if needed (see db)
+        self.close()
+
+    def save(self, items, sync=True):
+        """
+        Makes the store hold the revisions of `items`, and only them:
+        revisions that are not in the store yet are added, the ones that no
+        item has anymore are removed.
+
+        Rows belong to an item: one referenced by another item (a copy) is
+        added again for that one. Added revisions are based on the previous
+        revision of their item (see keyframeInterval).
+        @param items: list of (item ID, revisions), revisions as in
+                      outlineItem.revisions
+        @param sync: if False, changes are not synced to disk
+        @return: list of (item ID, timestamp, reference, row ID) for the
+                 revisions that have been added. Row ID is None if it could
+                 not be (the row it is a copy of has gone).
+        """
+        db = self.db()
+        db.execute("PRAGMA synchronous = {}".format("FULL" if sync else "OFF"))
+        rows = {rowID: (item, base, depth) for rowID, item, base, depth in
+                db.execute("SELECT id, item, base, depth FROM revisions")}
+        kept = set()
+        added = []
+
+        with db:
+            for ID, revisions in items:
+                # Previous revision of the item: [row ID, depth, text]
+                previous = None
+                for ts, ref in revisions or []:
+                    if type(ref) == int and ref not in kept and rows.get(ref, [None])[0] == ID:
+                        kept.add(ref)
+                        previous = [ref, rows[ref][2], None]
+                        continue
+
+                    text = revisionText(ref, self)
+                    if text is None:
+                        added.append((ID, ts, ref, None))
+                        continue
+
+                    if previous and previous[1] + 1 < keyframeInterval:
+                        if previous[2] is None:
+                            previous[2] = self.text(previous[0])
+                        base, depth = previous[0], previous[1] + 1
+                        content = json.dumps(diff(previous[2], text))
+                    else:
+                        base, depth, content = None, 0, text
+
+                    rowID = db.execute(
+                        "INSERT INTO revisions (item, timestamp, text, base, depth) "
+                        "VALUES (?, ?, ?, ?, ?)", (ID, ts, content, base, depth)).lastrowid
+                    added.append((ID, ts, ref, rowID))
+                    previous = [rowID, depth, text]
+
+            removed = set(rows) - kept
+            self._rebase(removed, rows)
+            db.executemany("DELETE FROM revisions WHERE id = ?",
+                           [(rowID,) for rowID in removed])
+
+        lost = len([a for a in added if a[3] is None])
+        if lost:
+            logger.warning("%d revisions could not be found in %s", lost, self.path)
+
+        return added
+
+    def _rebase(self, removed, rows):
+        """
+        Rewrites the rows based on `removed` rows, that are about to be
+        removed, so that they are based on the closest row that stays, or
+        hold their whole text. Rows further down their chains get closer to
+        a whole text: their depth is computed again.
+        @param rows: dict of (item, base, depth) by row ID, before the save
+        """
+        dependents = [rowID for rowID, (item, base, depth) in rows.items()
+                      if base in removed and rowID not in removed]
+
+        # Texts are all read before rows are rewritten
+        updates = []
+        for rowID in dependents:
+            base = rows[rowID][1]
+            while base in removed:
+                base = rows[base][1]
+            text = self.text(rowID)
+            if base is None:
+                updates.append((text, None, 0, rowID))
+            else:
+                updates.append((json.dumps(diff(self.text(base), text)), base,
+                                rows[base][2] + 1, rowID))
+
+        if not updates:
+            return
+
+        db = self.db()
+        db.executemany("UPDATE revisions SET text = ?, base = ?, depth = ? WHERE id = ?",
+                       updates)
+
+        # Depths, from the whole texts, of the rows that stay (including the
+        # ones added by this save)
+        bases = {rowID: (base, depth) for rowID, base, depth in
+                 db.execute("SELECT id, base, depth FROM revisions")
+                 if rowID not in removed}
+        depths = {}
+        for rowID in bases:
+            chain = []
+            while rowID not in depths:
+                base = bases[rowID][0]
+                if base is None:
+                    depths[rowID] = 0
+                    break
+                chain.append(rowID)
+                rowID = base
+            depth = depths[rowID]
+            for r in reversed(chain):
+                depth += 1
+                depths[r] = depth
+
+        db.executemany("UPDATE revisions SET depth = ? WHERE id = ?",
+                       [(depth, rowID) for rowID, depth in depths.items()
+                        if depth != bases[rowID][1]])
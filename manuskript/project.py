@@ -3,15 +3,22 @@
 @author: olivier.massot, 2019
 '''
 from _collections import OrderedDict
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
+import hashlib
+import json
 import logging
 import os
 import re
 import shutil
 import string
+import struct
+import threading
 from zipfile import BadZipFile
 import zipfile
 
-from PyQt5.QtCore import QObject, Qt, QModelIndex
+from PyQt5.QtCore import QObject, Qt, QModelIndex, pyqtSignal
 from PyQt5.QtGui import QStandardItemModel, QColor, QStandardItem
 from lxml import etree as ET
 from path import Path
@@ -24,6 +31,7 @@ from manuskript.models import outlineItem
 from manuskript.models.characterModel import characterModel, CharacterInfo
 from manuskript.models.outlineModel import outlineModel
 from manuskript.models.plotModel import plotModel
+from manuskript.models.revisionStore import RevisionStore
 from manuskript.models.worldModel import worldModel
 
 
@@ -35,11 +43,295 @@ except:
 
 logger = logging.getLogger('manuskript')
 
-cache = {}
+# Projects are written on disk by a single worker thread, so that two saves
+# never overlap.
+saveExecutor = ThreadPoolExecutor(max_workers=1)
+
+class Unchanged():
+    """
+    Content of a file that has not changed since the project was last
+    written, where it was written at `path`: the file is kept (or copied, in
+    a zipped project) instead of being written again.
+    """
+    __slots__ = ("path",)
+
+    def __init__(self, path):
+        self.path = path
+
+def fileHash(content):
+    """
+    Returns a hash of a file's `content` (str or bytes), to know if it has
+    changed without keeping it (see Project.manifest).
+    """
+    if type(content) == str:
+        content = content.encode("utf-8")
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+def copyZipMember(source, info, target, name):
+    """
+    Copies the member `info` of the ZipFile `source` to `target`, a ZipFile
+    opened for writing, as `name`. The compressed data is copied as it is,
+    without decompressing and compressing it again.
+    """
+    # Compressed data follows the member's local header
+    source.fp.seek(info.header_offset)
+    header = source.fp.read(zipfile.sizeFileHeader)
+    nameLength, extraLength = struct.unpack("<HH", header[26:30])
+    source.fp.seek(nameLength + extraLength, os.SEEK_CUR)
+    data = source.fp.read(info.compress_size)
+
+    zinfo = zipfile.ZipInfo(name, info.date_time)
+    zinfo.compress_type = info.compress_type
+    zinfo.CRC = info.CRC
+    zinfo.compress_size = info.compress_size
+    zinfo.file_size = info.file_size
+    zinfo.external_attr = info.external_attr
+    zinfo.header_offset = target.fp.tell()
+
+    # What ZipFile.writestr does, with data already compressed
+    target.fp.write(zinfo.FileHeader())
+    target.fp.write(data)
+    target.filelist.append(zinfo)
+    target.NameToInfo[zinfo.filename] = zinfo
+    target.start_dir = target.fp.tell()
+    target._didModify = True
+
+class LazyReader():
+    """
+    Reads the text and notes of outline items, when they are needed, from
+    the project `filename` they were loaded from (see outlineItem.loadLazy).
+    Called with an item, it reads the file the item was last written to, or
+    `path` if given, and returns its notes and its body.
+
+    `paths` are the paths items have been written to, by ID, when they are
+    more recent than the items' own (see ProjectV1.write).
+    """
+    def __init__(self, filename, zipped, paths=None):
+        self.filename = Path(filename)
+        self.zipped = zipped
+        self.paths = paths or {}
+        self._zip = None
+
+    def __call__(self, item, path=None):
+        path = Path(path or self.paths.get(item.ID()) or item._lastPath)
+        if item.isFolder():
+            path = path / "folder.txt"
+        md, body = ProjectV1.parseMMDFile(self.read(path), asDict=True)
+        return md.get("notes"), body
+
+    def read(self, path):
+        "Returns the content of the file `path`, relative to the project."
+        if not self.zipped:
+            folder = self.filename.parent / self.filename.name.stripext()
+            return (folder / path).text(encoding="utf-8")
+
+        # The zip file is opened once, and kept open until close
+        if self._zip is None:
+            self._zip = zipfile.ZipFile(self.filename)
+        return self._zip.read(str(path).replace(os.sep, "/")).decode("utf-8")
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+
+class SaveTransaction():
+    """
+    Writes the files of a project so that a crash never leaves it half
+    saved. New contents are written aside (staged), synced to disk all at
+    once, and then moved in place. What is going to be done in place is
+    written in a journal first: if it is interrupted, it is rolled back by
+    `recover` the next time the project is loaded.
+
+    Operations are done by `commit`, in the order they were asked for.
+    Paths are relative to `root`, the folder containing the project file.
+    """
+
+    def __init__(self, root, name, sync=True):
+        """
+        @param name: name of the project file
+        @param sync: if False, files are not synced to disk (faster, but
+        not crash-safe)
+        """
+        self.root = Path(root)
+        self.name = name
+        self.journal, self.staging = self.paths(root, name)
+        self.sync = sync
+        self.operations = []
+
+        # Leftovers of an older transaction: its backups are needed to roll
+        # it back if it was interrupted
+        self.recover(root, name)
+        self.staging.makedirs_p()
+
+    @staticmethod
+    def paths(root, name):
+        "Returns the journal and the staging folder of a transaction."
+        root = Path(root)
+        return root / ".{}.journal".format(name), root / ".{}.save".format(name)
+
+    def stage(self, path):
+        """
+        Returns the file where the new content of `path` has to be written.
+        It replaces `path` when the transaction is committed.
+        """
+        n = len(self.operations)
+        self.operations.append({"op": "write", "path": str(path),
+                                "staged": "new-{}".format(n), "backup": "old-{}".format(n)})
+        return self.staging / "new-{}".format(n)
+
+    def write(self, path, content):
+        """
+        Stages `content` (str or bytes) as the new content of `path`.
+        @return: the staged file
+        """
+        staged = self.stage(path)
+        if type(content) == bytes:
+            with open(staged, "wb") as f:
+                f.write(content)
+        else:
+            with open(staged, "w", encoding='utf8') as f:
+                f.write(content)
+        return staged
+
+    def move(self, old, new):
+        "Moves (renames) file or folder `old` to `new`, if it exists."
+        self.operations.append({"op": "move", "path": str(new), "from": str(old)})
+
+    def remove(self, path):
+        "Removes file or folder `path`, if it exists."
+        n = len(self.operations)
+        self.operations.append({"op": "remove", "path": str(path), "backup": "old-{}".format(n)})
+
+    def commit(self):
+        """
+        Does the operations. If one fails, those done are rolled back (see
+        recover) before the error is raised.
+        """
+        try:
+            self._commit()
+        except Exception:
+            self.recover(self.root, self.name)
+            raise
+
+    def _commit(self):
+        # Staged files are synced in one go, before anything is changed
+        if self.sync:
+            for op in self.operations:
+                if op["op"] == "write":
+                    self.fsync(self.staging / op["staged"])
+
+        with open(self.journal, "w", encoding="utf8") as f:
+            json.dump(self.operations, f)
+            f.flush()
+            if self.sync:
+                os.fsync(f.fileno())
+
+        folders = set()
+        for op in self.operations:
+            target = self.root / op["path"]
+            folders.add(target.parent)
+
+            if op["op"] == "move":
+                try:
+                    (self.root / op["from"]).rename(target)
+                except FileNotFoundError:
+                    # Maybe parent folder has been moved
+                    pass
+                continue
+
+            # Replaced or removed files are kept until the end, to roll back
+            if os.path.lexists(target):
+                os.rename(target, self.staging / op["backup"])
+
+            if op["op"] == "write":
+                target.parent.makedirs_p()
+                os.replace(self.staging / op["staged"], target)
+
+        if self.sync:
+            for folder in folders:
+                self.fsync(folder)
+
+        # Done
+        self.journal.remove()
+        if self.sync:
+            self.fsync(self.root)
+        shutil.rmtree(self.staging)
+
+    @staticmethod
+    def recover(root, name):
+        """
+        Rolls back the transaction that was interrupted while saving the
+        project `name` in `root`, if any.
+        @return: True if a transaction has been rolled back
+        """
+        journal, staging = SaveTransaction.paths(root, name)
+        root = Path(root)
+        recovered = False
+
+        if journal.exists():
+            logger.warning("Last save of %s was interrupted, rolling it back.", name)
+            try:
+                with open(journal, encoding="utf8") as f:
+                    operations = json.load(f)
+            except ValueError:
+                # Interrupted while writing the journal: nothing was done
+                operations = []
+
+            for op in reversed(operations):
+                target = root / op["path"]
+                try:
+                    if op["op"] == "move":
+                        # If its folder is not there, it has been moved with it
+                        old = root / op["from"]
+                        if target.exists() and not old.exists() and old.parent.exists():
+                            target.rename(old)
+                        continue
+
+                    backup = staging / op["backup"]
+                    if os.path.lexists(backup):
+                        if target.isdir():
+                            shutil.rmtree(target)
+                        target.parent.makedirs_p()
+                        os.replace(backup, target)
+                    elif op["op"] == "write" and not (staging / op["staged"]).exists() \
+                            and target.exists():
+                        # Did not exist before
+                        target.remove()
+
+                except OSError as e:
+                    logger.error("Could not roll back %s: %s", op["path"], e)
+
+            journal.remove()
+            recovered = True
+
+        if staging.exists():
+            shutil.rmtree(staging)
+
+        return recovered
+
+    @staticmethod
+    def fsync(path):
+        "Flushes file or folder `path` to disk (folders cannot be on Windows)."
+        try:
+            fd = os.open(path, os.O_RDONLY if path.isdir() else os.O_RDWR)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
 
 class Project(QObject):
     """ A Manusckript writing project """
     version = None
+
+    # Emitted when a save is done
+    saved = pyqtSignal()
+    saveFailed = pyqtSignal(str)
+
+    # Emitted by the worker thread, with the future of the save
+    _written = pyqtSignal(object)
     
     def __init__(self, filename=""):
         super().__init__()
@@ -60,11 +352,81 @@ class Project(QObject):
         
         self._loadingErrors = []
         self._savingErrors = []
+
+        # Files of a project saved in a folder, as they are on disk:
+        # path → (size, hash, mtime). Only used when writing (see write).
+        # It is saved with them, so that loading does not need to hash the
+        # files that have not changed.
+        self.manifest = {}
+
+        # Whether saved files are synced to disk (see SaveTransaction)
+        self.sync = True
+
+        # Reads the texts that have been left on disk (see ProjectV1.load).
+        # The lock is held while files are replaced by a save.
+        self._lazyReader = None
+        self._lazyLock = threading.Lock()
+
+        # Background save, see saveInBackground
+        self._saveFuture = None
+        self._pendingSave = None
+        self._written.connect(self._saveWritten)
+
+        # Incremental save: what has changed since the project was written
+        # (or loaded), see trackChanges
+        self._writtenTo = None
+        self._writtenSettings = None
+        self._dirty = set()
+        for mdl, key in [(self.mdlFlatData, "infos"),
+                         (self.mdlCharacter, "characters"),
+                         (self.mdlLabels, "labels"),
+                         (self.mdlStatus, "status"),
+                         (self.mdlPlots, "plots"),
+                         (self.mdlOutline, "outline"),
+                         (self.mdlWorld, "world")]:
+            self.trackChanges(mdl, key)
+        self.trackChanges(self.mdlOutline, "revisions")
     
     @property
     def name(self):
         return self.filename.name.stripext() or tr("My Project")
     
+    def trackChanges(self, mdl, key):
+        """
+        Marks `key` as changed (see isChanged) whenever the model `mdl`
+        changes.
+        """
+        def changed(*args):
+            self._dirty.add(key)
+
+        for signal in [mdl.dataChanged, mdl.rowsInserted, mdl.rowsRemoved,
+                       mdl.rowsMoved, mdl.modelReset, mdl.layoutChanged]:
+            signal.connect(changed)
+
+    def isChanged(self, key):
+        """
+        Returns True if what is saved under `key` has to be written again: it
+        has changed since the last save or load, or the project is saved
+        somewhere else.
+        """
+        if key == "settings":
+            return self.settings != self._writtenSettings or \
+                   not self.isWrittenTo(self.filename, self.zipped)
+        return key in self._dirty or not self.isWrittenTo(self.filename, self.zipped)
+
+    def isWrittenTo(self, filename, zipped):
+        "Returns True if the project was last written to (or loaded from) `filename`."
+        return self._writtenTo == (filename, zipped)
+
+    def setWritten(self):
+        """
+        Marks everything as written (or loaded), in the current file.
+        Incremental saves start from here.
+        """
+        self._writtenTo = (self.filename, self.zipped)
+        self._writtenSettings = self.settings
+        self._dirty.clear()
+
     @property
     def loadingErrors(self):
         return self._loadingErrors
@@ -97,7 +459,11 @@ class Project(QObject):
             return False
         
     @classmethod
-    def load(cls, filename):
+    def load(cls, filename, lazy=False):
+
+        # Roll back an interrupted save
+        filename = Path(filename)
+        SaveTransaction.recover(filename.parent, filename.name)
         
         version = Project.findVersionFromFile(filename)
     
@@ -107,19 +473,105 @@ class Project(QObject):
             return ProjectV0.load(filename)
             
         elif version == 1:
-            return ProjectV1.load(filename)
+            return ProjectV1.load(filename, lazy)
         
         else:
             logger.critical("unknwown version: %s", version)
             return Project()
     
-    def save(self, *args, **kwargs):
+    def snapshot(self, *args, **kwargs):
         """ reimplemented in the ProjectV0 et ProjectV1 subclasses """
         raise NotImplementedError()
+
+    def write(self, snapshot):
+        """ reimplemented in the ProjectV0 et ProjectV1 subclasses """
+        raise NotImplementedError()
+
+    def applySaveResult(self, result):
+        """
+        Called on the GUI thread with what `write` returned. Subclass this to
+        update the models after a save.
+        """
+        return
+
+    def save(self, *args, **kwargs):
+        """
+        Saves the project, and waits until it is written.
+        @return: True if successful, False otherwise (see savingErrors).
+        """
+        self.waitForSave()
+        try:
+            self.applySaveResult(self.write(self.snapshot(*args, **kwargs)))
+        except Exception as e:
+            self.saveError(e)
+            return False
+        self.saved.emit()
+        return True
         
     def save_as(self, filename, *args, **kwargs):
-        self.filename = filename
-        self.save(*args, **kwargs)
+        self.filename = Path(filename)
+        return self.save(*args, **kwargs)
+
+    def saveInBackground(self, *args, **kwargs):
+        """
+        Saves the project without blocking the GUI: a snapshot of the models
+        is taken now, and written on disk by a worker thread. `saved` or
+        `saveFailed` is emitted when it is done.
+
+        Saves never overlap: if one is running, a new snapshot is taken
+        (with the latest arguments) when it is done.
+        """
+        if self._saveFuture is not None:
+            self._pendingSave = (args, kwargs)
+            return
+
+        try:
+            snapshot = self.snapshot(*args, **kwargs)
+        except Exception as e:
+            self.saveError(e)
+            return
+
+        self._saveFuture = saveExecutor.submit(self.write, snapshot)
+        self._saveFuture.add_done_callback(self._written.emit)
+
+    def isSaving(self):
+        return self._saveFuture is not None
+
+    def waitForSave(self):
+        """
+        Blocks until the background saves, including the pending one, are
+        written.
+        """
+        while self._saveFuture is not None:
+            future = self._saveFuture
+            wait([future])
+            self._saveWritten(future)
+
+    def _saveWritten(self, future):
+        if future is not self._saveFuture:
+            # Already done, by waitForSave
+            return
+        self._saveFuture = None
+
+        try:
+            self.applySaveResult(future.result())
+        except Exception as e:
+            self.saveError(e)
+        else:
+            self.saved.emit()
+
+        if self._pendingSave is not None:
+            args, kwargs = self._pendingSave
+            self._pendingSave = None
+            self.saveInBackground(*args, **kwargs)
+
+    def saveError(self, error):
+        logger.error("Error while saving %s: %s", self.filename, error,
+                     exc_info=error)
+        # We don't know what has been written: next save writes everything
+        self._writtenTo = None
+        self._savingErrors.append(str(error))
+        self.saveFailed.emit(str(error))
 
 class ProjectV0(Project):
     version = 0
@@ -178,7 +630,7 @@ class ProjectV0(Project):
     
         return project
     
-    def save(self, *args, **kwargs):
+    def snapshot(self, *args, **kwargs):
         files = [(self.saveStandardItemModelXML(self.mdlFlatData), "flatModel.xml"),
 #                  (saveStandardItemModelXML(mw.mdlCharacter), "perso.xml")),
                  (self.saveStandardItemModelXML(self.mdlWorld), "world.xml"),
@@ -189,10 +641,12 @@ class ProjectV0(Project):
                  (self.settings.save(), "settings.pickle")
             ]
         logger.warning("file format 0 does not save characters !")
+        return {"filename": self.filename, "files": files}
     
-        zf = zipfile.ZipFile(self.filename, mode="w")
+    def write(self, snapshot):
+        zf = zipfile.ZipFile(snapshot["filename"], mode="w")
         
-        for content, filename in files:
+        for content, filename in snapshot["files"]:
             zf.writestr(filename, content, compress_type=COMPRESSION)
     
         zf.close()
@@ -352,14 +806,24 @@ class ProjectV1(Project):
         (Character.summaryFull, "Full Summary"),
         (Character.notes, "Notes"),
     ])
+
+    # Threads reading the files of a project when it is loaded (see load),
+    # None for ThreadPoolExecutor's default
+    loadWorkers = None
         
     @classmethod
-    def load(cls, filename):
+    def load(cls, filename, lazy=False):
         """
         Loads a project.
+
+        If `lazy` is True, the texts and notes of outline items are left on
+        disk, and read when they are needed: items are created from the
+        index saved with the project (see outlineIndex). Files that have
+        changed since the index was written are read anyway.
         @return: the loaded Project object
         """
         project = ProjectV1(filename)
+        revisions = None
     
         # Read file(s) and store everything in a dict
         try:
@@ -367,17 +831,92 @@ class ProjectV1(Project):
             project.zipped = True
             logger.debug("Loading {} (zip)".format(filename))
             
-            files = {Path(f).normpath(): zf.read(f) for f in zf.namelist()}
-            
-            for f in files:
-                if f.ext not in [".xml", ".opml"]:
-                    files[f] = files[f].decode("utf-8")
+            index = {}
+            if lazy and ProjectV1.indexName in zf.namelist():
+                index = ProjectV1.readIndex(zf.read(ProjectV1.indexName))
+
+            files = {}
+            jobs = []
+            for info in zf.infolist():
+                if info.filename == ProjectV1.indexName:
+                    continue
+                path = Path(info.filename).normpath()
+
+                # Revisions are streamed (see appendRevisions)
+                if path == "revisions.xml":
+                    revisions = partial(zf.open, info)
+                    continue
+
+                # Texts that are as they were indexed are not read
+                entry = index.get(path)
+                if entry and entry["check"] == "{}:{}".format(info.file_size, info.CRC):
+                    files[path] = entry
+                else:
+                    jobs.append((path, info))
+
+            def read(job):
+                path, info = job
+                content = zf.read(info)
+                if path.ext not in [".xml", ".opml"]:
+                    content = content.decode("utf-8")
+                return ProjectV1.parseFile(path, content)
+
+            # Members are decompressed and parsed by a pool of threads
+            with ThreadPoolExecutor(cls.loadWorkers) as pool:
+                files.update(zip([path for path, info in jobs], pool.map(read, jobs)))
             
         except BadZipFile:
             logger.debug("Loading {} (folder)".format(filename))
-            
-            files = {f.normpath(): f.text(encoding=('utf-8' if f.ext in (".xml", "opml") else None)) 
-                     for f in filename.walkfiles() if not f.name[0] == "."}
+
+            # Folder containing files: name of the project file (without .msk extension)
+            folder = project.filename.parent / project.name
+            previous = ProjectV1.readManifest(folder)
+
+            index = {}
+            if lazy and (folder / ProjectV1.indexName).exists():
+                index = ProjectV1.readIndex((folder / ProjectV1.indexName).bytes())
+
+            files = {}
+            jobs = []
+            for f in folder.walkfiles():
+                if f.name[0] == ".":
+                    continue
+                path = folder.relpathto(f).normpath()
+
+                # Files that have not changed since they were written keep
+                # their hash, and texts that are as they were indexed are not
+                # read
+                stat = f.stat()
+                entry = previous.get(path)
+                if not entry or entry[0] != stat.st_size or entry[2] != stat.st_mtime_ns:
+                    entry = None
+
+                # Revisions are streamed (see appendRevisions). If they have
+                # changed, they are not hashed: they are written again rather
+                # than compared when they are saved
+                if path == "revisions.xml":
+                    revisions = partial(open, f, "rb")
+                    project.manifest[path] = entry or (stat.st_size, None, stat.st_mtime_ns)
+                    continue
+
+                elif entry and path in index and index[path]["check"] == entry[1]:
+                    files[path] = index[path]
+                    project.manifest[path] = entry
+                    continue
+
+                jobs.append((path, f, stat, entry))
+
+            def read(job):
+                path, f, stat, entry = job
+                content = f.bytes() if f.ext in (".xml", ".opml") else f.text(encoding="utf-8")
+                entry = entry or (stat.st_size, fileHash(content), stat.st_mtime_ns)
+                return ProjectV1.parseFile(path, content), entry
+
+            # Files are read, hashed and parsed by a pool of threads
+            with ThreadPoolExecutor(cls.loadWorkers) as pool:
+                for job, (content, entry) in zip(jobs, pool.map(read, jobs)):
+                    files[job[0]] = content
+                    project.manifest[job[0]] = entry
     
         # Sort files by keys
         files = OrderedDict(sorted(files.items()))
@@ -485,8 +1024,8 @@ class ProjectV1(Project):
         # Characters
         mdl = project.mdlCharacter
         logger.debug("Reading Characters")
-        for f in [f for f in files if "characters" in f]:
-            md, body = ProjectV1.parseMMDFile(files[f])
+        for f in [f for f in files if f.startswith("characters" + os.sep)]:
+            md, body = files[f]
             c = mdl.addCharacter()
             c.lastPath = f
     
@@ -520,7 +1059,7 @@ class ProjectV1(Project):
         outline = OrderedDict()
     
         # We create a structure of imbricated OrderedDict to store the whole tree.
-        for f in [f for f in files if "outline" in f]:
+        for f in [f for f in files if f.startswith("outline" + os.sep)]:
             split = f.split(os.path.sep)[1:] # FIXME: use relpath instead of split
     
             last = ""
@@ -544,69 +1083,94 @@ class ProjectV1(Project):
                     # We store f to add it later as lastPath
                     parent[i + ":lastPath"] = parentLastPath / i
     
-        # We now just have to recursively add items.
-        ProjectV1.addTextItems(mdl, outline)
-    
-        # Adds revisions
-        if "revisions.xml" in files:
-            root = ET.fromstring(files["revisions.xml"])
-            ProjectV1.appendRevisions(mdl, root)
+        # We now just have to recursively add items. Texts that have not been
+        # read are read from the project when they are needed.
+        project._lazyReader = LazyReader(project.filename, project.zipped)
+        ProjectV1.addTextItems(mdl, outline, lazy=project.readLazy)
+    
+        # Adds revisions, from the revision store (their texts are read when
+        # they are needed). Projects saved before it have their revisions in
+        # revisions.xml: they go to the store when the project is saved.
+        store = RevisionStore(RevisionStore.pathFor(project.filename))
+        mdl.revisionStore = store
+        if store.exists():
+            for ID, itemRevisions in store.revisions().items():
+                item = mdl.getItemByID(ID)
+                if item:
+                    item.appendRevisions(itemRevisions)
+        elif revisions:
+            with revisions() as f:
+                ProjectV1.appendRevisions(mdl, f)
     
         # Check IDS
         mdl.rootItem.checkIDs()
+
+        # Next save only writes what changes from now on
+        project.setWritten()
         
         return project
     
-    def save(self, *args, **kwargs):
+    def snapshot(self, save_revisions=False):
         """
-        Saves the project. If zip is False, the project is saved as a multitude of plain-text files for the most parts
-        and some XML or zip? for settings and stuff.
-        If zip is True, everything is saved as a single zipped file. Easier to carry around, but does not allow
-        collaborative work, versioning, or third-party editing.
-        @param zip: if True, saves as a single file. If False, saves as plain-text. If None, tries to determine based on
-        settings.
-        @return: True if successful, False otherwise.
+        Returns everything needed to write the project on disk (see `write`).
+        It reads the models, so it must be called from the GUI thread. It is
+        cheap: small models are serialized, but the outline is only copied
+        in memory (see snapshotOutline).
+
+        Only what has changed since the project was last written is
+        serialized, files that have not are `Unchanged`.
+        @param save_revisions: if True, revisions are saved too, in the
+                               revision store (see RevisionStore).
+        @return: dict
         """
-        logger.info("Saving to: %s", "zip" if self.zipped else "folder")
-    
-        # List of files to be written, removed and moved
-        files, removes, moves = [], [], []
+        # List of files to be written and moved
+        files, moves = [], []
     
         # File format version
-        files.append(("MANUSKRIPT", self.version))
+        files.append(("MANUSKRIPT", str(self.version)))
     
         # General infos (book and author)
         # Saved in plain text, in infos.txt
         path = Path("infos.txt")
-        content = ""
-        for col, name in enumerate(["Title", "Subtitle", "Serie", "Volume", "Genre", "License", "Author", "Email"]):
-            item = self.mdlFlatData.item(0, col)
-            val = item.text().strip() if item else ""
-            if not val:
-                continue
-            content += "{name}:{spaces}{value}\n".format(
-                name=name,
-                spaces=" " * (15 - len(name)),
-                value=val
-            )
+        if self.isChanged("infos"):
+            content = ""
+            for col, name in enumerate(["Title", "Subtitle", "Serie", "Volume", "Genre", "License", "Author", "Email"]):
+                item = self.mdlFlatData.item(0, col)
+                val = item.text().strip() if item else ""
+                if not val:
+                    continue
+                content += "{name}:{spaces}{value}\n".format(
+                    name=name,
+                    spaces=" " * (15 - len(name)),
+                    value=val
+                )
+        else:
+            content = Unchanged(path)
         files.append((path, content))
     
         # Summary
         # In plain text, in summary.txt
         path = Path("summary.txt")
-        content = ""
-        for col, name in enumerate(["Situation", "Sentence", "Paragraph", "Page", "Full"]):
-            item = self.mdlFlatData.item(1, col)
-            val = item.text().strip() if item else ""
-            if not val:
-                continue
-            content += self.formatMetaData(name, val, 12)
-    
+        if self.isChanged("infos"):
+            content = ""
+            for col, name in enumerate(["Situation", "Sentence", "Paragraph", "Page", "Full"]):
+                item = self.mdlFlatData.item(1, col)
+                val = item.text().strip() if item else ""
+                if not val:
+                    continue
+                content += self.formatMetaData(name, val, 12)
+        else:
+            content = Unchanged(path)
         files.append((path, content))
     
         # Label & Status
         # In plain text
-        for mdl, path in [(self.mdlStatus, "status.txt"), (self.mdlLabels, "labels.txt")]:
+        for mdl, path, key in [(self.mdlStatus, "status.txt", "status"),
+                               (self.mdlLabels, "labels.txt", "labels")]:
+
+            if not self.isChanged(key):
+                files.append((path, Unchanged(path)))
+                continue
     
             content = ""
     
@@ -631,9 +1195,14 @@ class ProjectV1(Project):
         # In a character folder
         path = Path("characters") /  "{name}.txt"
         mdl = self.mdlCharacter
+        changed = self.isChanged("characters") or not all(c.lastPath for c in mdl.characters)
     
         # Review characters
         for c in mdl.characters:
+
+            if not changed:
+                files.append((c.lastPath, Unchanged(c.lastPath)))
+                continue
     
             # Generates file's content
             content = ""
@@ -665,31 +1234,20 @@ class ProjectV1(Project):
     
             files.append((cpath, content))
     
-        # Texts
-        # In an outline folder
-        mdl = self.mdlOutline
-    
-        # Go through the tree
-        f, m, r = self.exportOutlineItem(mdl.rootItem)
-        files += f
-        moves += m
-        removes += r
-    
-        # Writes revisions (if asked for)
-        if kwargs.get("save_revisions", False):
-            files.append(("revisions.xml", mdl.saveToXML()))
-    
         # World
         # Either in an XML file, or in lots of plain texts?
         # More probably text, since there might be writing done in third-party.
         path = "world.opml"
         mdl = self.mdlWorld
     
-        root = ET.Element("opml")
-        root.attrib["version"] = "1.0"
-        body = ET.SubElement(root, "body")
-        self.addWorldItem(body, mdl)
-        content = ET.tostring(root, encoding="UTF-8", xml_declaration=True, pretty_print=True)
+        if self.isChanged("world"):
+            root = ET.Element("opml")
+            root.attrib["version"] = "1.0"
+            body = ET.SubElement(root, "body")
+            self.addWorldItem(body, mdl)
+            content = ET.tostring(root, encoding="UTF-8", xml_declaration=True, pretty_print=True)
+        else:
+            content = Unchanged(path)
         files.append((path, content))
     
         # Plots
@@ -698,110 +1256,372 @@ class ProjectV1(Project):
         path = "plots.xml"
         mdl = self.mdlPlots
     
-        root = ET.Element("root")
-        self.addPlotItem(root, mdl)
-        content = ET.tostring(root, encoding="UTF-8", xml_declaration=True, pretty_print=True)
+        if self.isChanged("plots"):
+            root = ET.Element("root")
+            self.addPlotItem(root, mdl)
+            content = ET.tostring(root, encoding="UTF-8", xml_declaration=True, pretty_print=True)
+        else:
+            content = Unchanged(path)
         files.append((path, content))
     
         # Settings
         # Saved in readable text (json) for easier versioning. But they mustn't be shared, it seems.
-        files.append(("settings.txt", self.settings))
+        path = "settings.txt"
+        files.append((path, self.settings if self.isChanged("settings") else Unchanged(path)))
+
+        # Revisions are saved next to the project file (see RevisionStore),
+        # from the one they were read from
+        store = RevisionStore(RevisionStore.pathFor(self.filename))
+        source = self.mdlOutline.revisionStore.path if self.mdlOutline.revisionStore else None
+
+        # Texts that have not been read yet are read by the worker, with its
+        # own reader
+        reader = None
+        if self._lazyReader:
+            reader = LazyReader(self._lazyReader.filename, self._lazyReader.zipped,
+                                self._lazyReader.paths)
+
+        snapshot = {
+            "filename": self.filename,
+            "name": self.name,
+            "zipped": self.zipped,
+            "incremental": self.isWrittenTo(self.filename, self.zipped),
+            "sync": self.sync,
+            # The worker must not see it change (see applySaveResult)
+            "manifest": dict(self.manifest),
+            "files": files,
+            "moves": moves,
+            # Texts: written from a copy, see write
+            "outline": self.snapshotOutline(self.mdlOutline.rootItem, reader),
+            "reader": reader,
+            "revisions": save_revisions,
+            "revisionsChanged": self.isChanged("revisions") or not store.exists(),
+            "revisionStore": (source, store.path),
+        }
+
+        # Next save writes what changes from now on
+        self.setWritten()
+        if not save_revisions and snapshot["revisionsChanged"]:
+            self._dirty.add("revisions")
+
+        return snapshot
+
+    def write(self, snapshot):
+        """
+        Writes a `snapshot` (see `snapshot`) on disk, as a single zipped file
+        or as a multitude of plain-text files. Only the snapshot is used, and
+        the lazy reader, that is replaced under its lock when files are, so
+        it can be called from a worker thread.
+        @return: dict, with the paths of outline items in the project by ID,
+        the new manifest, and the revisions that have been added to the
+        revision store (see applySaveResult).
+        """
+        files = list(snapshot["files"])
+        moves = list(snapshot["moves"])
+        removes = []
+
+        filename = snapshot["filename"]
+        logger.info("Saving to: %s", "zip" if snapshot["zipped"] else "folder")
     
         # We check if the file exist and we have write access. If the file does
         # not exists, we check the parent folder, because it might be a new project.
-        if self.filename.exists() and not self.filename.access(os.W_OK) or \
-           not self.filename.exists() and not self.filename.parent.access(os.W_OK):
-            logger.error("you don't have write access to save this project there.")
-            return
+        if filename.exists() and not filename.access(os.W_OK) or \
+           not filename.exists() and not filename.parent.access(os.W_OK):
+            raise PermissionError("you don't have write access to save this project there.")
+
+        # Files that have been written before, and that we can keep if they
+        # have not changed: members of the previous zip, or files in the
+        # manifest. The new manifest is made on a copy, that replaces the
+        # project's only once the files are written (see applySaveResult).
+        manifest = {}
+        previous = None
+        reusable = {}
+        if snapshot["incremental"]:
+            manifest = dict(snapshot["manifest"])
+            if snapshot["zipped"]:
+                previous = zipfile.ZipFile(filename)
+                reusable = {Path(i.filename).normpath(): i for i in previous.infolist()}
+            else:
+                reusable = snapshot["manifest"]
     
-        if self.zipped:
-            # Save to zip
-            zf = zipfile.ZipFile(self.filename, mode="w")
+        # Texts
+        # In an outline folder
+        outline = snapshot["outline"]
     
-            for filename, content in files:
-                zf.writestr(filename, content, compress_type=COMPRESSION)
+        # Go through the tree
+        f, m, r = self.exportOutlineItem(outline, reusable, reuseMoved=snapshot["zipped"])
+        files += f
+        moves += m
+        removes += r
+    
+        # Everything has been read from the previous files
+        if snapshot["reader"]:
+            snapshot["reader"].close()
+
+        missing = [str(c.path) for p, c in files if isinstance(c, Unchanged) and c.path not in reusable]
+        if missing:
+            if previous:
+                previous.close()
+            raise FileNotFoundError("files have changed on disk since last save: {}".format(", ".join(missing)))
+
+        # Writes revisions (if asked for) in the revision store, before the
+        # project: if it fails, the project is as it was
+        revisions = None
+        if snapshot["revisions"] and snapshot["revisionsChanged"]:
+            source, target = snapshot["revisionStore"]
+            store = RevisionStore(target)
+            try:
+                if source and source != target and source.exists():
+                    store.copyFrom(source)
+                revisions = store.save(self.outlineRevisions(outline), snapshot["sync"])
+            except Exception:
+                if previous:
+                    previous.close()
+                raise
+            finally:
+                store.close()
+
+        # Files are only changed when everything is written, see SaveTransaction
+        transaction = SaveTransaction(filename.parent, filename.name, snapshot["sync"])
+    
+        if snapshot["zipped"]:
+            # Save to zip, in a new file since unchanged members are copied
+            # from the previous one
+            zf = zipfile.ZipFile(transaction.stage(filename.name), mode="w")
+    
+            for path, content in files:
+                if isinstance(content, Unchanged):
+                    copyZipMember(previous, reusable[content.path], zf, path)
+                else:
+                    zf.writestr(path, content, compress_type=COMPRESSION)
+
+            # Index of the texts, checked with the size and CRC of their member
+            index = ProjectV1.outlineIndex(outline)
+            for path, entry in index.items():
+                info = zf.getinfo(str(path).replace(os.sep, "/"))
+                entry["check"] = "{}:{}".format(info.file_size, info.CRC)
+            zf.writestr(ProjectV1.indexName, json.dumps(index), compress_type=COMPRESSION)
     
             zf.close()
+            if previous:
+                previous.close()
     
         else:
             # Save to plain text
             
             # Folder containing file: name of the project file (without .msk extension)
-            dir_ = self.filename.parent
-            foldername = self.name
+            dir_ = filename.parent
+            foldername = snapshot["name"]
             
             # Debug
             logger.info("Saving to folder %s", foldername)
     
-            # If cache is empty (meaning we haven't loaded from disk), we wipe folder, just to be sure.
-            if not cache:
-                if Path(dir_ / foldername).exists():
-                    shutil.rmtree(dir_ / foldername)
+            # If manifest is empty (meaning we haven't loaded from disk), we wipe folder, just to be sure.
+            if not manifest:
+                transaction.remove(foldername)
     
             # Moving files that have been renamed
             for old, new in moves:
+                transaction.move(Path(foldername) / old, Path(foldername) / new)
+                logger.debug("* Renaming/moving {} to {}".format(old, new))
     
-                # Get full path
-                oldPath = dir_ / foldername / old
-                newPath = dir_ / foldername / new
-    
-                # Move the old file to the new place
-                try:
-                    oldPath.rename(newPath)
-                    logger.debug("* Renaming/moving {} to {}".format(old, new))
-                except FileNotFoundError:
-                    # Maybe parent folder has been renamed
-                    pass
-    
-                # Update cache
-                cache2 = {}
-                for f in cache:
-                    f2 = f.replace(old, new)
-                    if f2 != f:
-                        logger.info("* Updating cache: %s %s", f, f2)
-                    cache2[f2] = cache[f]
-                cache = cache2
+                # Update manifest: the file, or the files in the folder
+                for f in [f for f in manifest if f == old or f.startswith(old + os.sep)]:
+                    f2 = Path(new + f[len(old):])
+                    logger.info("* Updating manifest: %s %s", f, f2)
+                    manifest[f2] = manifest.pop(f)
     
             # Writing files
             for path, content in files:
-                filename = dir_ / foldername / path
-                filename.parent.makedirs_p()
-    
-                # Check if content is in cache, and write if necessary
-                if path not in cache or cache[path] != content:
-                    logger.debug("* Writing file {} ({})".format(path, "not in cache" if path not in cache else "different"))
-                    # mode = "w" + ("b" if type(content) == bytes else "")
-                    if type(content) == bytes:
-                        with open(filename, "wb") as f:
-                            f.write(content)
-                    else:
-                        with open(filename, "w", encoding='utf8') as f:
-                            f.write(content)
-    
-                    cache[path] = content
+                # Check if content is in manifest, and write if necessary
+                if isinstance(content, Unchanged):
+                    continue
+                digest = fileHash(content)
+                if path in manifest and manifest[path][1] == digest:
+                    continue
+
+                logger.debug("* Writing file {} ({})".format(path, "not in manifest" if path not in manifest else "different"))
+                # Renaming the staged file keeps its size and mtime
+                stat = transaction.write(Path(foldername) / path, content).stat()
+                manifest[path] = (stat.st_size, digest, stat.st_mtime_ns)
     
             # Removing phantoms
-            for path in [p for p in cache if p not in [p for p, c in files]]:
-                filename = dir_ / foldername / path
-                logger.debug("* Removing", path)
-    
-                if filename.isdir():
-                    shutil.rmtree(filename)
-                else:  
-                    filename.remove()
+            paths = set(p for p, c in files)
+            for path in [p for p in manifest if p not in paths]:
+                logger.debug("* Removing %s", path)
+                transaction.remove(Path(foldername) / path)
     
-                # Clear cache
-                cache.pop(path, 0)
+                # Clear manifest
+                manifest.pop(path, 0)
+
+            transaction.write(Path(foldername) / ProjectV1.manifestName, json.dumps(manifest))
+
+            # Index of the texts, checked with their hash in the manifest
+            index = ProjectV1.outlineIndex(outline)
+            for path, entry in index.items():
+                entry["check"] = manifest[path][1]
+            transaction.write(Path(foldername) / ProjectV1.indexName, json.dumps(index))
     
+            # Write the project file's content
+            transaction.write(filename.name, str(self.version))  # Format version number
+
+        # Texts that have not been read are read from the written files as
+        # soon as they are there, before items know their new paths
+        lastPaths = self.outlineLastPaths(outline)
+        with self._lazyLock:
+            if self._lazyReader:
+                self._lazyReader.close()
+            transaction.commit()
+            self._lazyReader = LazyReader(filename, snapshot["zipped"], lastPaths)
+
+        if not snapshot["zipped"]:
             # Removing empty directories
-            for root, dirs, files in Path(dir_ / foldername / "outline").walk():
-                for d in dirs:
-                    newDir = root / d
-                    newDir.removedirs_p()
+            for d in Path(filename.parent / snapshot["name"] / "outline").walkdirs():
+                d.removedirs_p()
     
-            # Write the project file's content
-            with open(self, "w", encoding='utf8') as f:
-                f.write(str(self.version))  # Format version number
+        return {
+            "lastPaths": lastPaths,
+            "manifest": manifest,
+            "revisions": revisions,
+            "revisionStore": snapshot["revisionStore"][1],
+        }
+    
+    def applySaveResult(self, result):
+        """
+        Remembers the paths where outline items have been written (`result`
+        of `write`), so that next save knows which ones have been moved, the
+        files that have been written (see manifest), and the rows where
+        revisions have been saved in the revision store. Items removed in
+        the meantime are ignored.
+        """
+        self.manifest = result["manifest"]
+
+        for ID, path in result["lastPaths"].items():
+            item = self.mdlOutline.getItemByID(ID)
+            if item:
+                item._lastPath = path
+
+        # Saved revisions are read from the store from now on
+        if result["revisions"] is not None:
+            store = self.mdlOutline.revisionStore
+            if not store or store.path != result["revisionStore"]:
+                if store:
+                    store.close()
+                self.mdlOutline.revisionStore = RevisionStore(result["revisionStore"])
+
+            for ID, ts, ref, rowID in result["revisions"]:
+                item = self.mdlOutline.getItemByID(ID)
+                if item:
+                    item.setRevisionSaved(ts, ref, rowID)
+
+    def readLazy(self, item):
+        """
+        Returns the notes and text of `item`, that have been left on disk
+        (see outlineItem.loadLazy). A running save is not waited for: its
+        files are only read once they are all in place (see write).
+        """
+        with self._lazyLock:
+            return self._lazyReader(item)
+    
+    manifestName = ".manifest.json"
+    indexName = ".index.json"
+
+    @staticmethod
+    def readManifest(folder):
+        """
+        Returns the manifest saved in `folder` (see write), or an empty one.
+        """
+        try:
+            with open(folder / ProjectV1.manifestName, encoding="utf8") as f:
+                return {Path(path): tuple(entry) for path, entry in json.load(f).items()}
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def readIndex(content):
+        """
+        Returns the index of outline items (see outlineIndex) from its json
+        `content`, or an empty one.
+        """
+        try:
+            return {Path(path).normpath(): entry for path, entry in json.loads(content).items()}
+        except (ValueError, AttributeError):
+            return {}
+
+    @staticmethod
+    def snapshotOutline(root, reader=None):
+        """
+        Returns a copy of the outline item `root` and its children, keeping
+        their IDs and the paths they were last written to. Texts that have
+        not been read (see outlineItem.loadLazy) are not read now: the copies
+        read them with `reader` if they need to, from where they were.
+        """
+        def copy(item):
+            c = outlineItem()
+            c._data = item.copyData(loadLazy=False)
+            c._lastPath = item._lastPath
+            c._dirty = item._dirty
+            item._dirty = False
+            if item._lazy is not None:
+                c._lazy = partial(reader, path=item._lastPath)
+
+            for child in item.childItems:
+                cc = copy(child)
+                cc._parent = c
+                cc._row = len(c.childItems)
+                c.childItems.append(cc)
+            return c
+
+        return copy(root)
+    
+    @staticmethod
+    def outlineIndex(root):
+        """
+        Returns what is needed to create `root`'s children (recursively)
+        without reading their files, by path of file: their metadata, but
+        the notes (see outlineHeader), and their word count. Entries are
+        checked against the files when they are loaded, with "check".
+        @return: dict
+        """
+        index = {}
+
+        def collect(item):
+            for c in item.children():
+                path = c._lastPath / "folder.txt" if c.isFolder() else c._lastPath
+                index[path] = {
+                    "header": ProjectV1.outlineHeader(c, exclude=[Outline.notes]),
+                    "wordCount": c.wordCount(),
+                }
+                collect(c)
+
+        collect(root)
+        return index
+
+    @staticmethod
+    def outlineRevisions(root):
+        "Returns the revisions of `root`'s children (recursively): [(ID, revisions)]."
+        revisions = []
+    
+        def collect(item):
+            for c in item.children():
+                revisions.append((c.ID(), c.revisions()))
+                collect(c)
+    
+        collect(root)
+        return revisions
+
+    @staticmethod
+    def outlineLastPaths(root):
+        "Returns the paths of `root`'s children (recursively), by ID."
+        paths = {}
+    
+        def collect(item):
+            for c in item.children():
+                paths[c.ID()] = c._lastPath
+                collect(c)
+    
+        collect(root)
+        return paths
     
     @staticmethod
     def formatMetaData(name, value, tabLength=10):
@@ -833,21 +1653,31 @@ class ProjectV1(Project):
         return re.sub("\\W", "-", re.sub("\\s", "_", s))
     
     @staticmethod
-    def exportOutlineItem(root):
+    def exportOutlineItem(root, reusable=(), reuseMoved=True, path=None):
         """
         Takes an outline item, and returns three lists:
         1. of (`filename`, `content`), representing the whole tree of files to be written, in multimarkdown.
         2. of (`filename`, `filename`) listing files to be moved
         3. of `filename`, representing files to be removed.
+
+        Items that have not changed since they were written, in a file that
+        is in `reusable`, are not exported again: their content is
+        `Unchanged`. If `reuseMoved` is False, they are exported if they
+        have been moved.
     
         @param root: OutlineItem
+        @param path: path of root (see outlineItemPath), computed if None
         @return: [(str, str)], [(str, str)], [str]
         """
         files, moves, removes = [], [], []
+
+        if path is None:
+            path = Path.joinpath(*ProjectV1.outlineItemPath(root))
+        duplicates = ProjectV1.duplicateTitles(root)
     
         k = 0
         for child in root.children():
-            spath = Path.joinpath(*ProjectV1.outlineItemPath(child))
+            spath = path / ProjectV1.outlineItemName(child, duplicates)
     
             k += 1
     
@@ -860,21 +1690,32 @@ class ProjectV1(Project):
     
             # Updates item last's path
             child._lastPath = spath
+
+            # Where the item's file was last written
+            if not lp or child._dirty or not reuseMoved and spath != lp:
+                source = None
+            elif child.type() == "folder":
+                source = Path(lp) / "folder.txt"
+            else:
+                source = lp
     
             # Generating content
+            if source in reusable:
+                content = Unchanged(source)
+            else:
+                content = ProjectV1.outlineToMMD(child)
+
             if child.type() == "folder":
                 fpath = spath / "folder.txt"
-                content = ProjectV1.outlineToMMD(child)
                 files.append((fpath, content))
     
             elif child.type() == "md":
-                content = ProjectV1.outlineToMMD(child)
                 files.append((spath, content))
     
             else:
                 logger.warning("Unknown type")
     
-            f, m, r = ProjectV1.exportOutlineItem(child)
+            f, m, r = ProjectV1.exportOutlineItem(child, reusable, reuseMoved, spath)
             files += f
             moves += m
             removes += r
@@ -995,35 +1836,52 @@ class ProjectV1(Project):
         if not item.parent():
             return ["outline"]
         else:
-            # Count the number of siblings for padding '0'
-            siblings = item.parent().childCount()
-    
-            # We check if multiple items have the same name
-            # If so, we add "-ID" to their name
-            siblingsNames = [s.title() for s in item.parent().children()]
-            if siblingsNames.count(item.title()) > 1:
-                title = "{}-{}".format(item.title(), item.ID())
-            else:
-                title = item.title()
-    
-            name = "{ID}-{name}{ext}".format(
-                ID=str(item.row()).zfill(len(str(siblings))),
-                name=ProjectV1.slugify(title),
-                ext="" if item.type() == "folder" else ".md"
-            )
+            name = ProjectV1.outlineItemName(item, ProjectV1.duplicateTitles(item.parent()))
             return ProjectV1.outlineItemPath(item.parent()) + [name]
 
+    @staticmethod
+    def outlineItemName(item, duplicates):
+        """
+        Returns the name of the outlineItem file (or folder) in its parent's folder.
+        @param item: outlineItem
+        @param duplicates: titles used by several of its siblings (see duplicateTitles)
+        @return: str
+        """
+        # Count the number of siblings for padding '0'
+        siblings = item.parent().childCount()
+
+        # If multiple items have the same name, we add "-ID" to their name
+        if item.title() in duplicates:
+            title = "{}-{}".format(item.title(), item.ID())
+        else:
+            title = item.title()
+
+        return "{ID}-{name}{ext}".format(
+            ID=str(item.row()).zfill(len(str(siblings))),
+            name=ProjectV1.slugify(title),
+            ext="" if item.type() == "folder" else ".md"
+        )
+
+    @staticmethod
+    def duplicateTitles(item):
+        "Returns the titles that are used by more than one child of `item`."
+        titles = Counter(c.title() for c in item.children())
+        return {title for title, count in titles.items() if count > 1}
+
     @staticmethod
     def outlineFromMMD(text, parent):
         """
         Creates outlineItem from multimarkdown file.
-        @param text: content of the file
+        @param text: content of the file, or the file parsed (see parseFile)
         @param parent: appends item to parent (outlineItem)
         @return: outlineItem
         """
     
         item = outlineItem(parent=parent)
-        md, body = ProjectV1.parseMMDFile(text, asDict=True)
+        if type(text) == str:
+            md, body = ProjectV1.parseMMDFile(text, asDict=True)
+        else:
+            md, body = text
     
         # Store metadata
         for k in md:
@@ -1032,6 +1890,9 @@ class ProjectV1(Project):
     
         # Store body
         item.setData(Outline.text, str(body))
+
+        # Item is as in its file
+        item._dirty = False
     
         # Set file format to "md"
         # (Old version of manuskript had different file formats: text, t2t, html and md)
@@ -1044,11 +1905,41 @@ class ProjectV1(Project):
         return item
 
     @staticmethod
-    def outlineToMMD(item):
+    def outlineFromIndex(entry, parent, loader):
+        """
+        Creates outlineItem from its entry in the index (see outlineIndex).
+        Its text and notes are read by `loader` when they are needed (see
+        outlineItem.loadLazy).
+        @param entry: dict
+        @param parent: appends item to parent (outlineItem)
+        @return: outlineItem
+        """
+        item = outlineItem(parent=parent)
+        md, body = ProjectV1.parseMMDFile(entry["header"], asDict=True)
+
+        # Store metadata
+        for k in md:
+            if k in Outline.__members__:                              #@UndefinedVariable
+                item.setData(Outline.__members__[k], str(md[k]))            #@UndefinedVariable
+
+        if not item.isFolder():
+            item._data[Outline.wordCount] = entry["wordCount"]
+
+        item._lazy = loader
+        item._dirty = False
+
+        return item
+
+    @staticmethod
+    def outlineHeader(item, exclude=()):
+        """
+        Returns the metadata of `item`, as written at the beginning of its
+        file, but the ones in `exclude`.
+        """
         content = ""
     
         # We don't want to write some datas (computed)
-        exclude = [Outline.wordCount, Outline.goal, Outline.goalPercentage, Outline.revisions, Outline.text]
+        exclude = [Outline.wordCount, Outline.goal, Outline.goalPercentage, Outline.revisions, Outline.text] + list(exclude)
         # We want to force some data even if they're empty
         force = [Outline.compile]
     
@@ -1058,6 +1949,16 @@ class ProjectV1(Project):
             val = item.data(attrib.value)
             if val or attrib in force:
                 content += ProjectV1.formatMetaData(attrib.name, str(val), 15)
+
+        return content
+
+    @staticmethod
+    def outlineToMMD(item):
+        content = ProjectV1.outlineHeader(item)
+
+        if item._lazy is not None:
+            # Text could not be read (see outlineItem.loadLazy)
+            raise FileNotFoundError("could not read the text of {}".format(item.title()))
     
         content += "\n\n"
         content += item.data(Outline.text)
@@ -1082,6 +1983,22 @@ class ProjectV1(Project):
                 row[enum[name].value] = QStandardItem(item.attrib[name])
         return row
 
+    @staticmethod
+    def parseFile(path, content):
+        """
+        Returns the `content` of the file `path` as models are created from
+        it: files of outline items and characters are parsed (see
+        parseMMDFile), as OrderedDict for the former. Models are not touched,
+        so that it can be called from worker threads (see load).
+        """
+        if type(content) != str:
+            return content
+        elif path.startswith("outline" + os.sep):
+            return ProjectV1.parseMMDFile(content, asDict=True)
+        elif path.startswith("characters" + os.sep):
+            return ProjectV1.parseMMDFile(content)
+        return content
+
     @staticmethod
     def parseMMDFile(text, asDict=False):
         """
@@ -1093,68 +2010,69 @@ class ProjectV1(Project):
         @param text: the content of the file
         @return: (list, str) or (OrderedDict, str)
         """
-        md = []
-        mdd = OrderedDict()
-        body = []
-        descr = ""
-        val = ""
-        inBody = False
-        for s in text.split("\n"):
-            if not inBody:
-                m = re.match(r"^([^\s].*?):\s*(.*)$", s)
-                if m:
-                    # Commit last metadata
-                    if descr:
-                        if descr == "None":
-                            descr = ""
-                        md.append((descr, val))
-                        mdd[descr] = val
-                    descr = ""
-                    val = ""
-    
-                    # Store new values
-                    descr = m.group(1)
-                    val = m.group(2)
-    
-                elif s[:4] == "    ":
-                    val += "\n" + s.strip()
-    
-                elif s == "":
-                    # End of metadatas
-                    inBody = True
-    
-                    # Commit last metadata
-                    if descr:
-                        if descr == "None":
-                            descr = ""
-                        md.append((descr, val))
-                        mdd[descr] = val
-    
+        # Metadatas end at the first empty line, the body is what follows.
+        # Without an empty line, the last metadata is not complete.
+        if not text or text[0] == "\n":
+            header, complete, body = "", True, text[1:]
+        else:
+            i = text.find("\n\n")
+            if i >= 0:
+                header, complete, body = text[:i], True, text[i + 2:]
+            elif text[-1] == "\n":
+                header, complete, body = text[:-1], True, ""
             else:
-                body.append(s)
+                header, complete, body = text, False, ""
     
         # We remove the second empty line (since we save with two empty lines)
-        if body and body[0] == "":
+        if body[:1] == "\n":
             body = body[1:]
-    
-        body = "\n".join(body)
+
+        md = []
+        descr = ""
+        val = ""
+        for s in header.split("\n") if header else []:
+            # "description: value", with a description that does not start
+            # with a space
+            i = -1 if s[0].isspace() else s.find(":", 1)
+            if i > 0:
+                # Commit last metadata
+                if descr:
+                    md.append(("" if descr == "None" else descr, val))
+    
+                # Store new values
+                descr = s[:i]
+                val = s[i + 1:].lstrip()
+    
+            elif s[:4] == "    ":
+                val += "\n" + s.strip()
+    
+        # Commit last metadata
+        if descr and complete:
+            md.append(("" if descr == "None" else descr, val))
     
         if not asDict:
             return md, body
         else:
-            return mdd, body
+            return OrderedDict(md), body
 
     @staticmethod
-    def addTextItems(mdl, odict, parent=None):
+    def addTextItems(mdl, odict, parent=None, lazy=None):
         """
         Adds a text / outline items from an OrderedDict.
         @param mdl: model to add to
-        @param odict: OrderedDict
+        @param odict: OrderedDict, of file contents, or of their entries in
+                      the index (see outlineFromIndex)
+        @param lazy: reads the texts of items added from the index
         @return: nothing
         """
         if parent is None:
             parent = mdl.rootItem
     
+        with mdl.bulk():
+            ProjectV1._addTextItems(mdl, odict, parent, lazy)
+
+    @staticmethod
+    def _addTextItems(mdl, odict, parent, lazy):
         for k in odict:
     
             # In case k is a folder:
@@ -1162,48 +2080,71 @@ class ProjectV1(Project):
     
                 # Adds folder
                 logger.debug("{}* Adds {} to {} (folder)".format("  " * parent.level(), k, parent.title()))
-                item = ProjectV1.outlineFromMMD(odict[k]["folder.txt"], parent=parent)
+                item = ProjectV1.outlineFromFile(odict[k]["folder.txt"], parent, lazy)
                 item._lastPath = odict[k + ":lastPath"]
     
                 # Read content
-                ProjectV1.addTextItems(mdl, odict[k], parent=item)
+                ProjectV1._addTextItems(mdl, odict[k], item, lazy)
     
             # k is not a folder
-            elif type(odict[k]) == str and k != "folder.txt" and not ":lastPath" in k:
+            elif type(odict[k]) in (str, tuple, dict) and k != "folder.txt" and not ":lastPath" in k:
                 logger.debug("{}* Adds {} to {} (file)".format("  " * parent.level(), k, parent.title()))
-                item = ProjectV1.outlineFromMMD(odict[k], parent=parent)
+                item = ProjectV1.outlineFromFile(odict[k], parent, lazy)
                 item._lastPath = odict[k + ":lastPath"]
     
             elif not ":lastPath" in k and k != "folder.txt":
                 logger.warning("* Strange things in file %s", k)
 
     @staticmethod
-    def appendRevisions(mdl, root):
+    def outlineFromFile(content, parent, lazy):
+        "Creates outlineItem from the `content` of its file, or its entry in the index."
+        if type(content) == dict:
+            return ProjectV1.outlineFromIndex(content, parent, lazy)
+        return ProjectV1.outlineFromMMD(content, parent)
+
+    @staticmethod
+    def appendRevisions(mdl, source):
         """
-        Parse etree item to find outlineItem's with revisions, and adds them to model `mdl`.
+        Reads the revisions of outlineItems in the xml file `source` (see
+        outlineItem.toXMLElement), and adds them to model `mdl`.
+
+        The file is parsed as a stream, elements are dropped once read, and
+        revisions are added to each item at once.
         @param mdl: outlineModel
-        @param root: etree
+        @param source: a filename or a file object
         @return: nothing
         """
-        for child in root:
-            # Recursively go through items
-            if child.tag == "outlineItem":
-                ProjectV1.appendRevisions(mdl, child)
+        revisions = OrderedDict()
+        noID = 0
     
-            # Revision found.
-            elif child.tag == "revision":
-                # Get root's ID
-                ID = root.attrib["ID"]
+        for event, element in ET.iterparse(source, tag=("revision", "outlineItem")):
+            if element.tag == "revision":
+                # Get item's ID
+                ID = element.getparent().get("ID")
                 if not ID:
-                    logger.error("* Serious problem: no ID!")
-                    continue
-    
-                # Find outline item in model
-                item = mdl.getItemByID(ID)
-                if not item:
-                    logger.error("* Error: no item whose ID is", ID)
-                    continue
+                    noID += 1
+                else:
+                    revisions.setdefault(ID, []).append(
+                        (element.attrib["timestamp"], element.attrib["text"]))
+
+            else:
+                # Children have been read
+                element.clear()
+
+            # Drops what has been read
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+        if noID:
+            logger.error("* Serious problem: %d revisions of items with no ID!", noID)
+    
+        for ID, itemRevisions in revisions.items():
+            # Find outline item in model
+            item = mdl.getItemByID(ID)
+            if not item:
+                logger.error("* Error: no item whose ID is %s", ID)
+                continue
     
-                # Store revision
-                logger.info("* Appends revision ({}) to {}".format(child.attrib["timestamp"], item.title()))
-                item.appendRevision(child.attrib["timestamp"], child.attrib["text"])
\ No newline at end of file
+            # Store revisions
+            logger.debug("* Appends %d revisions to %s", len(itemRevisions), item.title())
+            item.appendRevisions(itemRevisions)
\ No newline at end of file
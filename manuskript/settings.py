@@ -78,7 +78,8 @@ textEditor = {
     "marginsTB": 20,
     "backgroundTransparent": False,
     "alwaysCenter": False,
-    "focusMode": False  # "line", "paragraph", "sentence"
+    "focusMode": False,  # "line", "paragraph", "sentence"
+    "tokenizer": "QRegExp"  # "re": see MarkdownReTokenizer
     }
 
 revisions = {
@@ -280,6 +281,7 @@ def load(string, fromString=False, protocol=None):
             "backgroundTransparent": False,      # Added in 0.6.0
             "alwaysCenter": False,               # Added in 0.7.0
             "focusMode": False,
+            "tokenizer": "QRegExp",
             }
 
         for k in added:
@@ -21,3 +21,17 @@ def outlineModelBasic(MWEmptyProject):
     _ = outlineItem(title="Text", _type="md", parent=root)
 
     return mdl
+
+@pytest.fixture
+def outlineModelBare():
+    """Returns an outlineModel with the items of outlineModelBasic, without
+    MainWindow or project."""
+    from manuskript.models import outlineItem, outlineModel
+    mdl = outlineModel(None)
+
+    root = mdl.rootItem
+    f = outlineItem(title="Folder", parent=root)
+    _ = outlineItem(title="Text", _type="md", parent=f)
+    _ = outlineItem(title="Text", _type="md", parent=root)
+
+    return mdl
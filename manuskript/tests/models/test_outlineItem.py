@@ -159,3 +159,401 @@ def test_modelStuff(outlineModelBasic):
     assert text3.ID() == "0"
     root.checkIDs()
     assert text3.ID() != "0"
+
+def test_IDIndex(outlineModelBare):
+    """
+    Tests that the model's ID index follows the tree.
+    """
+    from PyQt5.QtCore import Qt, QModelIndex
+    from manuskript.models import outlineItem
+
+    model = outlineModelBare
+    root = model.rootItem
+    folder = root.child(0)
+    text = folder.child(0)
+
+    assert model.getItemByID(folder.ID()) is folder
+    assert model.getItemByID(text.ID()) is text
+
+    # Changing ID
+    oldID = text.ID()
+    text.setData(text.enum.ID, "42")
+    assert model.getItemByID("42") is text
+    assert model.getItemByID(oldID) is None
+
+    # Inserting a copy, and a new item in it
+    copy = folder.copy()
+    model.insertItem(copy, 0)
+    assert model.getItemByID(copy.ID()) is copy
+    assert copy.ID() != folder.ID()
+    new = outlineItem(title="New", parent=copy)
+    assert model.getItemByID(new.ID()) is new
+
+    # Moving, like a view does: drop, then remove the source
+    data = model.mimeData([model.indexFromItem(folder)])
+    assert model.dropMimeData(data, Qt.MoveAction, 0, 0, QModelIndex())
+    model.removeRow(folder.row())
+    moved = root.child(0)
+    assert moved is not folder and moved.ID() == folder.ID()
+    assert model.getItemByID(folder.ID()) is moved
+    assert model.getItemByID("42") is moved.child(0)
+    child = outlineItem(title="Child", parent=moved)
+    assert model.getItemByID(child.ID()) is child
+
+    # Removing
+    model.removeRow(0)
+    assert model.getItemByID(folder.ID()) is None
+    assert model.getItemByID("42") is None
+    assert model.getItemByID(child.ID()) is None
+    assert model.getItemByID(copy.ID()) is copy
+
+def test_goal(outlineModelBare):
+    """
+    Tests that goals set in the goal column reach the parents.
+    """
+    root = outlineModelBare.rootItem
+    folder = root.child(0)
+    text = folder.child(0)
+    E = text.enum
+
+    text.setData(E.goal, 150)
+    assert text.goal() == text.userGoal() == 150
+    assert folder.goal() == root.goal() == 150
+
+    # Goal set on the folder hides the children's
+    folder.setData(E.goal, "100")
+    text.setData(E.goal, 30)
+    assert folder.goal() == root.goal() == 100
+    folder.setData(E.goal, "")
+    assert folder.goal() == root.goal() == 30
+    root.child(1).setData(E.goal, 20)
+    assert root.goal() == 50
+
+    # Same as counting again from scratch
+    goals = [i.goal() for i in [root, folder, text]]
+    root.updateWordCount()
+    assert [i.goal() for i in [root, folder, text]] == goals
+
+def test_cleanRevisions(outlineItemText, monkeypatch):
+    from collections import OrderedDict
+    from manuskript import settings
+    text = outlineItemText
+    monkeypatch.setitem(settings.revisions, "rules", OrderedDict({60: 10, None: 100}))
+
+    now = 10000
+    monkeypatch.setattr("time.time", lambda: now)
+    ages = [1000, 990, 850, 700, 55, 50, 44, 30, 5]
+    text.appendRevisions([(now - a, str(a)) for a in reversed(ages)])
+    text.cleanRevisions()
+    # In time order, one per 100s for ever, one per 10s in the last minute
+    assert [r[1] for r in text.revisions()] == ["1000", "850", "700", "55", "44", "30", "5"]
+
+def test_addRevision(outlineItemText, monkeypatch):
+    """
+    Tests that revisions are added from the text of the previous one, without
+    reading it again from its deltas.
+    """
+    import sys
+    from manuskript import settings
+    text = outlineItemText
+    monkeypatch.setitem(settings.revisions, "keep", True)
+    monkeypatch.setitem(settings.revisions, "smartremove", False)
+    now = [1000]
+    monkeypatch.setattr("time.time", lambda: now[0])
+
+    module = sys.modules[type(text).__module__]
+    read = []
+    def revisionText(ref, store=None):
+        read.append(ref)
+        return moduleRevisionText(ref, store)
+    moduleRevisionText = module.revisionText
+    monkeypatch.setattr(module, "revisionText", revisionText)
+
+    texts = []
+    text.setData(text.enum.text, "One two three.")
+    for i in range(30):
+        now[0] += 1
+        texts.append(text.text())
+        text.replaceText(4, 7, str(i))
+    assert read == []
+    assert [text.revisionText(ts) for ts, ref in text.revisions()] == texts
+
+@pytest.mark.parametrize("start, end, text", [
+    (0, 0, "New "), (3, 3, " "), (3, 4, ""), (5, 12, "word"), (16, 16, "\n\nMore words."),
+])
+def test_replaceText(outlineItemText, start, end, text):
+    from manuskript.functions import wordCount
+    item = outlineItemText
+    old = "One two three four."
+    item.setData(item.enum.text, old)
+    item.replaceText(start, end, text)
+    assert item.text() == old[:start] + text + old[end:]
+    assert item.wordCount() == wordCount(item.text())
+
+def test_rowCache(outlineModelBare):
+    """
+    Tests that cached rows follow insertions, removals and moves in
+    childItems.
+    """
+    from manuskript.models import outlineItem
+    mdl = outlineModelBare
+    folder = mdl.rootItem.child(0)
+
+    def check():
+        for row, child in enumerate(folder.childItems):
+            assert child.row() == row
+            index = mdl.indexFromItem(child)
+            assert index.row() == row
+            assert index.internalPointer() is child
+            assert mdl.parent(index).internalPointer() is folder
+
+    check()
+    for row, title in [(1, "End"), (0, "First"), (1, "Middle"), (3, "Last")]:
+        folder.insertChild(row, outlineItem(title=title))
+        check()
+    assert [c.title() for c in folder.childItems] == ["First", "Middle", "Text", "Last", "End"]
+
+    removed = folder.removeChild(1)
+    check()
+    assert mdl.indexFromItem(removed) is None
+    mdl.removeRow(0, mdl.indexFromItem(folder))
+    check()
+
+    # Direct move, as in outlineBasics.moveIndex
+    folder.childItems.insert(0, folder.childItems.pop())
+    check()
+    assert [c.title() for c in folder.childItems] == ["End", "Text", "Last"]
+
+def test_uniqueIDs(outlineModelBare):
+    """
+    Tests that IDs stay unique when items are removed, and that removed IDs
+    are given again after checkIDs.
+    """
+    from PyQt5.QtCore import QModelIndex
+    from manuskript.models import outlineItem
+    mdl = outlineModelBare
+    root = mdl.rootItem
+    assert sorted(root.listAllIDs()) == ["0", "1", "2", "3"]
+
+    def add(ID=None):
+        item = outlineItem(title="Text", ID=ID)
+        root.appendChild(item)
+        return item.ID()
+
+    assert [add() for _ in range(3)] == ["4", "5", "6"]
+    mdl.removeRow(0, QModelIndex())  # IDs 1 and 2
+    mdl.removeRow(1, QModelIndex())  # ID 4
+    assert add() == "7"
+
+    # Item inserted with its own ID
+    assert add("9") == "9"
+    assert [add(), add()] == ["8", "10"]
+
+    root.checkIDs()
+    assert [add() for _ in range(4)] == ["1", "2", "4", "11"]
+    IDs = root.listAllIDs()
+    assert len(IDs) == len(set(IDs))
+
+def test_loadFromXML(outlineModelBare):
+    """
+    Tests that loading a saved tree gives back the items as they were built
+    one setData at a time, word counts and goals included.
+    """
+    from manuskript.models import outlineItem, outlineModel
+    mdl = outlineModelBare
+    root = mdl.rootItem
+    folder = root.child(0)
+    E = folder.enum
+
+    sub = outlineItem(title="Sub folder", _type="folder")
+    folder.appendChild(sub)
+    for i in range(3):
+        sub.appendChild(outlineItem(title="Scene {}".format(i), _type="md"))
+        sub.child(i).setData(E.text, "Scene number {}. ".format(i) * (i + 1))
+        sub.child(i).setData(E.setGoal, 10 * (i + 1))
+    folder.child(0).setData(E.text, "Some text.")
+    folder.child(0).setData(E.notes, "Some notes.")
+    folder.child(0).setData(E.compile, 0)
+    root.child(1).setData(E.setGoal, 100)
+    root.child(1).setData(E.text, "One two three.")
+
+    changed = []
+    loaded = outlineModel(None)
+    loaded.dataChanged.connect(lambda *args: changed.append(args))
+    loaded.loadFromXML(mdl.saveToXML(), fromString=True)
+    assert changed == []
+
+    def value(item, col):
+        value = item.data(col)
+        return "" if value is None else str(value)
+
+    def compare(item, other):
+        for col in E:
+            assert value(item, col) == value(other, col), col
+        assert item.childCount() == other.childCount()
+        for c, o in zip(item.children(), other.children()):
+            assert o.parent() is other
+            assert loaded.getItemByID(o.ID()) is o
+            compare(c, o)
+
+    compare(root, loaded.rootItem)
+    assert loaded.rootItem.wordCount() == 23
+    assert loaded.rootItem.goal() == 160
+
+def test_copyDeep(outlineModelBare):
+    """
+    Tests that copies share nothing with the originals, and that copies
+    get new IDs when inserted.
+    """
+    mdl = outlineModelBare
+    root = mdl.rootItem
+    folder = root.child(0)
+    text = folder.child(0)
+    E = text.enum
+    text.setData(E.text, "Original text.")
+    text.appendRevision(1000, "Original")
+    folder._lastPath = "outline/0-Folder"
+
+    copy = folder.copy()
+    assert copy.parent() is None and copy._model is None
+    assert copy.ID() is None and copy.child(0).ID() is None
+    assert copy._lastPath == ""
+    assert copy.child(0).parent() is copy
+    assert copy.child(0).text() == "Original text."
+
+    copy.child(0).setData(E.text, "Copied text.")
+    copy.child(0).appendRevision(2000, "Copy")
+    copy.removeChild(0)
+    assert text.text() == "Original text."
+    assert text.revisions() == [(1000, "Original")]
+    assert folder.child(0) is text
+
+    copy = folder.copy()
+    root.appendChild(copy)
+    IDs = root.listAllIDs()
+    assert len(IDs) == len(set(IDs)) == 6
+    for item in [copy, copy.child(0)]:
+        assert mdl.getItemByID(item.ID()) is item
+
+    kept = folder.copy(keepIDs=True)
+    assert [kept.ID(), kept.child(0).ID()] == [folder.ID(), text.ID()]
+
+def test_bulk(outlineModelBare):
+    """
+    Tests that nested bulk blocks reset the model once, when leaving the
+    outermost one, and that IDs and word counts are updated then.
+    """
+    from manuskript.models import outlineItem
+    mdl = outlineModelBare
+    root = mdl.rootItem
+    folder = root.child(0)
+    E = folder.enum
+
+    log = []
+    mdl.modelAboutToBeReset.connect(
+        lambda: log.append(("about", mdl.rowCount(mdl.indexFromItem(folder)))))
+    mdl.modelReset.connect(
+        lambda: log.append(("reset", mdl.rowCount(mdl.indexFromItem(folder)))))
+    mdl.rowsInserted.connect(lambda *args: log.append("inserted"))
+    mdl.rowsRemoved.connect(lambda *args: log.append("removed"))
+
+    with mdl.bulk():
+        with mdl.bulk():
+            for i in range(3):
+                item = outlineItem(title="Scene {}".format(i), _type="md",
+                                   parent=folder)
+                item.setData(E.text, "One two.")
+                outlineItem(title="Sub", parent=item)
+        assert mdl.inBulk()
+        assert log == [("about", 1)]
+        assert item.ID() is None
+        folder.removeChild(0)
+    assert not mdl.inBulk()
+    assert log == [("about", 1), ("reset", 3)]
+
+    IDs = root.listAllIDs()
+    assert len(IDs) == len(set(IDs)) == 9
+    for i in [item, item.child(0)]:
+        assert mdl.getItemByID(i.ID()) is i
+    assert folder.wordCount() == root.wordCount() == 6
+
+    # Changes to data only: no reset
+    log.clear()
+    with mdl.bulk():
+        item.setData(E.text, "One two three.")
+    assert log == []
+    assert root.wordCount() == 7
+
+def test_slots(outlineModelBare):
+    """
+    Tests the storage of data in a list indexed by column, on items without
+    a __dict__.
+    """
+    root = outlineModelBare.rootItem
+    text = root.child(1)
+    E = text.enum
+    assert not hasattr(text, "__dict__")
+    assert len(text._data) == len(E)
+
+    assert text.data(E.notes) == ""
+    text.setData(E.notes, "Notes.")
+    assert text.data(E.notes) == "Notes."
+
+    # Columns outside the enum
+    for column in [-1, len(E), 42]:
+        assert text.data(column) == ""
+        text.setData(column, "Nothing")
+        assert text.data(column) == ""
+    assert "Nothing" not in text._data
+
+    data = text.copyData()
+    data[E.notes] = "Other notes."
+    assert text.data(E.notes) == "Notes."
+
+    # Only the root item knows the IDs in use
+    assert root.IDs and not hasattr(text, "IDs")
+
+def test_compileCache(outlineModelBare):
+    """
+    Tests that the cached compile state follows changes of the parents'
+    compile flags, and moves of the items.
+    """
+    from PyQt5.QtCore import Qt
+    from manuskript.models import outlineItem
+    mdl = outlineModelBare
+    root = mdl.rootItem
+    folder = root.child(0)
+    E = folder.enum
+    sub = outlineItem(title="Sub folder", parent=folder)
+    text = outlineItem(title="Text", _type="md", parent=sub)
+    other = root.child(1)
+
+    def state(item):
+        return mdl.data(mdl.indexFromItem(item, E.compile), Qt.CheckStateRole)
+
+    assert text.compile() and state(text) == Qt.Checked
+    mdl.setData(mdl.indexFromItem(folder, E.compile), Qt.Unchecked, Qt.CheckStateRole)
+    assert not text.compile() and state(text) == Qt.Unchecked
+    assert other.compile()
+
+    folder.setData(E.compile, 2)
+    assert text.compile()
+    text.setData(E.compile, 0)
+    folder.setData(E.compile, 0)
+    folder.setData(E.compile, 2)
+    assert not text.compile() and sub.compile()
+
+    # Moves
+    text.setData(E.compile, 2)
+    folder.setData(E.compile, 0)
+    assert not text.compile()
+    sub.removeChild(0)
+    assert not text.compile()  # Removed items keep their parent
+    root.appendChild(text)
+    assert text.compile()
+    other.setData(E.compile, 0)
+    root.removeChild(text.row())
+    other.appendChild(text)
+    assert not text.compile()
+    other.setData(E.compile, 2)
+    assert text.compile()
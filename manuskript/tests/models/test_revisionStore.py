@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# --!-- coding: utf8 --!--
+
+"""Tests for revisionStore"""
+
+import pytest
+
+from manuskript.models import revisionStore
+from manuskript.models.revisionStore import RevisionStore, diff, patch
+
+
+def test_pathFor():
+    assert RevisionStore.pathFor("/a/b/book.msk") == "/a/b/book.revisions"
+
+
+@pytest.mark.parametrize("old, new", [
+    ("", ""),
+    ("", "New"),
+    ("Old", ""),
+    ("Same\ntext\n", "Same\ntext\n"),
+    ("One two three", "One 2 three"),
+    ("A\nB\nC\nD\nE\n", "A\nB2\nC\nE\nF\n"),
+    ("aaaa", "aa"),
+])
+def test_diff(old, new):
+    assert patch(old, diff(old, new)) == new
+
+
+def test_revisionStoreDeltas(tmpdir, monkeypatch):
+    monkeypatch.setattr(revisionStore, "keyframeInterval", 3)
+    store = RevisionStore(str(tmpdir / "book.revisions"))
+    texts = ["Line {}\n".format(i) * (i + 1) for i in range(7)]
+
+    added = store.save([("1", list(enumerate(texts)))])
+    rows = [rowID for ID, ts, ref, rowID in added]
+    bases = [r[0] for r in store.db().execute("SELECT base FROM revisions ORDER BY id")]
+    assert bases == [None, rows[0], rows[1], None, rows[3], rows[4], None]
+    assert [store.text(r) for r in rows] == texts
+
+    # Rows based on removed ones are rewritten
+    store.save([("1", [(i, rows[i]) for i in [0, 2, 5]])])
+    assert [store.text(rows[i]) for i in [0, 2, 5]] == [texts[0], texts[2], texts[5]]
+    assert store.text(rows[1]) is None
+    store.close()
+
+
+def test_revisionStoreRebaseDepth(tmpdir, monkeypatch):
+    monkeypatch.setattr(revisionStore, "keyframeInterval", 4)
+    store = RevisionStore(str(tmpdir / "book.revisions"))
+    texts = ["Line {}\n".format(i) * (i + 1) for i in range(7)]
+    depths = lambda: dict(store.db().execute("SELECT id, depth FROM revisions"))
+    bases = lambda: dict(store.db().execute("SELECT id, base FROM revisions"))
+
+    added = store.save([("1", list(enumerate(texts[:4])))])
+    rows = [rowID for ID, ts, ref, rowID in added]
+    assert depths() == {rows[0]: 0, rows[1]: 1, rows[2]: 2, rows[3]: 3}
+
+    # Cleaned: the whole chain gets closer to a whole text
+    kept = [(2, rows[2]), (3, rows[3])]
+    store.save([("1", kept)])
+    assert depths() == {rows[2]: 0, rows[3]: 1}
+
+    # Then new revisions go on with the chain, up to keyframeInterval
+    added = store.save([("1", kept + [(i, texts[i]) for i in range(4, 7)])])
+    new = [rowID for ID, ts, ref, rowID in added]
+    assert [bases()[r] for r in new] == [rows[3], new[0], None]
+    assert [depths()[r] for r in new] == [2, 3, 0]
+    assert [store.text(r) for r in rows[2:] + new] == texts[2:]
+    store.close()
+
+
+def test_revisionStore(tmpdir):
+    store = RevisionStore(str(tmpdir / "book.revisions"))
+    assert not store.exists()
+
+    # New revisions are added
+    added = store.save([("1", [(10, "A"), (20, "B")]), ("2", [(30, "C")])])
+    assert [(ID, ts, ref) for ID, ts, ref, rowID in added] == \
+           [("1", 10, "A"), ("1", 20, "B"), ("2", 30, "C")]
+    assert store.exists()
+    rows = {ref: rowID for ID, ts, ref, rowID in added}
+    assert store.text(rows["B"]) == "B"
+    assert store.revisions() == {"1": [(10, rows["A"]), (20, rows["B"])],
+                                 "2": [(30, rows["C"])]}
+
+    # Saved ones are kept, missing ones are removed, copies are added again
+    added = store.save([("1", [(20, rows["B"]), (40, "D")]), ("3", [(30, rows["C"])])])
+    assert [(ID, ts, ref) for ID, ts, ref, rowID in added] == \
+           [("1", 40, "D"), ("3", 30, rows["C"])]
+    copy = added[1][3]
+    assert store.text(copy) == "C"
+    assert store.text(rows["A"]) is None
+    assert store.revisions() == {"1": [(20, rows["B"]), (40, added[0][3])],
+                                 "3": [(30, copy)]}
+    store.close()
+
+    # Copied to another store
+    other = RevisionStore(str(tmpdir / "other.revisions"))
+    other.copyFrom(store.path)
+    assert other.text(copy) == "C"
+    other.close()
@@ -0,0 +1,474 @@
+#!/usr/bin/env python
+# --!-- coding: utf8 --!--
+
+"""Tests for project"""
+
+import re
+from collections import OrderedDict
+
+import pytest
+
+from manuskript.constants import MAIN_DIR
+from manuskript.project import ProjectV1
+
+
+def parseMMDFileByLine(text, asDict=False):
+    """
+    The line by line parser parseMMDFile replaces, as a reference.
+    """
+    md = []
+    mdd = OrderedDict()
+    body = []
+    descr = ""
+    val = ""
+    inBody = False
+    for s in text.split("\n"):
+        if not inBody:
+            m = re.match(r"^([^\s].*?):\s*(.*)$", s)
+            if m:
+                if descr:
+                    if descr == "None":
+                        descr = ""
+                    md.append((descr, val))
+                    mdd[descr] = val
+                descr = m.group(1)
+                val = m.group(2)
+
+            elif s[:4] == "    ":
+                val += "\n" + s.strip()
+
+            elif s == "":
+                inBody = True
+                if descr:
+                    if descr == "None":
+                        descr = ""
+                    md.append((descr, val))
+                    mdd[descr] = val
+
+        else:
+            body.append(s)
+
+    if body and body[0] == "":
+        body = body[1:]
+
+    return (mdd if asDict else md), "\n".join(body)
+
+
+def sampleFiles():
+    "Returns the multimarkdown files of the sample projects."
+    return sorted(f for f in (MAIN_DIR / "sample-projects").walkfiles()
+                  if f.ext in [".md", ".txt"])
+
+
+@pytest.mark.parametrize("f", sampleFiles(), ids=lambda f: f.name)
+def test_parseMMDFileSamples(f):
+    text = f.text(encoding="utf-8")
+    for asDict in [False, True]:
+        assert ProjectV1.parseMMDFile(text, asDict) == parseMMDFileByLine(text, asDict)
+
+
+@pytest.mark.parametrize("text, md, body", [
+    ("", [], ""),
+    ("\n", [], ""),
+    ("Body", [], ""),
+    ("title: A\n\n\nBody", [("title", "A")], "Body"),
+    ("title: A\n\nBody\n\nEnd\n", [("title", "A")], "Body\n\nEnd\n"),
+    ("title: A\n\n\n\nBody", [("title", "A")], "\nBody"),
+    ("\nBody", [], "Body"),
+    ("title:A\nID:  2\n", [("title", "A"), ("ID", "2")], ""),
+    # Without empty line, the last metadata is lost
+    ("title: A\nID: 2", [("title", "A")], ""),
+    # Indented lines continue the value
+    ("notes: A\n        B\n     C\n\n", [("notes", "A\nB\nC")], ""),
+    # Other lines are ignored
+    ("title: A\nnothing\n  x: y\n\n", [("title", "A")], ""),
+    ("None: A\n\n", [("", "A")], ""),
+    ("a:b:c\n::\n: x\n\n", [("a", "b:c"), (":", "")], ""),
+    ("a: 1\na: 2\n\n", [("a", "1"), ("a", "2")], ""),
+    # Lines ending with \r are never empty
+    ("title: A\r\nID: 2\r\n\r\nBody\n", [("title", "A\r"), ("ID", "2\r")], ""),
+])
+def test_parseMMDFile(text, md, body):
+    assert ProjectV1.parseMMDFile(text) == (md, body)
+    assert ProjectV1.parseMMDFile(text, asDict=True) == (OrderedDict(md), body)
+    assert parseMMDFileByLine(text) == (md, body)
+
+
+class Crash(BaseException):
+    "Stops a save like a crash would: commit does not catch it."
+
+
+def folderContent(root):
+    "Returns the files in `root`, by relative path, with their content."
+    return {str(root.relpathto(f)): f.bytes() for f in root.walkfiles()}
+
+
+def transaction(root):
+    """
+    Creates a project-like folder in `root`, and returns a transaction that
+    changes it, and the content of the folder before and after.
+    """
+    from manuskript.project import SaveTransaction
+    for path, content in [("book.msk", "1"), ("a.txt", "old a"),
+                          ("gone.txt", "gone"), ("dir1/c.txt", "c")]:
+        (root / path).parent.makedirs_p()
+        (root / path).write_text(content)
+    before = folderContent(root)
+
+    t = SaveTransaction(root, "book.msk", sync=False)
+    t.write("a.txt", "new a")
+    t.write("sub/b.txt", b"new b")
+    t.remove("gone.txt")
+    t.move("dir1", "dir2")
+    after = {"book.msk": b"1", "a.txt": b"new a", "sub/b.txt": b"new b",
+             "dir2/c.txt": b"c"}
+    return t, before, after
+
+
+@pytest.mark.parametrize("sync", [False, True])
+def test_saveTransaction(tmpdir, sync):
+    from path import Path
+    root = Path(str(tmpdir))
+    t, before, after = transaction(root)
+    t.sync = sync
+    t.commit()
+    # Journal and staged files are gone
+    assert folderContent(root) == after
+    assert sorted(root.listdir()) == sorted(root / p for p in ["book.msk", "a.txt", "sub", "dir2"])
+
+
+@pytest.mark.parametrize("failAt", range(5))
+@pytest.mark.parametrize("crash", [False, True], ids=["error", "crash"])
+def test_saveTransactionFails(tmpdir, monkeypatch, failAt, crash):
+    """
+    Files are renamed 5 times when the transaction is committed. One fails,
+    with an error or a crash: the project is as it was, after the commit or
+    after the next load.
+    """
+    import os
+    from path import Path
+    from manuskript.project import SaveTransaction
+    root = Path(str(tmpdir))
+    t, before, after = transaction(root)
+
+    calls = []
+    def failing(f):
+        def rename(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == failAt + 1:
+                raise Crash() if crash else OSError("Disk full")
+            return f(*args, **kwargs)
+        return rename
+    monkeypatch.setattr(os, "rename", failing(os.rename))
+    monkeypatch.setattr(os, "replace", failing(os.replace))
+
+    with pytest.raises(Crash if crash else OSError):
+        t.commit()
+
+    if crash:
+        # Nothing was rolled back: the journal is there
+        journal, staging = SaveTransaction.paths(root, "book.msk")
+        assert journal.exists()
+        assert folderContent(root) != before
+        assert SaveTransaction.recover(root, "book.msk")
+
+    assert folderContent(root) == before
+    assert not SaveTransaction.recover(root, "book.msk")
+
+
+def test_saveTransactionRecovers(tmpdir, monkeypatch):
+    "A new transaction rolls back the one that crashed, instead of wiping its backups."
+    import os
+    from path import Path
+    from manuskript.project import SaveTransaction
+    root = Path(str(tmpdir))
+    t, before, after = transaction(root)
+
+    replace = os.replace
+    def crash(*args):
+        raise Crash()
+    monkeypatch.setattr(os, "replace", crash)
+    with pytest.raises(Crash):
+        t.commit()
+    monkeypatch.setattr(os, "replace", replace)
+
+    t = SaveTransaction(root, "book.msk", sync=False)
+    assert folderContent(root) == before
+    t.write("a.txt", "newer a")
+    t.commit()
+    assert folderContent(root) == dict(before, **{"a.txt": b"newer a"})
+
+
+def smallProject(filename, zipped=False):
+    "Returns a project saved in `filename`, with a folder of three texts."
+    from manuskript.models import outlineItem
+    project = ProjectV1(filename)
+    project.zipped = zipped
+    project.sync = False
+    folder = outlineItem(title="Folder", parent=project.mdlOutline.rootItem)
+    for i in range(3):
+        text = outlineItem(title="Text {}".format(i), _type="md", parent=folder)
+        text.setData(text.enum.text, "Text number {}.".format(i))
+    assert project.save()
+    return project
+
+
+def failOnce(monkeypatch, name, error=OSError("Disk full")):
+    "Makes the next call to os.`name` raise `error`."
+    import os
+    f = getattr(os, name)
+    def failing(*args, **kwargs):
+        monkeypatch.setattr(os, name, f)
+        raise error
+    monkeypatch.setattr(os, name, failing)
+
+
+def checkManifest(project):
+    "Checks that the manifest of a project saved in a folder matches its files."
+    from manuskript.project import fileHash
+    folder = project.filename.stripext()
+    assert project.manifest
+    for path, (size, digest, mtime) in project.manifest.items():
+        assert fileHash((folder / path).bytes()) == digest
+
+
+def test_saveFailsManifest(tmpdir, monkeypatch):
+    "When a save fails, the manifest is the one of the files on disk."
+    from path import Path
+    project = smallProject(Path(str(tmpdir)) / "book.msk")
+    checkManifest(project)
+    manifest = dict(project.manifest)
+
+    text = project.mdlOutline.rootItem.child(0).child(1)
+    text.setData(text.enum.text, "Changed.")
+    failOnce(monkeypatch, "replace")
+    assert not project.save()
+    assert project.manifest == manifest
+    checkManifest(project)
+
+    assert project.save()
+    checkManifest(project)
+    loaded = ProjectV1.load(project.filename)
+    assert loaded.mdlOutline.rootItem.child(0).child(1).text() == "Changed."
+
+
+def test_saveInBackground(tmpdir):
+    from path import Path
+    project = smallProject(Path(str(tmpdir)) / "book.msk")
+    saved = []
+    project.saved.connect(lambda: saved.append(True))
+
+    # The worker gets its own manifest
+    snapshot = project.snapshot()
+    assert snapshot["manifest"] == project.manifest
+    assert snapshot["manifest"] is not project.manifest
+
+    text = project.mdlOutline.rootItem.child(0).child(1)
+    text.setData(text.enum.text, "Changed.")
+    project.saveInBackground()
+    assert project.isSaving()
+
+    # Changed while saving: saved again when the first save is done
+    text.setData(text.enum.text, "Changed again.")
+    project.saveInBackground()
+    project.waitForSave()
+    assert not project.isSaving()
+    assert len(saved) == 2
+    checkManifest(project)
+
+    loaded = ProjectV1.load(project.filename)
+    assert loaded.mdlOutline.rootItem.child(0).child(1).text() == "Changed again."
+
+
+def test_saveInBackgroundFails(tmpdir, monkeypatch):
+    from path import Path
+    project = smallProject(Path(str(tmpdir)) / "book.msk")
+    failed = []
+    project.saveFailed.connect(failed.append)
+    manifest = dict(project.manifest)
+
+    text = project.mdlOutline.rootItem.child(0).child(1)
+    text.setData(text.enum.text, "Changed.")
+    failOnce(monkeypatch, "replace")
+    project.saveInBackground()
+    project.waitForSave()
+    assert failed == ["Disk full"]
+    assert project.manifest == manifest
+    checkManifest(project)
+
+    # Next save writes everything
+    project.saveInBackground()
+    project.waitForSave()
+    assert len(failed) == 1
+    checkManifest(project)
+    loaded = ProjectV1.load(project.filename)
+    assert loaded.mdlOutline.rootItem.child(0).child(1).text() == "Changed."
+
+
+def test_incrementalZipSave(tmpdir, monkeypatch):
+    """
+    Saving a zipped project again copies the members of the texts that have
+    not changed from the previous file, and writes the one that has.
+    """
+    import zipfile
+    from path import Path
+    from manuskript import project as P
+    project = smallProject(Path(str(tmpdir)) / "book.msk", zipped=True)
+    with zipfile.ZipFile(project.filename) as zf:
+        before = {i.filename: (i, zf.read(i)) for i in zf.infolist()}
+
+    copied = []
+    def copyZipMember(source, info, target, name):
+        copied.append(str(name).replace("\\", "/"))
+        return copyZipMemberOrig(source, info, target, name)
+    copyZipMemberOrig = P.copyZipMember
+    monkeypatch.setattr(P, "copyZipMember", copyZipMember)
+
+    folder = project.mdlOutline.rootItem.child(0)
+    text = folder.child(1)
+    text.setData(text.enum.text, "Changed.")
+    assert project.save()
+
+    changed = str(text._lastPath).replace("\\", "/")
+    texts = [str(c._lastPath).replace("\\", "/") for c in folder.children()]
+    assert set(texts) - set(copied) == {changed}
+
+    with zipfile.ZipFile(project.filename) as zf:
+        assert zf.testzip() is None
+        for name in copied:
+            old, new = before[name][0], zf.getinfo(name)
+            assert (new.CRC, new.compress_size, new.file_size, new.date_time) == \
+                   (old.CRC, old.compress_size, old.file_size, old.date_time)
+            assert zf.read(name) == before[name][1]
+        assert zf.read(changed) != before[changed][1]
+
+    loaded = ProjectV1.load(project.filename)
+    assert [c.text() for c in loaded.mdlOutline.rootItem.child(0).children()] == \
+           ["Text number 0.", "Changed.", "Text number 2."]
+
+
+@pytest.mark.parametrize("zipped", [False, True], ids=["folder", "zip"])
+def test_lazyLoad(tmpdir, zipped):
+    "Texts of a project loaded lazily are read when they are needed."
+    from path import Path
+    project = smallProject(Path(str(tmpdir)) / "book.msk", zipped)
+    full = ProjectV1.load(project.filename)
+    lazy = ProjectV1.load(project.filename, lazy=True)
+    texts = lazy.mdlOutline.rootItem.child(0).children()
+    assert all(t._lazy is not None for t in texts)
+
+    # Exported without being read first
+    expected = ProjectV1.outlineToMMD(full.mdlOutline.rootItem.child(0).child(0))
+    assert ProjectV1.outlineToMMD(texts[0]) == expected
+    assert texts[0]._lazy is None
+    assert texts[1].text() == "Text number 1."
+    assert texts[2]._lazy is not None
+
+
+@pytest.mark.parametrize("zipped", [False, True], ids=["folder", "zip"])
+def test_lazyLoadAfterMove(tmpdir, zipped):
+    """
+    Texts not read yet are read where a background save has moved them,
+    as soon as it has, before the items know (see ProjectV1.readLazy).
+    """
+    from concurrent.futures import wait
+    from path import Path
+    smallProject(Path(str(tmpdir)) / "book.msk", zipped)
+    project = ProjectV1.load(Path(str(tmpdir)) / "book.msk", lazy=True)
+    folder = project.mdlOutline.rootItem.child(0)
+    texts = folder.children()
+    oldPaths = [t._lastPath for t in texts]
+
+    # Renaming the folder moves the files of its texts
+    folder.setData(folder.enum.title, "Renamed")
+    project.saveInBackground()
+    wait([project._saveFuture])
+    assert [t._lastPath for t in texts] == oldPaths
+    if not zipped:
+        assert not (project.filename.stripext() / oldPaths[0]).exists()
+
+    assert texts[0]._lazy is not None
+    assert texts[0].text() == "Text number 0."
+    project.waitForSave()
+    assert [t._lastPath for t in texts] != oldPaths
+    assert texts[1]._lazy is not None
+    assert texts[1].text() == "Text number 1."
+
+    loaded = ProjectV1.load(project.filename)
+    assert loaded.mdlOutline.rootItem.child(0).title() == "Renamed"
+    assert [t.text() for t in loaded.mdlOutline.rootItem.child(0).children()] == \
+           ["Text number {}.".format(i) for i in range(3)]
+
+
+@pytest.mark.parametrize("zipped", [False, True], ids=["folder", "zip"])
+def test_loadInThreads(tmpdir, monkeypatch, zipped):
+    "Projects parsed by a pool of threads are the same as parsed by one."
+    import zipfile
+    from path import Path
+    tmp = Path(str(tmpdir))
+    sample = MAIN_DIR / "sample-projects" / "book-of-acts"
+    if zipped:
+        with zipfile.ZipFile(tmp / "book.msk", "w") as zf:
+            for f in sample.walkfiles():
+                zf.write(f, sample.relpathto(f))
+    else:
+        sample.copytree(tmp / "book")
+        (tmp / "book.msk").write_text("1")
+
+    saved = []
+    for workers in [1, 8]:
+        monkeypatch.setattr(ProjectV1, "loadWorkers", workers)
+        project = ProjectV1.load(tmp / "book.msk")
+        assert project.loadingErrors == []
+        project.zipped = False
+        project.sync = False
+        out = (tmp / "out{}".format(workers)).mkdir()
+        assert project.save_as(out / "book.msk")
+        content = folderContent(out / "book")
+        content.pop(ProjectV1.manifestName)
+        saved.append(content)
+
+    assert len(saved[0]) > 50
+    assert saved[0] == saved[1]
+
+
+@pytest.mark.parametrize("fromFile", [False, True], ids=["stream", "file"])
+def test_appendRevisions(tmpdir, caplog, fromFile):
+    "Revisions streamed from revisions.xml go to the items with their IDs."
+    import io
+    from lxml import etree as ET
+    from path import Path
+    from manuskript.models import outlineItem, outlineModel
+    mdl = outlineModel(None)
+    folder = outlineItem(title="Folder", parent=mdl.rootItem)
+    sub = outlineItem(title="Sub folder", parent=folder)
+    texts = [outlineItem(title="Text", _type="md", parent=parent)
+             for parent in [folder, sub, sub, mdl.rootItem]]
+    for i, text in enumerate(texts):
+        text.appendRevisions([(1000 + j, "Text {} at {}".format(i, j))
+                              for j in range(i + 1)])
+    xml = mdl.saveToXML()
+
+    # An item that is not in the model
+    lost = mdl.rootItem.copy(keepIDs=True)
+    gone = outlineItem(title="Gone", _type="md", ID="99")
+    gone.appendRevision(1000, "Gone")
+    lost.appendChild(gone)
+
+    # Same items, without revisions
+    loaded = outlineModel(None)
+    loaded.loadFromXML(xml, fromString=True)
+    for text in texts:
+        loaded.getItemByID(text.ID()).clearAllRevisions()
+
+    content = ET.tostring(lost.toXMLElement())
+    if fromFile:
+        source = Path(str(tmpdir)) / "revisions.xml"
+        source.write_bytes(content)
+    else:
+        source = io.BytesIO(content)
+    ProjectV1.appendRevisions(loaded, source)
+
+    for text in texts:
+        assert loaded.getItemByID(text.ID()).revisions() == text.revisions()
+    assert "no item whose ID is 99" in caplog.text
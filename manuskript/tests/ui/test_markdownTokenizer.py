@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# --!-- coding: utf8 --!--
+
+"""Tests for the markdown tokenizers."""
+
+import pytest
+
+from manuskript.constants import MAIN_DIR
+from manuskript.ui.highlighters import MarkdownState as MS
+from manuskript.ui.highlighters import MarkdownTokenizer, MarkdownReTokenizer
+
+# Lines with some of everything the tokenizers know about
+lines = [
+    "", "   ", "\t", "Some text.", "Line break  ", "    code", "\tcode",
+    "# Title", "### Title ###", "####### Seven", "#", "\\# Escaped",
+    "===", "---", "--- ", "***", "* * *", "___", "- - -",
+    "> Quote", "   >> Nested *quote*", ">",
+    "1. One", "a) Letter", "    2. Nested", "1.No space",
+    "* Bullet", "- Bullet **strong**", "+ Bullet", "   * Bullet", "    * Bullet", "*Not bullet",
+    "```", "```python", "``` ", "~~~", "~~~ python",
+    "<!-- comment -->", "<!-- open comment", "end of comment --> text", "text <!-- a --> b <!-- c",
+    "*emphasis* and _emphasis_", "**strong** and __strong__", "***both***", "* not *", "**not**strong**",
+    "~~strike~~", "~~ not ~~", "x^super^ y~sub~ z^a\\ b^", "~~~not~~~",
+    "`code` and ``co`de`` and ```", "`unclosed", "a `*b*` c",
+    "<span>tag</span>", "<http://example.com>", "<user@example.com>", "<x:y> a@b>",
+    "&amp; &#38; &#x26; &nope",
+    "[link](http://example.com)", "![image](image.png)", "[reference]", "[ref]: http://example.com",
+    "  [ref]: *x*", "[a](b) [c](d)", "[[nested]](x)",
+    "@mention @mention-with/path a@b", "\\*escaped\\*",
+    "{++added++} {--deleted--} {~~old~>new~~} {>>comment<<} {==highlight==}",
+    "| a | b |", "|---|---|", "--- | ---", "| 1 | *2* |", "a | b",
+    "Unicode é à ü — “quotes” *émphasis*", "*a* *b* _c_ __d__ ~~e~~ `f`",
+    "Soft line *break*",
+]
+
+states = [MS.MarkdownStateUnknown] + list(range(MS.MarkdownStatePipeTableRow + 1))
+
+# Lines with characters outside of the BMP, that count twice in Qt positions
+emoji = "\U0001F600"
+nonBMPLines = [
+    emoji, emoji + "===", "# Title " + emoji + " #", "    code " + emoji,
+    emoji + " *emphasis* and `code` " + emoji + " **strong**",
+    "> Quote " + emoji + " [link](http://example.com)",
+    "* Bullet " + emoji + " <span>tag</span> @mention" + emoji,
+    "<!-- " + emoji + " --> {++" + emoji + "++} \U0001F4DA\U0001F4DA",
+    "1. " + emoji + " ~~strike " + emoji + "~~ x^" + emoji + "^",
+]
+
+
+def tokenize(tokenizer, text, currentState, previousState, nextState):
+    "Returns what `tokenizer` makes of `text`."
+    tokenizer.clear()
+    tokenizer.tokenize(text, currentState, previousState, nextState)
+    tokens = [(t.type, t.position, t.length, t.openingMarkupLength, t.closingMarkupLength)
+              for t in tokenizer.getTokens()]
+    return tokens, tokenizer.getState(), tokenizer.backtrackRequested()
+
+
+def sampleTexts():
+    "Returns the texts of the sample projects."
+    return sorted(f for f in (MAIN_DIR / "sample-projects").walkfiles()
+                  if f.ext in [".md", ".txt"])
+
+
+@pytest.mark.parametrize("text", lines)
+def test_reTokenizerLines(text):
+    qt, py = MarkdownTokenizer(), MarkdownReTokenizer()
+    for previousState in states:
+        for nextState in states:
+            for currentState in [MS.MarkdownStateUnknown, MS.MarkdownStateParagraph]:
+                args = (text, currentState, previousState, nextState)
+                assert tokenize(py, *args) == tokenize(qt, *args), args
+
+
+@pytest.mark.parametrize("text", nonBMPLines)
+def test_reTokenizerNonBMP(text):
+    """
+    Positions are in UTF-16 code units, like QSyntaxHighlighter's: tokens
+    are the ones of MarkdownTokenizer, with two characters of the BMP in
+    place of each character outside of it.
+    """
+    qt, py = MarkdownTokenizer(), MarkdownReTokenizer()
+    bmp = "".join("\u2605\u2605" if c > "\uffff" else c for c in text)
+    for previousState in states:
+        for nextState in states:
+            for currentState in [MS.MarkdownStateUnknown, MS.MarkdownStateParagraph]:
+                args = (currentState, previousState, nextState)
+                assert tokenize(py, text, *args) == tokenize(qt, bmp, *args), args
+
+
+@pytest.mark.parametrize("f", sampleTexts(), ids=lambda f: f.name)
+def test_reTokenizerSamples(f):
+    qt, py = MarkdownTokenizer(), MarkdownReTokenizer()
+    previousState = MS.MarkdownStateUnknown
+    for text in f.text(encoding="utf-8").split("\n") + lines:
+        args = (text, MS.MarkdownStateUnknown, previousState, MS.MarkdownStateUnknown)
+        result = tokenize(py, *args)
+        assert result == tokenize(qt, *args), args
+        previousState = result[1]
+
+
+def test_tokenizeCached():
+    tokenizer = MarkdownReTokenizer()
+    tokenizer.cacheSize = 3
+
+    def cached(text, nextState=MS.MarkdownStateUnknown):
+        args = (text, MS.MarkdownStateUnknown, MS.MarkdownStateParagraphBreak, nextState)
+        tokenizer.tokenizeCached(*args)
+        tokens = [(t.type, t.position, t.length, t.openingMarkupLength, t.closingMarkupLength)
+                  for t in tokenizer.getTokens()]
+        assert (tokens, tokenizer.getState(), tokenizer.backtrackRequested()) == \
+            tokenize(MarkdownTokenizer(), *args)
+
+    for text in ["# Title", "*a* **b**", "Text"] * 2:
+        cached(text)
+    assert (tokenizer.cacheHits, tokenizer.cacheMisses) == (3, 3)
+
+    # Other states make another block, the least recently used is forgotten
+    cached("Text", MS.MarkdownStateSetextHeading1Line2)
+    cached("Text")
+    assert (tokenizer.cacheHits, tokenizer.cacheMisses) == (4, 4)
+    cached("# Title")
+    assert (tokenizer.cacheHits, tokenizer.cacheMisses) == (4, 5)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# --!-- coding: utf8 --!--
+
+"""Tests for the text editor."""
+
+import pytest
+
+# Qt positions count UTF-16 units: characters out of the BMP count twice
+@pytest.mark.parametrize("old, position, removed, added", [
+    ("Some words.", 5, 0, "new "),
+    ("Some words.", 0, 5, ""),
+    ("\U0001F600 Some words.", 8, 0, "new "),
+    ("Some words.", 5, 0, "\U0001F600 "),
+    ("Some \U0001F600 words.", 5, 3, ""),
+])
+def test_submitChange(old, position, removed, added):
+    from PyQt5.QtGui import QTextCursor
+    from manuskript.functions import wordCount
+    from manuskript.models import outlineModel, outlineItem
+    from manuskript.ui.views.textEditView import textEditView
+
+    model = outlineModel(None)
+    item = outlineItem(title="Text", _type="md", parent=model.rootItem)
+    item.setData(item.enum.text, old)
+    view = textEditView(index=model.indexFromItem(item, item.enum.text))
+    assert view.toPlainText() == old
+
+    cursor = QTextCursor(view.document())
+    cursor.setPosition(position)
+    cursor.setPosition(position + removed, QTextCursor.KeepAnchor)
+    cursor.insertText(added)
+    view.submit()
+
+    assert item.text() == view.toPlainText()
+    assert item.wordCount() == wordCount(item.text())
+
+
+def test_wordCount():
+    "Words counted by block as they are highlighted add up to the text's."
+    from PyQt5.QtGui import QTextCursor
+    from PyQt5.QtWidgets import qApp
+    from manuskript.functions import wordCount
+    from manuskript.ui.views.MDEditView import MDEditView
+
+    view = MDEditView()
+    counts = []
+    view.wordCountChanged.connect(counts.append)
+    view.setPlainText("Lorem ipsum dolor sit amet.\n\n" * 20)
+    assert view.wordCount() == 100
+
+    cursor = QTextCursor(view.document())
+
+    def edit(position, removed, added):
+        cursor.setPosition(position)
+        cursor.setPosition(position + removed, QTextCursor.KeepAnchor)
+        cursor.insertText(added)
+        assert view.wordCount() == wordCount(view.toPlainText())
+
+    edit(6, 0, "new ")             # In a block
+    edit(6, 0, "two\n\nblocks ")   # Splits the block
+    edit(3, 12, "")                # Joins blocks
+    edit(40, 200, "")              # Removes blocks
+    edit(0, 0, "# Title\n\n> Quote\n\n* One\n* Two\n")
+    edit(10, 100, "word\n" * 10)
+    view.undo()
+    assert view.wordCount() == wordCount(view.toPlainText())
+    view.selectAll()
+    view.textCursor().removeSelectedText()
+    assert view.wordCount() == 0
+
+    # Changes are told once the events are processed
+    qApp.processEvents()
+    assert counts[-1] == 0
+
+
+def test_formatsAfterSettings(monkeypatch):
+    "The formats of token types are computed again when settings change."
+    from PyQt5.QtGui import QFont
+    from manuskript import settings
+    from manuskript.models import outlineModel, outlineItem
+    from manuskript.ui.highlighters import MarkdownTokenType as MTT
+    from manuskript.ui.views.MDEditView import MDEditView
+
+    model = outlineModel(None)
+    item = outlineItem(title="Text", _type="md", parent=model.rootItem)
+    item.setData(item.enum.text, "# Title\n\nSome *emphasis*.")
+    index = model.indexFromItem(item, item.enum.text)
+    view = MDEditView(index=index)
+    formats = dict(view.highlighter.formats)
+
+    font = QFont()
+    font.fromString(settings.textEditor["font"])
+    font.setPointSize(font.pointSize() + 10)
+    monkeypatch.setitem(settings.textEditor, "font", font.toString())
+    monkeypatch.setitem(settings.textEditor, "fontColor", "#123456")
+    view.loadFontSettings()
+
+    # As computed by a new editor
+    assert view.highlighter.formats != formats
+    assert view.highlighter.formats == MDEditView(index=index).highlighter.formats
+    assert view.highlighter.formats[MTT.TokenAtxHeading1, False][2] == font.pointSize() + 7
+
+    # And applied to the text
+    sizes = [r.format.font().pointSize()
+             for r in view.document().firstBlock().layout().formats()]
+    assert font.pointSize() + 7 in sizes
@@ -26,6 +26,7 @@ class blockUserData(QTextBlockUserData):
         self._leadingSpaces = 0
         self._emptyLinesBefore = 0
         self._listSymbol = ""
+        self._wordCount = 0
 
     def isList(self):
         return self._listLevel > 0
@@ -54,6 +55,12 @@ class blockUserData(QTextBlockUserData):
     def setEmptyLinesBefore(self, n):
         self._emptyLinesBefore = n
 
+    def wordCount(self):
+        return self._wordCount
+
+    def setWordCount(self, n):
+        self._wordCount = n
+
     def text(self):
         return str(self.listLevel()) + "|" + str(self.leadingSpaces()) + "|" + str(self.emptyLinesBefore())
 
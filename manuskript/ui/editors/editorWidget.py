@@ -53,6 +53,7 @@ class editorWidget(QWidget, Ui_editorWidget_ui):
         self.toggledSpellcheck.connect(self.txtRedacText.toggleSpellcheck, AUC)
         self.dictChanged.connect(self.txtRedacText.setDict, AUC)
         self.txtRedacText.setHighlighting(True)
+        self.txtRedacText.wordCountChanged.connect(self.updateStatusBar, AUC)
         self.currentDict = ""
         self.spellcheck = True
         self.folderView = "cork"
@@ -359,7 +360,13 @@ class editorWidget(QWidget, Ui_editorWidget_ui):
         if not mw:
             return
 
-        mw.mainEditor.updateStats()
+        # Words of the text being edited are counted as it changes
+        wordCount = None
+        if self.stack.currentIndex() == 0 and self.currentIndex.isValid() \
+                and mw.mainEditor.currentEditor() is self:
+            wordCount = self.txtRedacText.wordCount()
+
+        mw.mainEditor.updateStats(wordCount)
 
     def toggleSpellcheck(self, v):
         self.spellcheck = v
@@ -114,6 +114,7 @@ class fullScreenEditor(QWidget):
 
         # Connection
         self._index.model().dataChanged.connect(self.dataChanged)
+        self.editor.wordCountChanged.connect(self.updateStatusBar)
 
         # self.updateTheme()
         self.showFullScreen()
@@ -269,9 +270,14 @@ class fullScreenEditor(QWidget):
         if self._index:
             item = self._index.internalPointer()
 
-        wc = item.data(Outline.wordCount)
+        # Words of the text being edited are counted as it changes
+        wc = self.editor.wordCount()
         goal = item.data(Outline.goal)
-        pg = item.data(Outline.goalPercentage)
+        if wc is None:
+            wc = item.data(Outline.wordCount)
+            pg = item.data(Outline.goalPercentage)
+        else:
+            pg = wc / float(goal) if goal else ""
 
         if goal:
             rect = self.lblProgress.geometry()
@@ -290,7 +290,12 @@ class mainEditor(QWidget, Ui_mainEditor):
         elif view == "outline":
             self.btnRedacFolderOutline.setChecked(True)
 
-    def updateStats(self):
+    def updateStats(self, wordCount=None):
+        """
+        Shows the number of words of the current item, and its progress.
+        @param wordCount: number of words of the current item, if the editor
+                          knows better than the item (see textEditView.wordCount)
+        """
 
         if not self.currentEditor():
             return
@@ -307,6 +312,9 @@ class mainEditor(QWidget, Ui_mainEditor):
         wc = item.data(Outline.wordCount)
         goal = item.data(Outline.goal)
         progress = item.data(Outline.goalPercentage)
+        if wordCount is not None:
+            wc = wordCount
+            progress = wc / float(goal) if goal else ""
         # mw = qApp.activeWindow()
 
         if not wc:
@@ -9,4 +9,5 @@ from manuskript.ui.highlighters.markdownEnums import MarkdownState
 from manuskript.ui.highlighters.markdownEnums import MarkdownTokenType
 from manuskript.ui.highlighters.markdownEnums import BlockquoteStyle
 from manuskript.ui.highlighters.markdownTokenizer import MarkdownTokenizer
+from manuskript.ui.highlighters.markdownTokenizer import MarkdownReTokenizer
 from manuskript.ui.highlighters.markdownHighlighter import MarkdownHighlighter
@@ -3,7 +3,7 @@
 
 import re
 
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
 from PyQt5.QtGui import QBrush, QTextCursor, QColor, QFont, QSyntaxHighlighter
 from PyQt5.QtGui import QTextBlockFormat, QTextCharFormat
 
@@ -11,9 +11,14 @@ from manuskript import functions as F
 from manuskript import settings
 import manuskript.models.references as Ref
 import manuskript.ui.style as S
+from manuskript.ui.editors.blockUserData import blockUserData
 
 
 class BasicHighlighter(QSyntaxHighlighter):
+
+    # Number of words in the document, when it has changed (see wordCount)
+    wordCountChanged = pyqtSignal(int)
+
     def __init__(self, editor):
         QSyntaxHighlighter.__init__(self, editor.document())
 
@@ -27,6 +32,68 @@ class BasicHighlighter(QSyntaxHighlighter):
         self.linkColor = QColor(S.link)
         self.spellingErrorColor = QColor(Qt.red)
 
+        # Words are counted by block when blocks are highlighted, and added
+        # up. Blocks may have been counted already.
+        self._wordCount = self.countWords()
+        self._blockCount = editor.document().blockCount()
+        self._wordCountTimer = QTimer(self)
+        self._wordCountTimer.setSingleShot(True)
+        self._wordCountTimer.setInterval(0)
+        self._wordCountTimer.timeout.connect(self.emitWordCountChanged)
+        editor.document().contentsChange.connect(self.blocksChanged)
+
+    def wordCount(self):
+        """
+        Returns the number of words in the document, kept up to date as
+        blocks change, without reading the whole text.
+        """
+        return self._wordCount
+
+    def emitWordCountChanged(self):
+        self.wordCountChanged.emit(self._wordCount)
+
+    def countWords(self):
+        "Returns the sum of the words counted in each block."
+        words = 0
+        block = self.document().begin()
+        while block.isValid():
+            data = block.userData()
+            if isinstance(data, blockUserData):
+                words += data.wordCount()
+            block = block.next()
+        return words
+
+    def countBlockWords(self, text):
+        "Counts the words of the current block, and updates the total."
+        data = self.currentBlockUserData()
+        if not isinstance(data, blockUserData):
+            data = blockUserData()
+            self.setCurrentBlockUserData(data)
+
+        words = F.wordCount(text)
+        if words != data.wordCount():
+            self._wordCount += words - data.wordCount()
+            data.setWordCount(words)
+            self._wordCountTimer.start()
+
+    def blocksChanged(self, position, removed, added):
+        """
+        Counts words again when blocks have been removed from the document,
+        since their words are in the total. Changed blocks have already been
+        highlighted, and counted.
+        """
+        doc = self.document()
+        if doc is None:
+            return
+
+        blocks = doc.blockCount()
+        end = doc.findBlock(position + added)
+        if not end.isValid() or \
+                end.blockNumber() - doc.findBlock(position).blockNumber() > blocks - self._blockCount:
+            self._wordCount = self.countWords()
+            self._wordCountTimer.start()
+        self._blockCount = blocks
+
     def setDefaultBlockFormat(self, bf):
         self._defaultBlockFormat = bf
         self.rehighlight()
@@ -97,6 +164,8 @@ class BasicHighlighter(QSyntaxHighlighter):
         before you do any custom highlighting. Or implement doHighlightBlock.
         """
 
+        self.countBlockWords(text)
+
         #print(">", self.currentBlock().document().availableUndoSteps())
         c = QTextCursor(self.currentBlock())
         #c.joinPreviousEditBlock()
@@ -10,7 +10,7 @@ import logging
 
 from PyQt5.QtCore import Qt, pyqtSignal, qWarning
 from PyQt5.QtGui import (QTextBlock, QColor, QFont,
-                         QTextCharFormat, QBrush)
+                         QTextCharFormat, QTextFormat, QBrush)
 from PyQt5.QtWidgets import qApp, QStyle
 
 from manuskript import functions as F
@@ -20,7 +20,7 @@ from manuskript.ui.highlighters import BasicHighlighter
 from manuskript.ui.highlighters import BlockquoteStyle as BS
 from manuskript.ui.highlighters import MarkdownState as MS
 from manuskript.ui.highlighters import MarkdownTokenType as MTT
-from manuskript.ui.highlighters import MarkdownTokenizer
+from manuskript.ui.highlighters import MarkdownTokenizer, MarkdownReTokenizer
 
 
 # Un longue ligne. Un longue ligne. Un longue ligne. Un longue ligne.asdasdasda
@@ -39,12 +39,26 @@ class MarkdownHighlighter(BasicHighlighter):
     headingFound = pyqtSignal(int, str, QTextBlock)
     headingRemoved = pyqtSignal(int)
 
+    headingTokens = {
+        MTT.TokenAtxHeading1,
+        MTT.TokenAtxHeading2,
+        MTT.TokenAtxHeading3,
+        MTT.TokenAtxHeading4,
+        MTT.TokenAtxHeading5,
+        MTT.TokenAtxHeading6,
+        MTT.TokenSetextHeading1Line1,
+        MTT.TokenSetextHeading2Line1,
+    }
+
     def __init__(self, editor):
         BasicHighlighter.__init__(self, editor)
 
         #default values
         self.editor = editor
-        self.tokenizer = MarkdownTokenizer()
+        if settings.textEditor["tokenizer"] == "re":
+            self.tokenizer = MarkdownReTokenizer()
+        else:
+            self.tokenizer = MarkdownTokenizer()
 
         self.spellCheckEnabled = False
         #self.typingPaused = True
@@ -170,7 +184,6 @@ class MarkdownHighlighter(BasicHighlighter):
                 self.setFormat(0, len(text), fmt)
 
         if self.tokenizer != None:
-            self.tokenizer.clear()
             block = self.currentBlock()
             nextState = MS.MarkdownStateUnknown
             previousState = self.previousBlockState()
@@ -178,7 +191,7 @@ class MarkdownHighlighter(BasicHighlighter):
             if block.next().isValid():
                 nextState = block.next().userState()
 
-            self.tokenizer.tokenize(text, lastState, previousState, nextState)
+            self.tokenizer.tokenizeCached(text, lastState, previousState, nextState)
             self.setCurrentBlockState(self.tokenizer.getState())
 
             self.inBlockquote = self.tokenizer.getState() == MS.MarkdownStateBlockquote
@@ -215,19 +228,10 @@ class MarkdownHighlighter(BasicHighlighter):
                     qWarning("Highlighter found unknown token type in text block.")
                     continue
 
-                if token.type in [
-                        MTT.TokenAtxHeading1,
-                        MTT.TokenAtxHeading2,
-                        MTT.TokenAtxHeading3,
-                        MTT.TokenAtxHeading4,
-                        MTT.TokenAtxHeading5,
-                        MTT.TokenAtxHeading6,
-                        MTT.TokenSetextHeading1Line1,
-                        MTT.TokenSetextHeading2Line1,
-                    ]:
+                if token.type in self.headingTokens:
                     self.storeHeadingData(token, text)
 
-                self.applyFormattingForToken(token, text)
+                self.applyFormattingForToken(token, text, unfocus)
 
             if self.tokenizer.backtrackRequested():
                 previous = self.currentBlock().previous()
@@ -440,12 +444,76 @@ class MarkdownHighlighter(BasicHighlighter):
     # ACTUAL FORMATTING
     ###########################################################################
 
-    def applyFormattingForToken(self, token, text):
+    def updateFormats(self):
+        """
+        Computes, from the theme, what the formatting of each token type
+        changes to the text and to the markup, in focus and out of focus (see
+        unfocusConditions). Must be called when the theme or the font size
+        changes.
+        """
+        self.formats = {}
+        for tokenType in range(MTT.TokenLast):
+            theme = self.theme.get(tokenType)
+            for unfocused in [False, True]:
+                fmt = QTextCharFormat()
+                markupFormat = QTextCharFormat()
+                if self.theme.get("markup"):
+                    markupFormat.setForeground(self.theme["markup"])
+                if theme:
+                    fmt, markupFormat = self.formatsFromTheme(theme, fmt,
+                                                              markupFormat)
+
+                # The font size is set with the rest of the font, as it is
+                # at the position of the token (see applyFormattingForToken)
+                size = None
+                if theme and theme.get("deltaSize"):
+                    size = self.editor._defaultFontSize + theme["deltaSize"]
+                    if size < 0:
+                        size = None
+
+                # Text keeps its color if the theme doesn't set one: it is
+                # made transparent in applyFormattingForToken
+                transparent = False
+                if unfocused:
+                    if fmt.hasProperty(QTextFormat.ForegroundBrush):
+                        self.transparentFormat(fmt)
+                    else:
+                        transparent = True
+                    self.transparentFormat(markupFormat)
+
+                self.formats[tokenType, unfocused] = (
+                    fmt, markupFormat, size,
+                    bool(theme and theme.get("formatMarkup")), transparent)
+
+    def applyFormattingForToken(self, token, text, unfocus=False):
+        """
+        Formats token, adding to the formats already there the ones of its
+        type (see updateFormats).
+        @param unfocus: unfocusConditions() for the current block
+        """
         if token.type != MTT.TokenUnknown:
+            unfocused = bool(unfocus) and (type(unfocus) == bool
+                                           or token.position < unfocus[0]
+                                           or unfocus[1] < token.position)
+            textFormat, markupFormat, size, formatMarkup, transparent = \
+                self.formats[token.type, unfocused]
+
             fmt = self.format(token.position + token.openingMarkupLength)
-            markupFormat = self.format(token.position)
-            if self.theme.get("markup"):
-                markupFormat.setForeground(self.theme["markup"])
+            if size is not None:
+                f = fmt.font()
+                f.setPointSize(size)
+                fmt.setFont(f)
+            fmt.merge(textFormat)
+            if transparent:
+                self.transparentFormat(fmt)
+
+            # The markup is formatted like the text
+            if formatMarkup:
+                markup = QTextCharFormat(fmt)
+            else:
+                markup = self.format(token.position)
+            markup.merge(markupFormat)
+            markupFormat = markup
 
             ## Debug
             def debug():
@@ -463,21 +531,6 @@ class MarkdownHighlighter(BasicHighlighter):
             # if token.type in range(6, 10):
             # debug()
 
-            theme = self.theme.get(token.type)
-            if theme:
-                fmt, markupFormat = self.formatsFromTheme(theme,
-                                                          fmt,
-                                                          markupFormat)
-
-            # Focus mode
-            unfocus = self.unfocusConditions()
-            if unfocus:
-                if (type(unfocus) == bool
-                        or token.position < unfocus[0]
-                        or unfocus[1] < token.position):
-                    self.transparentFormat(fmt)
-                    self.transparentFormat(markupFormat)
-
             # Format openning Markup
             self.setFormat(token.position, token.openingMarkupLength,
                            markupFormat)
@@ -507,9 +560,7 @@ class MarkdownHighlighter(BasicHighlighter):
         if theme.get("deltaSize"):
             size = self.editor._defaultFontSize + theme["deltaSize"]
             if size >= 0:
-                f = format_.font()
-                f.setPointSize(size)
-                format_.setFont(f)
+                format_.setFontPointSize(size)
         if theme.get("background"):
             format_.setBackground(theme["background"])
         if theme.get("monospace"):
@@ -607,6 +658,8 @@ class MarkdownHighlighter(BasicHighlighter):
             for i in MTT.TITLES:
                 self.theme[i]["deltaSize"] = 0
 
+        self.updateFormats()
+
     def setUseUnderlineForEmphasis(self, enable):
         self.useUndlerlineForEmphasis = enable
         self.rehighlight()
@@ -648,6 +701,9 @@ class MarkdownHighlighter(BasicHighlighter):
         self.rehighlightBlock(block)
 
     def onHighlightBlockAtPosition(self, position):
+        if self.document() is None:
+            # Replaced by another highlighter in the meantime
+            return
         block = self.document().findBlock(position)
         self.rehighlightBlock(block)
 
@@ -3,6 +3,7 @@
 
 import logging
 import re
+from collections import OrderedDict
 
 from PyQt5.QtCore import QRegExp
 
@@ -31,14 +32,47 @@ class Token:
 # ==============================================================================
 
 class HighlightTokenizer:
+
+    # Number of blocks whose tokens are remembered (see tokenizeCached)
+    cacheSize = 5000
+
     def __init__(self):
         self.tokens = []
+        self.cache = OrderedDict()
+        self.cacheHits = 0
+        self.cacheMisses = 0
 
     def tokenize(self, text, currentState, previousState, nextState):
         # Subclass me
         raise NotImplementedError()
         return 0
 
+    def tokenizeCached(self, text, currentState, previousState, nextState):
+        """
+        Clears the tokenizer and tokenizes text, unless the same text has
+        been tokenized recently with the same states: then the tokens, state
+        and backtrack request are the ones found then. Tokens must not be
+        modified.
+
+        Blocks are highlighted again, without changes, whenever the
+        formatting changes: they only need to be tokenized once.
+        """
+        key = (text, currentState, previousState, nextState)
+        cached = self.cache.get(key)
+
+        if cached is None:
+            self.cacheMisses += 1
+            self.clear()
+            self.tokenize(text, currentState, previousState, nextState)
+            self.cache[key] = (self.getTokens(), self.state, self.backtrack)
+            if len(self.cache) > self.cacheSize:
+                self.cache.popitem(last=False)
+
+        else:
+            self.cacheHits += 1
+            self.cache.move_to_end(key)
+            self.tokens, self.state, self.backtrack = cached
+
     def getTokens(self):
         self.tokens = sorted(self.tokens, key=lambda t: t.position)
         return self.tokens
@@ -901,3 +935,201 @@ class MarkdownTokenizer(HighlightTokenizer):
             #elif text[i] == "\\":
                 #escape = True
         #return escapedText
+
+
+# ==============================================================================
+#   PYTHON RE TOKENIZER
+# ==============================================================================
+
+class RegExp:
+    """
+    A precompiled Python regular expression, with the part of the QRegExp
+    API that MarkdownTokenizer uses. Searching does not convert the text to a
+    QString each time.
+
+    `required` are strings that matches contain (at least one of them): texts
+    without any are not searched (see MarkdownReTokenizer.tokenizeMatches).
+    """
+    def __init__(self, pattern, *required):
+        self.regex = re.compile(pattern, re.DOTALL)
+        self.required = required
+        self.length = -1
+
+    def exactMatch(self, text):
+        return self.regex.fullmatch(text) is not None
+
+    def indexIn(self, text, offset=0):
+        match = self.regex.search(text, offset)
+        if match:
+            self.length = match.end() - match.start()
+            return match.start()
+        self.length = -1
+        return -1
+
+    def matchedLength(self):
+        return self.length
+
+
+class MarkdownReTokenizer(MarkdownTokenizer):
+    """
+    MarkdownTokenizer, with Python regular expressions instead of QRegExp.
+    It gives the same tokens. Python counts positions in characters, where
+    Qt counts UTF-16 code units (they differ after characters outside of the
+    BMP, like most emojis): they are converted at the end (see tokenize). See
+    settings.textEditor["tokenizer"].
+
+    The patterns are the ones of MarkdownTokenizer, with lazy quantifiers
+    where those are minimal.
+    """
+
+    paragraphBreakRegex = RegExp(r"^\s*$")
+    heading1SetextRegex = RegExp(r"^===+\s*$")
+    heading2SetextRegex = RegExp(r"^---+\s*$")
+    blockquoteRegex = RegExp(r"^ {0,3}>.*$")
+    githubCodeFenceStartRegex = RegExp(r"^```+.*$")
+    githubCodeFenceEndRegex = RegExp(r"^```+\s*$")
+    pandocCodeFenceStartRegex = RegExp(r"^~~~+.*$")
+    pandocCodeFenceEndRegex = RegExp(r"^~~~+\s*$")
+    numberedListRegex = RegExp(r"^ {0,3}[0-9a-z]+[.)]\s+.*$")
+    numberedNestedListRegex = RegExp(r"^\s*[0-9a-z]+[.)]\s+.*$")
+    hruleRegex = RegExp(r"\s*(\*\s*){3,}|(\s*(_\s*){3,})|((\s*(-\s*){3,}))")
+    lineBreakRegex = RegExp(r".*\s{2,}$")
+    emphasisRegex = RegExp(r"(\*(?![\s*]).*?[^\s*]\*)|_(?![\s_]).*?[^\s_]_", "*", "_")
+    strongRegex = RegExp(r"\*\*(?=\S).*?\S\*\*(?!\*)|__(?=\S).*?\S__(?!_)", "**", "__")
+    strikethroughRegex = RegExp(r"~~[^\s]+?.*?[^\s]+?~~", "~~")
+    superScriptRegex = RegExp(r"\^([^\s]|(\\\\\s))+?\^", "^")  # Spaces must be escaped "\ "
+    subScriptRegex = RegExp(r"~([^\s]|(\\\s))+?~", "~")  # Spaces must be escaped "\ "
+    verbatimRegex = RegExp(r"`+", "`")
+    htmlTagRegex = RegExp(r"<[^<>]+?>", "<")
+    htmlEntityRegex = RegExp(r"&[a-zA-Z]+;|&#x?[0-9]+;", "&")
+    automaticLinkRegex = RegExp(r"(<([a-zA-Z]+:.+?)>)|(<(.+?@.+?)>)", "<")
+    inlineLinkRegex = RegExp(r"\[(.+?)\]\((.+?)\)", "](")
+    referenceLinkRegex = RegExp(r"\[(.+?)\]", "[")
+    referenceDefinitionRegex = RegExp(r"^\s*\[.+\]:")
+    imageRegex = RegExp(r"!\[(.*?)\]\((.+?)\)", "![")
+    htmlInlineCommentRegex = RegExp(r"<!--.*?-->", "<!--")
+    mentionRegex = RegExp(r"\B@\w+(-\w+)*(/\w+(-\w+)*)?", "@")
+    pipeTableDividerRegex = RegExp(r"^ {0,3}(\|[ :]?)?-{3,}([ :]?\|[ :]?-{3,}([ :]?\|)?)+\s*$")
+    CMAdditionRegex = RegExp(r"(\{\+\+.*?\+\+\})", "{++")
+    CMDeletionRegex = RegExp(r"(\{--.*?--\})", "{--")
+    CMSubstitutionRegex = RegExp(r"(\{~~.*?~>.*?~~\})", "{~~")
+    CMCommentRegex = RegExp(r"(\{>>.*?<<\})", "{>>")
+    CMHighlightRegex = RegExp(r"(\{==.*?==\})", "{==")
+
+    # Characters that are two UTF-16 code units
+    nonBMPRegex = re.compile("[\U00010000-\U0010FFFF]")
+
+    def tokenize(self, text, currentState, previousState, nextState):
+        MarkdownTokenizer.tokenize(self, text, currentState, previousState, nextState)
+        if not text.isascii() and self.nonBMPRegex.search(text):
+            self.toUTF16(text)
+
+    def toUTF16(self, text):
+        "Converts positions and lengths of tokens in `text` to UTF-16 code units."
+        offsets = [0]
+        for c in text:
+            offsets.append(offsets[-1] + (2 if c > "\uffff" else 1))
+
+        last = len(text)
+        for token in self.tokens:
+            start = offsets[min(token.position, last)]
+            end = offsets[min(token.position + token.length, last)]
+            token.position, token.length = start, end - start
+
+    def dummyOut(self, text, start, end):
+        "Returns text, with the characters from start to end replaced by DUMMY_CHAR."
+        return text[:start] + self.DUMMY_CHAR * (end - start) + text[end:]
+
+    def tokenizeVerbatim(self, text):
+        if "`" not in text:
+            return text
+
+        search = self.verbatimRegex.regex.search
+        match = search(text)
+
+        while match:
+            index = match.start()
+            count = match.end() - index
+
+            # Search for the matching end, which should have the same number
+            # of back ticks as the start.
+            endIndex = text.find("`" * count, index + count)
+
+            if endIndex >= 0:
+                token = Token()
+                token.type = MTT.TokenVerbatim
+                token.position = index
+                token.length = endIndex + count - index
+                token.openingMarkupLength = count
+                token.closingMarkupLength = count
+                self.addToken(token)
+                text = self.dummyOut(text, index, index + token.length)
+                index += token.length
+
+            else:
+                index += 1
+
+            match = search(text, index)
+        return text
+
+    def tokenizeHtmlComments(self, text):
+        # See MarkdownTokenizer.tokenizeHtmlComments
+        if self.previousState == MS.MarkdownStateComment:
+            text = self.dummyOut(text, 0, text.find("-->") + 3)
+
+        if "<!--" not in text:
+            return text
+
+        search = self.htmlInlineCommentRegex.regex.search
+        match = search(text)
+
+        while match:
+            token = Token()
+            token.type = MTT.TokenHtmlComment
+            token.position = match.start()
+            token.length = match.end() - match.start()
+            self.addToken(token)
+            text = self.dummyOut(text, match.start(), match.end())
+            match = search(text, match.end())
+
+        commentStart = text.find("<!--")
+        if commentStart >= 0:
+            token = Token()
+            token.type = MTT.TokenHtmlComment
+            token.position = commentStart
+            token.length = len(text) - commentStart
+            self.addToken(token)
+            self.setState(MS.MarkdownStateComment)
+            text = self.dummyOut(text, commentStart, len(text))
+        return text
+
+    def tokenizeMatches(self, tokenType, text, regex,
+                        markupStartCount=0, markupEndCount=0,
+                        replaceMarkupChars=False, replaceAllChars=False):
+        # See MarkdownTokenizer.tokenizeMatches
+        if regex.required and not any(r in text for r in regex.required):
+            return text
+
+        search = regex.regex.search
+        match = search(text)
+
+        while match:
+            start, end = match.span()
+            token = Token()
+            token.type = tokenType
+            token.position = start
+            token.length = end - start
+            token.openingMarkupLength = markupStartCount
+            token.closingMarkupLength = markupEndCount
+
+            if replaceAllChars:
+                text = self.dummyOut(text, start, end)
+
+            elif replaceMarkupChars:
+                text = self.dummyOut(text, start, start + markupStartCount)
+                text = self.dummyOut(text, end - markupEndCount, end)
+
+            self.addToken(token)
+            match = search(text, end)
+
+        return text
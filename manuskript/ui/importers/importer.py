@@ -253,9 +253,6 @@ class importerDialog(QWidget, Ui_importer):
         """
         self.startImport(self.mw.mdlOutline)
 
-        # Signal every views that important model changes have happened.
-        self.mw.mdlOutline.layoutChanged.emit()
-
         # I'm getting segfault over this message sometimes...
         # Using status bar message instead...
         # QMessageBox.information(self, self.tr("Import status"),
@@ -271,9 +268,8 @@ class importerDialog(QWidget, Ui_importer):
 
         `outlineModel` is the model where the imported items are added.
 
-        FIXME: Optimisation: when adding many outlineItems, outlineItem.updateWordCount
-        is a bottleneck. It gets called a crazy number of time, and its not
-        necessary.
+        Items are added in a bulk block (see abstractModel.bulk), so that IDs,
+        word counts and views are updated only once, at the end.
         """
 
         items = []
@@ -285,21 +281,22 @@ class importerDialog(QWidget, Ui_importer):
         ID = self.settingsWidget.importUnderID()
         parentItem = outlineModel.getItemByID(ID)
 
-        # Import in top-level folder?
-        if self.settingsWidget.importInTopLevelFolder():
-            parent = outlineItem(title=self.fileName.name, parent=parentItem)
-            parentItem = parent
-            items.append(parent)
+        with outlineModel.bulk():
+            # Import in top-level folder?
+            if self.settingsWidget.importInTopLevelFolder():
+                parent = outlineItem(title=self.fileName.name, parent=parentItem)
+                parentItem = parent
+                items.append(parent)
 
-        # Calling the importer
-        rItems = F.startImport(self.fileName,
-                              parentItem,
-                              self.settingsWidget)
+            # Calling the importer
+            rItems = F.startImport(self.fileName,
+                                  parentItem,
+                                  self.settingsWidget)
 
-        items.extend(rItems)
+            items.extend(rItems)
 
-        # Do transformations
-        items = self.doTransformations(items)
+            # Do transformations
+            items = self.doTransformations(items)
 
         return True
 
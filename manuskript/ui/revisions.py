@@ -140,7 +140,7 @@ class revisions(QWidget, Ui_revisions):
         item = self._index.internalPointer()
 
         textNow = item.text()
-        textBefore = [r[1] for r in item.revisions() if r[0] == ts][0]
+        textBefore = item.revisionText(ts)
 
         if self.actShowVersion.isChecked():
             self.view.setText(textBefore)
@@ -226,7 +226,7 @@ class revisions(QWidget, Ui_revisions):
             return
         ts = i.data(Qt.UserRole)
         item = self._index.internalPointer()
-        textBefore = [r[1] for r in item.revisions() if r[0] == ts][0]
+        textBefore = item.revisionText(ts)
         index = self._index.sibling(self._index.row(), Outline.text)
         self._index.model().setData(index, textBefore)
         # item.setData(Outline.text, textBefore)
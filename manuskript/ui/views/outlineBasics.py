@@ -330,10 +330,23 @@ class outlineBasics(QAbstractItemView):
 
     def duplicate(self):
         """
-        Duplicates item(s), while preserving clipboard content.
+        Duplicates item(s), while preserving clipboard content. Each copy is
+        inserted just below the original item.
         """
-        mimeData = self.model().mimeData(self.selectionModel().selectedIndexes())
-        self.paste(mimeData)
+        items = [i.internalPointer() for i in self.getSelection()]
+
+        def ancestorSelected(item):
+            p = item.parent()
+            while p:
+                if p in items:
+                    return True
+                p = p.parent()
+            return False
+
+        # Items whose parent is selected too are duplicated with it
+        for item in [i for i in items if not ancestorSelected(i)]:
+            self.model().insertItem(item.copy(), item.row() + 1,
+                                    item.parent().index())
 
     def move(self, delta=1):
         """
@@ -382,7 +395,6 @@ class outlineBasics(QAbstractItemView):
 
         parentItem.childItems.insert(index.row() + delta,
                                      parentItem.childItems.pop(index.row()))
-        parentItem.updateWordCount(emit=False)
 
     def moveUp(self): self.move(-1)
     def moveDown(self): self.move(+1)
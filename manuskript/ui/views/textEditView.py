@@ -22,6 +22,10 @@ except ImportError:
 logger = logging.getLogger('manuskript')
 
 class textEditView(QTextEdit):
+
+    # Number of words in the document, when it has changed (see wordCount)
+    wordCountChanged = pyqtSignal(int)
+
     def __init__(self, parent=None, index=None, html=None, spellcheck=True,
                  highlighting=False, dict_="", autoResize=False):
         QTextEdit.__init__(self, parent)
@@ -61,6 +65,10 @@ class textEditView(QTextEdit):
 
         self.updateTimer.stop()
         self.document().contentsChanged.connect(self.updateTimer.start, F.AUC)
+
+        # Range of the text changed since last submit (see trackChange)
+        self._change = None
+        self.document().contentsChange.connect(self.trackChange)
         # self.document().contentsChanged.connect(lambda: print("Document changed"))
 
         # self.document().contentsChanged.connect(lambda: print(self.objectName(), "Contents changed"))
@@ -86,8 +94,7 @@ class textEditView(QTextEdit):
             self.spellcheck = False
 
         if self._highlighting and not self.highlighter:
-            self.highlighter = self._highlighterClass(self)
-            self.highlighter.setDefaultBlockFormat(self._defaultBlockFormat)
+            self.createHighlighter()
 
     def getDefaultLocale(self):
         default_locale = enchant.get_default_language()
@@ -170,11 +177,26 @@ class textEditView(QTextEdit):
 
         self.updateText()
 
+    def createHighlighter(self):
+        "Sets up a new highlighter, that replaces the previous one if any."
+        if self.highlighter:
+            self.highlighter.setDocument(None)
+            self.highlighter.deleteLater()
+        self.highlighter = self._highlighterClass(self)
+        self.highlighter.setDefaultBlockFormat(self._defaultBlockFormat)
+        self.highlighter.wordCountChanged.connect(self.wordCountChanged)
+
+    def wordCount(self):
+        """
+        Returns the number of words in the document, counted live by the
+        highlighter (see BasicHighlighter.wordCount), or None without one.
+        """
+        return self.highlighter.wordCount() if self.highlighter else None
+
     def setupEditorForIndex(self, index):
         # Setting highlighter
         if self._highlighting:
-            self.highlighter = self._highlighterClass(self)
-            self.highlighter.setDefaultBlockFormat(self._defaultBlockFormat)
+            self.createHighlighter()
             self.highlighter.updateColorScheme()
 
     def loadFontSettings(self):
@@ -293,6 +315,7 @@ class textEditView(QTextEdit):
             return
         # print("Updating", self.objectName())
         self._updating = True
+        self._change = None
         if self._index:
             self.disconnectDocument()
             if self.toPlainText() != str(self._index.data()):
@@ -324,12 +347,73 @@ class textEditView(QTextEdit):
             self.reconnectDocument()
         self._updating = False
 
+    def trackChange(self, position, removed, added):
+        """
+        Remembers the range of the text that changes, so that submit only
+        sends that range (see submitChange): as (start, end) of the text
+        last submitted, and end of the text that replaces it.
+        """
+        if self._updating:
+            return
+
+        # Counts sometimes include the end of the document
+        excess = position + added - (self.document().characterCount() - 1)
+        if excess > 0:
+            removed = max(0, removed - excess)
+            added -= excess
+
+        if self._change is None:
+            self._change = (position, position + removed, position + added)
+        else:
+            start, oldEnd, newEnd = self._change
+            end = max(newEnd, position + removed)
+            self._change = (min(start, position), oldEnd + end - newEnd,
+                            end + added - removed)
+
+    def submitChange(self):
+        """
+        Replaces the range of the item's text that has changed since last
+        submit (see trackChange), instead of the whole text, which is not
+        even read from the document. Returns False if the whole text has to
+        be submitted: when changes are not known, or when positions in the
+        document are not indexes in the text.
+        """
+        if self._column != Outline.text or not isinstance(self._model, outlineModel):
+            return False
+
+        change, self._change = self._change, None
+        if change is None:
+            # Nothing has changed since the text was last submitted or set
+            return True
+
+        start, oldEnd, newEnd = change
+        item = QModelIndex(self._index).internalPointer()
+        old = item.text() or ""
+        if len(old) - oldEnd + newEnd != self.document().characterCount() - 1:
+            return False
+
+        cursor = QTextCursor(self.document())
+        cursor.setPosition(start)
+        cursor.setPosition(newEnd, QTextCursor.KeepAnchor)
+        text = cursor.selection().toPlainText()
+        if len(text) != newEnd - start:
+            # Characters out of the BMP count twice in the document, so
+            # lengths do not add up if there are some here or in the text
+            return False
+
+        self._updating = True
+        item.replaceText(start, oldEnd, text)
+        self._updating = False
+        return True
+
     def submit(self):
         self.updateTimer.stop()
         if self._updating:
             return
         # print("Submitting", self.objectName())
         if self._index and self._index.isValid():
+            if self.submitChange():
+                return
             # item = self._index.internalPointer()
             if self.toPlainText() != self._index.data():
                 # print("    Submitting plain text")
@@ -501,4 +501,5 @@ class welcome(QWidget, Ui_welcome):
                     addElement(item, datas[1:])
 
         if self.template and self.template[1]:
-            addElement(root, self.template[1])
+            with self.mw.mdlOutline.bulk():
+                addElement(root, self.template[1])